@@ -1,17 +1,55 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
+# Load .env before importing routes so service modules see its settings
+load_dotenv()
+
 from app.routes import health, chat, documents, guardians
+from app.services.clinical_terms import get_extractor
+from app.services.data_service import close_storage
+from app.services.document_analysis import document_jobs, requeue_pending_documents
+from app.services.downsample import chart_rollups
+from app.services.http_cache import http_responses
+from app.services.insights import insight_scheduler
+from app.services.llm_cache import response_cache, inflight_calls
+from app.services.profiler import PROFILING_ENABLED, ProfilerMiddleware, request_profiles
+from app.services.server_lock import acquire_server_lock, release_server_lock
+from app.services.telemetry import CallbackGauge, MetricsMiddleware, registry
+from app.services.text_extraction import shutdown_pool
 
-load_dotenv()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile the clinical vocabulary, start the document analysis worker pool and the insights scheduler
+
+    Document jobs only live in memory, so analyses left pending by the last
+    process are queued again. On SQLite, startup fails if another API
+    worker already holds the database (see services.server_lock). On exit
+    the workers stop and buffered writes are flushed.
+    """
+    acquire_server_lock()
+    get_extractor()
+    document_jobs.start()
+    await requeue_pending_documents()
+    insight_scheduler.start()
+    try:
+        yield
+    finally:
+        await document_jobs.stop()
+        await insight_scheduler.stop()
+        shutdown_pool()
+        close_storage()
+        release_server_lock()
 
 app = FastAPI(
     title="Second Opinion - AI Health Companion",
     description="Personalized AI health companion for elderly users",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -22,7 +60,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "ETag"],
 )
+# Added last so they wrap everything, CORS included
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# State other services already track, read when /metrics is scraped
+registry.register(CallbackGauge(
+    "llm_cache_events_total", "LLM response cache hits and misses",
+    lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses}, ("result",), kind="counter"))
+registry.register(CallbackGauge(
+    "llm_deduplicated_calls_total", "LLM calls answered by an identical call already in flight",
+    lambda: {(): inflight_calls.deduplicated}, kind="counter"))
+registry.register(CallbackGauge(
+    "chart_rollup_cache_events_total", "Chart rollup lookups: hit, extended with new readings, or built",
+    lambda: {(result,): chart_rollups.stats()[key] for result, key in
+             (("hit", "hits"), ("extend", "extends"), ("build", "builds"))}, ("result",), kind="counter"))
+registry.register(CallbackGauge(
+    "http_response_cache_events_total", "Polled GET lookups: 304 not modified, cached body, or rebuilt",
+    lambda: {(result,): http_responses.stats()[key] for result, key in
+             (("not_modified", "not_modified"), ("hit", "hits"), ("miss", "misses"))}, ("result",), kind="counter"))
+registry.register(CallbackGauge(
+    "http_response_cache_bytes", "Serialized response bodies held for polled GETs",
+    lambda: {(): http_responses.stats()["bytes"]}))
+registry.register(CallbackGauge(
+    "document_jobs", "Document analysis jobs by status",
+    lambda: {(status,): n for status, n in document_jobs.stats().items()}, ("status",)))
 
 # Include routes
 app.include_router(health.router, prefix="/api/health", tags=["health"])
@@ -34,6 +98,26 @@ app.include_router(guardians.router, prefix="/api/guardians", tags=["guardians"]
 async def check_health():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of request, LLM and job metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/profiles")
+async def list_profiles():
+    """Recent request profiles (requests made with ?profile=1 or X-Profile: 1)"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return request_profiles.list()
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Sampled stacks for one request: top functions and collapsed stacks for flame graphs"""
+    profile = request_profiles.get(profile_id) if PROFILING_ENABLED else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
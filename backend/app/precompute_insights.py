@@ -0,0 +1,47 @@
+"""
+Precompute daily health insights for every user with health data.
+
+Runs the same batch as the in-process scheduler (see
+app.services.insights). Needs a persistent STORAGE_BACKEND so the API
+process sees the stored results. An interrupted run resumes from its
+checkpoint when started again.
+
+Usage (from backend/):
+    python -m app.precompute_insights [--concurrency 4] [--rate 5] [--force]
+"""
+import argparse
+import asyncio
+import json
+from dotenv import load_dotenv
+
+# Load .env before importing services so they see its settings
+load_dotenv()
+
+from app.services.data_service import close_storage
+from app.services.insights import (
+    INSIGHTS_CONCURRENCY, INSIGHTS_RATE_PER_SECOND, INSIGHTS_CHECKPOINT_PATH, run_insights_batch
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", help="comma-separated user ids (default: every user with health data)")
+    parser.add_argument("--concurrency", type=int, default=INSIGHTS_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=INSIGHTS_RATE_PER_SECOND, help="max LLM calls started per second")
+    parser.add_argument("--checkpoint", default=INSIGHTS_CHECKPOINT_PATH)
+    parser.add_argument("--force", action="store_true", help="regenerate even unchanged, recent insights")
+    args = parser.parse_args()
+
+    user_ids = args.users.split(",") if args.users else None
+    try:
+        summary = asyncio.run(run_insights_batch(
+            user_ids, concurrency=args.concurrency, rate_per_second=args.rate,
+            checkpoint_path=args.checkpoint, force=args.force,
+        ))
+    finally:
+        close_storage()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,25 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 from app.models.schemas import ChatMessage, AIResponse
-from app.services.data_service import get_user_health_data, analyze_with_cerebras, get_user_profile
-import json
+from app.services import llm_service
+from app.services.data_service import get_patient_context
+from app.services.llm_service import analyze_with_cerebras, stream_with_cerebras, error_message, prompt_token_stats
+from app.services.conversations import chat_sessions
+from app.services.insights import get_health_insight
+from app.services.llm_cache import response_cache, inflight_calls
+from app.services.encoding import sse_event
 
 router = APIRouter()
 
-@router.post("/send")
-async def send_message(user_id: str, message: str):
-    """Send a message to the AI health doc"""
-    
-    # Get user's health context
-    metrics = get_user_health_data(user_id)
-    profile = get_user_profile(user_id)
-    
-    # Initialize if needed
-    if not metrics:
-        metrics = []
-    
-    # Build context from latest health data
-    context = f"""User: {profile.get('name', 'Patient') if profile else 'Patient'} (Age: {profile.get('age', 'unknown') if profile else 'unknown'})
-Medical Conditions: {', '.join(profile.get('medical_conditions', []) if profile else [])}
-Current Medications: {', '.join(profile.get('medications', []) if profile else [])}
-Allergies: {', '.join(profile.get('allergies', []) if profile else [])}
-"""
-    
-    if metrics:
-        latest = metrics[-1]
-        context += f"""
-Recent Vital Signs:
-- Heart Rate: {latest.get('heart_rate')} bpm
-- Blood Pressure: {latest.get('blood_pressure_systolic')}/{latest.get('blood_pressure_diastolic')} mmHg
-- Blood Glucose: {latest.get('blood_glucose')} mg/dL
-- Oxygen Saturation: {latest.get('oxygen_saturation')}%
-- Body Temperature: {latest.get('body_temperature')}°C
-- Steps Today: {latest.get('steps')}
-- Sleep Last Night: {latest.get('sleep_hours')} hours
-"""
-    
-    # Call Cerebras API
-    ai_response = analyze_with_cerebras(context, message)
-    
+def build_response_metadata(profile, ai_response: str) -> dict:
+    """Build the medical_context/recommendations fields returned with a reply"""
     # Extract any recommendations if applicable
     recommendations = []
     if "recommend" in ai_response.lower() or "suggest" in ai_response.lower():
         recommendations = ["Consider consulting your physician for professional medical advice"]
     
     return {
-        "response": ai_response,
         "medical_context": {
             "user_conditions": profile.get('medical_conditions', []) if profile else [],
             "user_medications": profile.get('medications', []) if profile else [],
@@ -56,27 +28,86 @@ Recent Vital Signs:
         "timestamp": datetime.now().isoformat()
     }
 
+@router.post("/send")
+async def send_message(user_id: str, message: str, stream: bool = False, session_id: str = "default"):
+    """Send a message to the AI health doc
+    
+    Earlier turns of the same session are sent along as conversation
+    memory (older ones compacted into a summary). With stream=true the
+    reply is sent as Server-Sent Events: one "token" event per chunk of
+    text, then a "done" event carrying the metadata.
+    """
+    
+    # Patient context from profile and latest vitals (cached until either changes)
+    context, profile = await get_patient_context(user_id)
+    session = chat_sessions.get(user_id, session_id)
+    history = session.history()
+    # Without an API key the reply is a placeholder, not a turn worth remembering
+    remember = llm_service.client is not None
+    
+    if stream:
+        async def event_stream():
+            parts = []
+            try:
+                async for text in stream_with_cerebras(context, message, history, raise_errors=True):
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+            except Exception as e:
+                # Failed replies are shown but not remembered
+                parts = None
+                yield sse_event("token", {"text": error_message(e)})
+            if parts is not None and remember:
+                session.add_turn(message, "".join(parts))
+            yield sse_event("done", build_response_metadata(profile, "".join(parts or [])))
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    # Call Cerebras API
+    try:
+        ai_response = await analyze_with_cerebras(context, message, history=history, raise_errors=True)
+        if remember:
+            session.add_turn(message, ai_response)
+    except Exception as e:
+        ai_response = error_message(e)
+    
+    return {"response": ai_response, **build_response_metadata(profile, ai_response)}
+
+@router.delete("/session/{user_id}")
+async def reset_chat_session(user_id: str, session_id: str = "default"):
+    """Forget a chat session's conversation memory"""
+    return {"user_id": user_id, "session_id": session_id, "reset": chat_sessions.reset(user_id, session_id)}
+
+@router.get("/stats")
+async def get_chat_stats():
+    """Prompt size per upstream request, LLM call dedup and conversation memory counters"""
+    return {
+        "prompt_tokens": prompt_token_stats.snapshot(),
+        "llm_calls": inflight_calls.stats(),
+        "response_cache": response_cache.stats(),
+        "active_sessions": len(chat_sessions)
+    }
+
 @router.get("/health-insights/{user_id}")
 async def get_health_insights(user_id: str):
-    """Get AI-generated health insights"""
-    
-    profile = get_user_profile(user_id)
-    metrics = get_user_health_data(user_id)
+    """Get AI-generated health insights
     
-    if not metrics or not profile:
+    Served from the daily precomputed batch; generated live only when the
+    user has new data since then.
+    """
+    insight = await get_health_insight(user_id)
+    if insight is None:
         return {
             "insights": "No data available yet",
             "recommendations": []
         }
     
-    # Generate insight message
-    latest = metrics[-1]
-    insight_prompt = f"Based on a patient with {', '.join(profile.get('medical_conditions', []))}, recent vitals showing BP {latest.get('blood_pressure_systolic')}/{latest.get('blood_pressure_diastolic')} and glucose {latest.get('blood_glucose')}, what are key health recommendations for today?"
-    
-    insights = analyze_with_cerebras(f"Generate brief health insights for {profile.get('name')}", insight_prompt)
-    
     return {
         "user_id": user_id,
-        "insights": insights,
-        "generated_at": datetime.now().isoformat()
+        "insights": insight["insights"],
+        "generated_at": insight["generated_at"],
+        "source": insight["source"]
     }
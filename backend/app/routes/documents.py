@@ -1,108 +1,154 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, Query
 from datetime import datetime
+from typing import Optional
 import os
-from app.services.data_service import save_document, get_user_documents, analyze_with_cerebras
+import logging
+from app.services.data_service import list_user_documents, get_user_document, get_document_by_hash
+from app.services.document_analysis import document_jobs, detect_document_type, has_live_job, queue_document_analysis
+from app.services.document_index import summarize_document
+from app.services.document_store import store_upload
+from app.services.http_cache import ConditionalGet
+from app.services.timeseries import to_epoch_us
 import json
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Temporary file storage
-UPLOAD_DIR = "/tmp/health_documents"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Page size bounds for /list
+DEFAULT_DOCUMENTS_PAGE_SIZE = 20
+MAX_DOCUMENTS_PAGE_SIZE = 100
 
-@router.post("/upload/{user_id}")
-async def upload_medical_document(user_id: str, file: UploadFile = File(...)):
-    """Upload a medical document for AI analysis"""
+@router.post("/upload/{user_id}", status_code=202)
+async def upload_medical_document(user_id: str, response: Response, file: UploadFile = File(...)):
+    """Upload a medical document for AI analysis
+    
+    The file is stored and a background job is queued for the analysis;
+    the response (202 Accepted) carries a job_id to poll at /jobs/{job_id}.
+    """
     
     try:
-        # Save file
-        file_path = os.path.join(UPLOAD_DIR, f"{user_id}_{file.filename}")
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Mock analysis - in production, extract text from PDF/image
-        document = {
-            "document_id": f"doc_{datetime.now().timestamp()}",
-            "user_id": user_id,
-            "document_type": "medical_document",
-            "file_name": file.filename,
-            "uploaded_at": datetime.now().isoformat(),
-            "file_path": file_path,
-            "analysis": {
-                "status": "analyzed",
-                "extracted_conditions": [],
-                "key_findings": []
-            }
-        }
-        
-        # Analyze document with AI
-        doc_type = "prescription" if "prescription" in file.filename.lower() else \
-                   "lab" if "lab" in file.filename.lower() else \
-                   "report" if "report" in file.filename.lower() else \
-                   "medical document"
-        
-        analysis_prompt = f"""This is a {doc_type} for an elderly patient named {user_id}. 
-Please analyze and extract:
-1. Key medical conditions mentioned
-2. Current medications
-3. Lab results and their significance for elderly patients
-4. Any health risks or alerts
-5. Recommendations for the elderly patient
-
-Provide a clear, actionable analysis."""
-        
-        user_context = f"Analyzing {doc_type}: {file.filename} for elderly patient"
-        analysis_result = analyze_with_cerebras(user_context, analysis_prompt)
-        
-        # Extract conditions from analysis
-        conditions = []
-        keywords = ["diabetes", "hypertension", "arthritis", "heart", "cancer", "copd", "asthma", 
-                    "alzheimer", "parkinson", "stroke", "kidney", "liver", "thyroid"]
-        for keyword in keywords:
-            if keyword.lower() in analysis_result.lower():
-                conditions.append(keyword.capitalize())
-        
-        document["analysis"]["summary"] = analysis_result
-        document["analysis"]["document_type"] = doc_type
-        document["analysis"]["extracted_conditions"] = list(set(conditions))  # Remove duplicates
-        document["analysis"]["key_findings"] = [
-            "Document received and analyzed",
-            f"Identified {len(document['analysis']['extracted_conditions'])} condition(s)",
-            "Ready for integration with health profile"
-        ]
-        
-        # Save document record
-        save_document(user_id, document)
-        
+        # Stream file to content-addressed storage
+        content_hash, file_path, size_bytes = await store_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
+    except OSError as e:
+        # Disk full or I/O trouble on our side, not a bad upload
+        logger.exception("Could not store upload %s for %s", file.filename, user_id)
+        raise HTTPException(status_code=500, detail="Upload failed: the file could not be stored") from e
+    
+    # Same file uploaded before - reuse its analysis instead of re-running the LLM
+    existing = get_document_by_hash(user_id, content_hash)
+    if existing and existing.get("status") != "failed":
+        complete = existing.get("status", "complete") == "complete"
+        if complete:
+            response.status_code = 200
+        elif not has_live_job(existing):
+            # Still pending but its job was lost with a restart - queue it again
+            await queue_document_analysis(user_id, existing)
         return {
-            "status": "success",
-            "document_id": document["document_id"],
-            "message": f"Document {file.filename} uploaded and analyzed successfully",
-            "analysis": document["analysis"],
-            "extracted_conditions": document["analysis"]["extracted_conditions"]
+            "status": "success" if complete else "accepted",
+            "document_id": existing["document_id"],
+            "job_id": existing.get("job_id"),
+            "message": f"Document {file.filename} was already uploaded - returning the previous analysis",
+            "deduplicated": True,
+            "analysis": existing["analysis"],
+            "extracted_conditions": existing["analysis"].get("extracted_conditions", [])
         }
     
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
+    document = {
+        "document_id": existing["document_id"] if existing else f"doc_{datetime.now().timestamp()}",
+        "user_id": user_id,
+        "document_type": detect_document_type(file.filename or ""),
+        "file_name": file.filename,
+        "uploaded_at": datetime.now().isoformat(),
+        "file_path": file_path,
+        "content_sha256": content_hash,
+        "size_bytes": size_bytes,
+        "status": "pending",
+        "analysis": {
+            "status": "pending",
+            "extracted_conditions": [],
+            "key_findings": []
+        }
+    }
+    
+    # Queue the analysis and save the pending record
+    job = await queue_document_analysis(user_id, document)
+    
+    return {
+        "status": "accepted",
+        "document_id": document["document_id"],
+        "job_id": job["job_id"],
+        "message": f"Document {file.filename} uploaded - analysis in progress",
+        "deduplicated": False,
+        "analysis": document["analysis"],
+        "extracted_conditions": []
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Get the status of a document analysis job"""
+    job = document_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    result = dict(job)
+    if job["status"] == "complete":
+        document = get_user_document(job["user_id"], job["document_id"])
+        result["analysis"] = document["analysis"] if document else None
+    return result
 
 @router.get("/list/{user_id}")
-async def list_documents(user_id: str):
-    """List all uploaded documents for a user"""
-    documents = get_user_documents(user_id)
+async def list_documents(
+    request: Request,
+    user_id: str,
+    document_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_DOCUMENTS_PAGE_SIZE, ge=1, le=MAX_DOCUMENTS_PAGE_SIZE),
+    include_analysis: bool = False,
+):
+    """List a user's uploaded documents, newest first
     
-    return {
+    Returns lightweight summaries unless include_analysis is set. Filter by
+    document_type and upload time (start/end); pass the returned
+    next_cursor (with the same filters) to fetch the next page.
+    
+    Responses carry an ETag from the user's documents version; a poll with
+    a matching If-None-Match gets 304 Not Modified.
+    """
+    conditional = ConditionalGet(request, "documents", user_id, ("documents",))
+    if conditional.response:
+        return conditional.response
+    
+    try:
+        documents, total, next_cursor = list_user_documents(
+            user_id,
+            document_type=document_type,
+            start_us=to_epoch_us(start) if start else None,
+            end_us=to_epoch_us(end) if end else None,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not include_analysis:
+        documents = [summarize_document(doc) for doc in documents]
+    
+    return conditional.respond({
         "user_id": user_id,
         "documents": documents,
-        "count": len(documents)
-    }
+        "count": len(documents),
+        "total": total,
+        "next_cursor": next_cursor
+    })
 
 @router.get("/{user_id}/{document_id}")
 async def get_document(user_id: str, document_id: str):
-    """Get a specific document's analysis"""
-    documents = get_user_documents(user_id)
-    
-    doc = next((d for d in documents if d["document_id"] == document_id), None)
+    """Get a specific document's analysis (status shows pending/complete/failed)"""
+    doc = get_user_document(user_id, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     
@@ -1,16 +1,44 @@
-from fastapi import APIRouter, HTTPException
-from app.services.data_service import get_guardians, add_guardian, get_user_health_data, get_user_profile
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.services.data_service import (
+    get_guardians, add_guardian, get_user_health_data, get_user_series, load_user_series, get_user_profile,
+    get_user_alerts
+)
+from app.services.encoding import UnsupportedFormat, encode_response, negotiate_format, series_columns, sse_event
+from app.services.alert_bus import alert_bus
+from app.services.alerts import alert_engine
 from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import os
 import json
 
 router = APIRouter()
 
+# Idle alert streams send a comment this often so proxies keep them open
+ALERT_STREAM_HEARTBEAT_SECONDS = float(os.getenv("ALERT_STREAM_HEARTBEAT_SECONDS", "15"))
+
+async def guardian_access_levels(guardian_id: str, user_ids: List[str]) -> Optional[Dict[str, str]]:
+    """Map each ward to the guardian's access level, or None if not a guardian of all of them"""
+    levels = {}
+    for user_id in user_ids:
+        guardian = next((g for g in await get_guardians(user_id) if g["guardian_id"] == guardian_id), None)
+        if guardian is None:
+            return None
+        levels[user_id] = guardian["access_level"]
+    return levels
+
 @router.post("/add/{user_id}")
-async def add_guardian_for_user(user_id: str, guardian_name: str, relationship: str, access_level: str = "view_all"):
-    """Add a guardian/family member who can view health data"""
+async def add_guardian_for_user(user_id: str, guardian_name: str, relationship: str, access_level: str = "view_all",
+                                guardian_id: Optional[str] = None):
+    """Add a guardian/family member who can view health data
+    
+    Pass an existing guardian_id to add the same guardian to another ward,
+    so one alert stream can cover all of their wards.
+    """
     
     guardian = {
-        "guardian_id": f"guardian_{datetime.now().timestamp()}",
+        "guardian_id": guardian_id or f"guardian_{datetime.now().timestamp()}",
         "user_id": user_id,
         "name": guardian_name,
         "relationship": relationship,
@@ -18,7 +46,7 @@ async def add_guardian_for_user(user_id: str, guardian_name: str, relationship:
         "added_at": datetime.now().isoformat()
     }
     
-    add_guardian(user_id, guardian)
+    await add_guardian(user_id, guardian)
     
     return {
         "status": "success",
@@ -29,7 +57,7 @@ async def add_guardian_for_user(user_id: str, guardian_name: str, relationship:
 @router.get("/list/{user_id}")
 async def list_guardians(user_id: str):
     """List all guardians for a user"""
-    guardians = get_guardians(user_id)
+    guardians = await get_guardians(user_id)
     
     return {
         "user_id": user_id,
@@ -38,58 +66,148 @@ async def list_guardians(user_id: str):
     }
 
 @router.get("/view/{user_id}/{guardian_id}")
-async def guardian_view_health_data(user_id: str, guardian_id: str, view_type: str = "summary"):
-    """Guardian views user's health data based on their access level"""
+async def guardian_view_health_data(request: Request, user_id: str, guardian_id: str, view_type: str = "summary",
+                                    response_format: Optional[str] = Query(None, alias="format")):
+    """Guardian views user's health data based on their access level
+    
+    format=columnar / msgpack (or Accept: application/msgpack) returns
+    recent_metrics as one array per field, as /api/health/metrics does.
+    """
     
-    guardians = get_guardians(user_id)
+    guardians = await get_guardians(user_id)
     guardian = next((g for g in guardians if g["guardian_id"] == guardian_id), None)
     
     if not guardian:
         raise HTTPException(status_code=403, detail="Guardian not authorized")
+    try:
+        fmt = negotiate_format(response_format, request.headers.get("accept"))
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Get user's health data based on access level
-    metrics = get_user_health_data(user_id)
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile(user_id)
+    await load_user_series(user_id)
+    alerts = get_user_alerts(user_id, limit=10)
     
     if guardian["access_level"] == "view_all":
-        return {
+        if fmt == "rows":
+            metrics = get_user_health_data(user_id)
+            recent_metrics = metrics[-7:] if metrics else []
+        else:
+            series = get_user_series(user_id)
+            count = len(series) if series is not None else 0
+            recent_metrics = series_columns(series, max(0, count - 7), count) if count else {}
+        return encode_response({
             "guardian_name": guardian["name"],
             "relationship": guardian["relationship"],
             "user_profile": profile,
-            "recent_metrics": metrics[-7:] if metrics else [],
-            "alerts": []
-        }
+            "recent_metrics": recent_metrics,
+            "alerts": alerts
+        }, fmt)
     elif guardian["access_level"] == "view_alerts":
         # Only show alerts, not full data
-        return {
+        return encode_response({
             "guardian_name": guardian["name"],
             "relationship": guardian["relationship"],
-            "alerts": [
-                {
-                    "type": "high_blood_pressure",
-                    "message": "Blood pressure readings are elevated",
-                    "timestamp": datetime.now().isoformat()
-                }
-            ]
-        }
+            "alerts": alerts
+        }, fmt)
     elif guardian["access_level"] == "view_basic":
         # Only show basic info
-        return {
+        return encode_response({
             "guardian_name": guardian["name"],
             "relationship": guardian["relationship"],
             "basic_info": {
                 "name": profile.get("name") if profile else "N/A",
                 "age": profile.get("age") if profile else "N/A",
-                "status": "okay"
+                "status": "attention_needed" if any(a["severity"] == "critical" for a in alerts) else "okay"
             }
-        }
+        }, fmt)
 
 @router.post("/alerts/{user_id}")
 async def enable_guardian_alerts(user_id: str, guardian_id: str):
     """Enable real-time alerts for guardians"""
+    if await guardian_access_levels(guardian_id, [user_id]) is None:
+        raise HTTPException(status_code=403, detail="Guardian not authorized")
     
     return {
         "status": "success",
         "message": "Guardian alerts enabled",
-        "alert_types": ["high_blood_pressure", "low_oxygen", "abnormal_glucose", "fall_detection"]
+        "alert_types": sorted({rule.alert_type for rule in alert_engine.rules}),
+        "stream_url": f"/api/guardians/stream/{guardian_id}?user_id={user_id}",
+        "websocket_url": f"/api/guardians/ws/{guardian_id}?user_id={user_id}"
     }
+
+@router.get("/stream/{guardian_id}")
+async def stream_guardian_alerts(guardian_id: str, user_id: List[str] = Query(...)):
+    """Live alerts for a guardian's wards as Server-Sent Events
+    
+    Pass user_id once per ward. Each "alert" event is filtered by the
+    guardian's access_level for that ward; a subscriber that falls too far
+    behind gets a "closed" event and should reconnect and catch up via
+    /api/health/alerts/{user_id}.
+    """
+    access_levels = await guardian_access_levels(guardian_id, user_id)
+    if access_levels is None:
+        raise HTTPException(status_code=403, detail="Guardian not authorized")
+    
+    async def event_stream():
+        # Subscribe only once the response starts, so a client that goes
+        # away before then leaves nothing registered on the bus
+        subscription = alert_bus.subscribe(guardian_id, access_levels)
+        try:
+            yield sse_event("subscribed", {"guardian_id": guardian_id, "wards": access_levels})
+            while True:
+                try:
+                    alert = await subscription.get(ALERT_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if alert is None:
+                    yield sse_event("closed", {"reason": "subscriber too slow", "dropped": subscription.dropped})
+                    break
+                yield sse_event("alert", {**alert, "dropped": subscription.dropped})
+        finally:
+            alert_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws/{guardian_id}")
+async def guardian_alerts_socket(websocket: WebSocket, guardian_id: str, user_id: List[str] = Query(...)):
+    """Live alerts for a guardian's wards over a WebSocket (same filtering as /stream)"""
+    access_levels = await guardian_access_levels(guardian_id, user_id)
+    if access_levels is None:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    subscription = alert_bus.subscribe(guardian_id, access_levels)
+    
+    async def watch_disconnect():
+        # Nothing is read from the client; this only notices it going away
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            subscription.close()
+    
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        while True:
+            alert = await subscription.get()
+            if alert is None:
+                break
+            await websocket.send_json({**alert, "dropped": subscription.dropped})
+        if watcher.done():
+            return
+        await websocket.close(code=1013)  # fell too far behind - reconnect
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        alert_bus.unsubscribe(subscription)
@@ -1,24 +1,40 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
+from typing import Optional
 from app.models.schemas import HealthMetric
-from app.services.data_service import get_user_health_data, add_health_data
+from app.services.data_service import (
+    get_user_series, load_user_series, add_health_data, add_health_data_batch,
+    is_initialized, mark_initialized, get_user_alerts
+)
+from app.services.ingest import MetricBatch, BatchTooLarge, LineSplitter, parse_json_array, read_body
 from app.services.mock_data import generate_mock_health_data, generate_elderly_user_profile
+from app.services.timeseries import to_epoch_us
+from app.services.aggregates import US_PER_DAY
+from app.services.downsample import MAX_CHART_POINTS, downsample, parse_fields, select_fields
+from app.services.encoding import UnsupportedFormat, negotiate_format, rows_to_columns, series_columns
+from app.services.http_cache import ConditionalGet
 import json
 
 router = APIRouter()
 
-# Store generated data
-INITIALIZED = {}
+# Page size bounds for /metrics so long histories are walked, not dumped
+DEFAULT_METRICS_PAGE_SIZE = 500
+MAX_METRICS_PAGE_SIZE = 5000
+# Columnar pages skip the per-row dicts, so they can be much larger
+MAX_COLUMNAR_PAGE_SIZE = 100_000
+# Most alerts echoed back in a batch ingest response
+MAX_REPORTED_ALERTS = 100
 
 @router.get("/init/{user_id}")
 async def initialize_health_data(user_id: str = "elderly_001"):
     """Initialize mock health data for a user"""
-    if user_id not in INITIALIZED:
+    if not is_initialized(user_id):
         # Generate 30 days of mock data
         mock_data = generate_mock_health_data(user_id, days=30)
         for metric in mock_data:
             add_health_data(user_id, metric)
-        INITIALIZED[user_id] = True
+        mark_initialized(user_id)
     
     return {
         "status": "initialized",
@@ -27,80 +43,220 @@ async def initialize_health_data(user_id: str = "elderly_001"):
     }
 
 @router.get("/metrics/{user_id}")
-async def get_health_metrics(user_id: str, days: int = 30):
-    """Get health metrics for a user"""
-    metrics = get_user_health_data(user_id)
+async def get_health_metrics(
+    request: Request,
+    user_id: str,
+    days: int = 30,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_METRICS_PAGE_SIZE, ge=1, le=MAX_COLUMNAR_PAGE_SIZE),
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = Query(None, ge=3, le=MAX_CHART_POINTS),
+    fields: Optional[str] = None,
+    response_format: Optional[str] = Query(None, alias="format"),
+):
+    """Get health metrics for a user
     
-    if not metrics:
+    start/end select a time range; otherwise the last `days` days up to the
+    latest reading are returned. Results are paged by `limit`; pass the
+    returned next_cursor (with the same filters) to fetch the next page.
+    
+    For charts, `resolution` (auto, hour, day or lttb) and/or `max_points`
+    return the whole range downsampled instead of paged raw rows: min/mean/max
+    buckets, or a shape-preserving subset of readings with lttb (see
+    services.downsample). `fields` limits the vitals returned, e.g.
+    fields=heart_rate,blood_glucose.
+    
+    format=columnar returns "metrics" as one array per field plus a
+    "timestamp" array (pages of up to MAX_COLUMNAR_PAGE_SIZE rows);
+    format=msgpack or an Accept: application/msgpack header returns the
+    same shape as MessagePack.
+    
+    Responses carry an ETag from the user's metrics version; a poll with a
+    matching If-None-Match gets 304 Not Modified.
+    """
+    conditional = ConditionalGet(request, "metrics", user_id, ("metrics",))
+    if conditional.response:
+        return conditional.response
+    
+    series = await load_user_series(user_id)
+    
+    if not series:
         # Auto-initialize if no data exists
         await initialize_health_data(user_id)
-        metrics = get_user_health_data(user_id)
+        series = get_user_series(user_id)
     
-    # Filter by days if requested
-    if days < len(metrics):
-        metrics = metrics[-days:]
+    start_us = to_epoch_us(start) if start else None
+    end_us = to_epoch_us(end) if end else None
+    if start_us is None and end_us is None and len(series):
+        # Filter by days if requested, counting back from the latest reading
+        start_us = series.timestamps[-1] - days * US_PER_DAY + 1
     
-    return {
+    try:
+        fmt = negotiate_format(response_format, request.headers.get("accept"))
+        names = parse_fields(fields)
+        if resolution is None and max_points is not None:
+            resolution = "auto"
+        if resolution not in (None, "raw"):
+            result = {"user_id": user_id, **downsample(
+                user_id, series, start_us, end_us, resolution, max_points, names
+            )}
+            if fmt != "rows":
+                result["metrics"] = rows_to_columns(result["metrics"])
+            return conditional.respond(result, fmt)
+        if fmt == "rows" and limit > MAX_METRICS_PAGE_SIZE:
+            raise ValueError(f"limit above {MAX_METRICS_PAGE_SIZE} needs format=columnar or msgpack")
+        lo, hi, total, next_cursor = series.page(start_us, end_us, cursor, limit)
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if fmt == "rows":
+        metrics = [select_fields(series.row(i), names) for i in range(lo, hi)]
+    else:
+        metrics = series_columns(series, lo, hi, names)
+    
+    result = {
         "user_id": user_id,
         "metrics": metrics,
-        "count": len(metrics)
+        "count": hi - lo,
+        "total": total,
+        "next_cursor": next_cursor
     }
+    if fmt != "rows":
+        extras = series.extras_between(lo, hi)
+        if extras:
+            # Non-vital fields a device sent, keyed by position in the page
+            result["extras"] = {str(i): e for i, e in extras.items()}
+    return conditional.respond(result, fmt)
 
 @router.get("/profile/{user_id}")
-async def get_user_profile(user_id: str = "elderly_001"):
+async def get_user_profile(request: Request, user_id: str = "elderly_001"):
     """Get user health profile"""
+    conditional = ConditionalGet(request, "profile", user_id, ("profile",))
+    if conditional.response:
+        return conditional.response
     profile = generate_elderly_user_profile(user_id)
-    return profile
+    return conditional.respond(profile)
 
 @router.get("/summary/{user_id}")
-async def get_health_summary(user_id: str):
+async def get_health_summary(request: Request, user_id: str):
     """Get a summary of user's health status"""
-    metrics = get_user_health_data(user_id)
+    # Alerts only change with new readings, so the metrics version covers both
+    conditional = ConditionalGet(request, "summary", user_id, ("metrics",))
+    if conditional.response:
+        return conditional.response
+    
+    series = await load_user_series(user_id)
     
-    if not metrics:
+    if not series:
         await initialize_health_data(user_id)
-        metrics = get_user_health_data(user_id)
+        series = get_user_series(user_id)
     
-    if not metrics:
+    if not series:
         raise HTTPException(status_code=404, detail="No health data found")
     
-    # Calculate averages from latest data
-    latest = metrics[-1] if metrics else None
-    avg_hr = sum(m["heart_rate"] for m in metrics[-7:]) / min(7, len(metrics))
-    avg_bp_sys = sum(m["blood_pressure_systolic"] for m in metrics[-7:]) / min(7, len(metrics))
-    avg_glucose = sum(m["blood_glucose"] for m in metrics[-7:]) / min(7, len(metrics))
+    # Read the incrementally maintained rolling windows instead of rescanning
+    latest = series.row(-1)
+    rolling = series.rollups.summary()
+    weekly = rolling["7d"]
+    avg_hr = weekly["heart_rate"]["mean"]
+    avg_bp_sys = weekly["blood_pressure_systolic"]["mean"]
+    avg_glucose = weekly["blood_glucose"]["mean"]
     
-    return {
+    # Alerts raised by the rule engine for readings in the last week
+    recent_since = series.timestamps[-1] - 7 * US_PER_DAY
+    
+    return conditional.respond({
         "user_id": user_id,
-        "last_updated": latest.get("timestamp") if latest else None,
+        "last_updated": latest.get("timestamp"),
         "latest_metrics": latest,
         "weekly_averages": {
-            "heart_rate": round(avg_hr),
-            "blood_pressure_systolic": round(avg_bp_sys),
-            "blood_glucose": round(avg_glucose)
+            "heart_rate": round_or_none(avg_hr),
+            "blood_pressure_systolic": round_or_none(avg_bp_sys),
+            "blood_glucose": round_or_none(avg_glucose)
         },
-        "alerts": [
-            {
-                "type": "high_blood_pressure",
-                "severity": "warning",
-                "message": f"Recent BP readings averaging {round(avg_bp_sys)}/{round(sum(m['blood_pressure_diastolic'] for m in metrics[-7:]) / min(7, len(metrics)))} mmHg - consider consulting physician"
-            },
-            {
-                "type": "pre_diabetes",
-                "severity": "info",
-                "message": f"Average glucose {round(avg_glucose)} mg/dL - maintain healthy diet and exercise"
-            }
-        ]
-    }
+        "rolling_averages": rolling,
+        "alerts": get_user_alerts(user_id, limit=10, since_us=recent_since)
+    })
+
+def round_or_none(value):
+    """Round an average, passing through None for vitals with no readings"""
+    return round(value) if value is not None else None
 
 @router.post("/metrics/{user_id}")
 async def add_health_metric(user_id: str, metric: dict):
     """Add a new health metric (for real device data)"""
     metric["timestamp"] = datetime.now().isoformat()
-    add_health_data(user_id, metric)
+    await load_user_series(user_id)
+    try:
+        alerts = add_health_data(user_id, metric)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metric: {str(e)}")
     
     return {
         "status": "success",
         "message": "Health metric recorded",
-        "metric": metric
+        "metric": metric,
+        "alerts": alerts
+    }
+
+@router.post("/metrics/{user_id}/batch")
+async def add_health_metrics_batch(user_id: str, request: Request):
+    """Bulk-ingest device readings, keeping each reading's own timestamp
+    
+    Accepts a JSON array of HealthMetric objects, or newline-delimited JSON
+    (Content-Type: application/x-ndjson) which is validated as it streams
+    in. Valid rows are stored in one operation; invalid rows are reported
+    by position. Target throughput is ~100k rows/s per core.
+    """
+    batch = MetricBatch()
+    content_type = request.headers.get("content-type", "")
+    
+    # Parsing and validation run in a worker thread so large batches don't
+    # stall the event loop; the batch is only touched by one call at a time
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            splitter = LineSplitter()
+            async for chunk in request.stream():
+                lines = splitter.feed(chunk)
+                if lines:
+                    await run_in_threadpool(batch.add_json_lines, lines)
+            await run_in_threadpool(batch.add_json_lines, [splitter.finish()])
+            await run_in_threadpool(batch.flush)
+        else:
+            body = await read_body(request.stream(), request.headers.get("content-length"))
+            await run_in_threadpool(parse_json_array, body, batch)
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Stored on the event loop: request handlers read the series there
+    await load_user_series(user_id)
+    _, alerts = add_health_data_batch(user_id, batch.timestamps, batch.values, batch.extras)
+    
+    return {
+        "status": "success" if not batch.rejected else "partial",
+        "user_id": user_id,
+        **batch.report(),
+        "alerts": alerts[-MAX_REPORTED_ALERTS:],
+        "alert_count": len(alerts)
+    }
+
+@router.get("/alerts/{user_id}")
+async def get_health_alerts(
+    user_id: str,
+    since: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=200),
+):
+    """Get alerts raised for a user's readings, newest first"""
+    await load_user_series(user_id)
+    alerts = get_user_alerts(user_id, limit=limit, since_us=to_epoch_us(since) if since else None)
+    return {
+        "user_id": user_id,
+        "alerts": alerts,
+        "count": len(alerts)
     }
@@ -0,0 +1,129 @@
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence, Tuple
+
+# Rolling windows reported by /api/health/summary, in days
+WINDOWS = (7, 30, 90)
+MAX_WINDOW_DAYS = max(WINDOWS)
+
+US_PER_DAY = 86_400_000_000
+
+
+class RollingAggregates:
+    """Per-user running count/sum/min/max for each vital, bucketed by day
+
+    add() touches a single day bucket, so ingest stays O(1). Window queries
+    merge at most MAX_WINDOW_DAYS buckets, which is independent of history
+    length, and are memoized until the next add(). Windows end on the day of
+    the latest reading, matching how the summary treats "recent" data.
+    """
+
+    def __init__(self, vitals: Tuple[str, ...]):
+        self.vitals = vitals
+        # day number -> {vital: [count, sum, min, max]}
+        self._days: Dict[int, Dict[str, list]] = {}
+        self.latest_day: Optional[int] = None
+        self._window_cache: Dict[int, Dict[str, Dict[str, Optional[float]]]] = {}
+
+    def add(self, timestamp_us: int, values: Sequence[Optional[float]]) -> None:
+        """Fold one reading (values ordered like self.vitals) into its day bucket"""
+        day = timestamp_us // US_PER_DAY
+        if self.latest_day is not None and day <= self.latest_day - MAX_WINDOW_DAYS:
+            return  # too old to fall in any window
+
+        bucket = self._days.get(day)
+        if bucket is None:
+            bucket = self._days[day] = {}
+        for vital, value in zip(self.vitals, values):
+            if value is None:
+                continue
+            stats = bucket.get(vital)
+            if stats is None:
+                bucket[vital] = [1, value, value, value]
+            else:
+                stats[0] += 1
+                stats[1] += value
+                if value < stats[2]:
+                    stats[2] = value
+                if value > stats[3]:
+                    stats[3] = value
+
+        if self.latest_day is None or day > self.latest_day:
+            self.latest_day = day
+            self._expire()
+        self._window_cache.clear()
+
+    def add_many(self, timestamps: Sequence[int], columns: Sequence[Sequence[Optional[float]]]) -> None:
+        """Fold a batch sorted by timestamp (one column per vital) into the day buckets
+
+        Each day's run of readings is reduced with builtin sum/min/max over
+        column slices rather than a Python loop per reading.
+        """
+        count = len(timestamps)
+        start = 0
+        while start < count:
+            day = timestamps[start] // US_PER_DAY
+            end = bisect_left(timestamps, (day + 1) * US_PER_DAY, start + 1)
+            if self.latest_day is None or day > self.latest_day - MAX_WINDOW_DAYS:
+                bucket = self._days.setdefault(day, {})
+                for vital, column in zip(self.vitals, columns):
+                    values = column[start:end]
+                    if None in values:
+                        values = [v for v in values if v is not None]
+                    if not values:
+                        continue
+                    stats = bucket.get(vital)
+                    low, high, total = min(values), max(values), sum(values)
+                    if stats is None:
+                        bucket[vital] = [len(values), total, low, high]
+                    else:
+                        stats[0] += len(values)
+                        stats[1] += total
+                        stats[2] = min(stats[2], low)
+                        stats[3] = max(stats[3], high)
+                if self.latest_day is None or day > self.latest_day:
+                    self.latest_day = day
+                    self._expire()
+            start = end
+        self._window_cache.clear()
+
+    def window(self, days: int) -> Dict[str, Dict[str, Optional[float]]]:
+        """Return {vital: {mean, min, max, count}} over the last `days` days"""
+        cached = self._window_cache.get(days)
+        if cached is not None:
+            return cached
+
+        totals = {vital: [0, 0.0, None, None] for vital in self.vitals}
+        if self.latest_day is not None:
+            for day in range(self.latest_day - days + 1, self.latest_day + 1):
+                bucket = self._days.get(day)
+                if not bucket:
+                    continue
+                for vital, stats in bucket.items():
+                    total = totals[vital]
+                    total[0] += stats[0]
+                    total[1] += stats[1]
+                    if total[2] is None or stats[2] < total[2]:
+                        total[2] = stats[2]
+                    if total[3] is None or stats[3] > total[3]:
+                        total[3] = stats[3]
+
+        result = {
+            vital: {
+                "mean": total[1] / total[0] if total[0] else None,
+                "min": total[2],
+                "max": total[3],
+                "count": total[0],
+            }
+            for vital, total in totals.items()
+        }
+        self._window_cache[days] = result
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        """Return every configured window keyed as "7d", "30d", ..."""
+        return {f"{days}d": self.window(days) for days in WINDOWS}
+
+    def _expire(self) -> None:
+        cutoff = self.latest_day - MAX_WINDOW_DAYS
+        for day in [d for d in self._days if d <= cutoff]:
+            del self._days[day]
@@ -0,0 +1,109 @@
+import os
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+# Alerts buffered per subscriber before the oldest are dropped
+ALERT_SUBSCRIBER_QUEUE = int(os.getenv("ALERT_SUBSCRIBER_QUEUE", "100"))
+# A subscriber that has dropped this many alerts is disconnected
+ALERT_SUBSCRIBER_MAX_DROPPED = int(os.getenv("ALERT_SUBSCRIBER_MAX_DROPPED", "1000"))
+
+# Fields a view_basic guardian gets, and only for critical alerts
+BASIC_ALERT_FIELDS = ("user_id", "type", "severity", "timestamp")
+
+
+def filter_alert(alert: Dict[str, Any], access_level: str) -> Optional[Dict[str, Any]]:
+    """The part of an alert a guardian with this access level may see (None = nothing)"""
+    if access_level in ("view_all", "view_alerts"):
+        return alert
+    if access_level == "view_basic" and alert["severity"] == "critical":
+        return {field: alert[field] for field in BASIC_ALERT_FIELDS}
+    return None
+
+
+class Subscription:
+    """One guardian's live alert feed over a set of wards"""
+
+    def __init__(self, guardian_id: str, access_levels: Dict[str, str], maxsize: int = ALERT_SUBSCRIBER_QUEUE):
+        self.guardian_id = guardian_id
+        self.access_levels = access_levels  # ward user_id -> access_level
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, alert: Dict[str, Any]) -> None:
+        """Queue an alert without blocking, dropping the oldest if the subscriber is behind"""
+        if self.closed:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped >= ALERT_SUBSCRIBER_MAX_DROPPED:
+                self.close()
+                return
+        self.queue.put_nowait(alert)
+
+    def close(self) -> None:
+        """Stop the feed; a waiting reader gets None"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next alert; None once closed. Raises asyncio.TimeoutError after timeout seconds"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class AlertBus:
+    """In-process pub/sub fanning alerts out to guardian subscriptions
+
+    Subscriptions are indexed by ward, so publishing an alert touches only
+    that user's subscribers, and idle subscribers cost nothing but their
+    queue. Publishing never blocks: each subscriber has a bounded queue,
+    a slow subscriber loses its oldest alerts (counted in `dropped`) and is
+    disconnected if it falls too far behind.
+    """
+
+    def __init__(self):
+        self.by_user: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, guardian_id: str, access_levels: Dict[str, str]) -> Subscription:
+        """Open a feed for a guardian; access_levels maps each ward to the guardian's level"""
+        subscription = Subscription(guardian_id, access_levels)
+        for user_id in access_levels:
+            self.by_user.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        for user_id in subscription.access_levels:
+            subscribers = self.by_user.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.by_user[user_id]
+
+    def publish(self, alert: Dict[str, Any]) -> None:
+        """Deliver an alert to the ward's subscribers (safe to call from any thread)"""
+        for subscription in list(self.by_user.get(alert["user_id"], ())):
+            visible = filter_alert(alert, subscription.access_levels[alert["user_id"]])
+            if visible is None:
+                continue
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is subscription.loop:
+                subscription.offer(visible)
+            else:
+                subscription.loop.call_soon_threadsafe(subscription.offer, visible)
+
+    def subscriber_count(self) -> int:
+        return len({s for subscribers in self.by_user.values() for s in subscribers})
+
+
+# Shared bus; the alert engine publishes every new alert to it
+alert_bus = AlertBus()
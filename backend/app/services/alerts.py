@@ -0,0 +1,344 @@
+import os
+import uuid
+import operator
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.timeseries import METRIC_COLUMNS, MISSING_INT, from_epoch_us
+
+US_PER_MINUTE = 60_000_000
+COMPARATORS = {">": operator.gt, "<": operator.lt}
+
+# A rule that keeps firing is reported again only after this much reading time
+ALERT_COOLDOWN_MINUTES = int(os.getenv("ALERT_COOLDOWN_MINUTES", "30"))
+# Alerts kept per user for the summary / guardian views
+ALERT_HISTORY_LIMIT = int(os.getenv("ALERT_HISTORY_LIMIT", "200"))
+
+VITAL_INDEX = {name: i for i, name in enumerate(METRIC_COLUMNS)}
+
+
+class ThresholdRule:
+    """Fires when a single reading is above/below a fixed limit"""
+
+    kind = "threshold"
+
+    def __init__(self, alert_type: str, vital: str, op: str, limit: float, severity: str,
+                 message: str, cooldown_minutes: int = ALERT_COOLDOWN_MINUTES):
+        self.alert_type, self.vital, self.op, self.limit = alert_type, vital, op, limit
+        self.severity, self.message = severity, message
+        self.index = VITAL_INDEX[vital]
+        self.cooldown_us = cooldown_minutes * US_PER_MINUTE
+        self.compare = COMPARATORS[op]
+
+    def new_state(self):
+        return None
+
+    def check(self, state, timestamp: int, value: float):
+        """Return the value to report if this reading fires the rule, else None"""
+        return value if self.compare(value, self.limit) else None
+
+    def check_batch(self, state, timestamps: np.ndarray, values: np.ndarray):
+        """Vectorized check over readings sorted by time: (firing mask, reported values)"""
+        return self.compare(values, self.limit), values
+
+
+class RateOfChangeRule:
+    """Fires when a vital moves by at least `delta` since its previous reading
+
+    direction is "rise", "drop" or "either"; readings further apart than
+    within_minutes are not compared.
+    """
+
+    kind = "rate_of_change"
+
+    def __init__(self, alert_type: str, vital: str, direction: str, delta: float, within_minutes: int,
+                 severity: str, message: str, cooldown_minutes: int = ALERT_COOLDOWN_MINUTES):
+        self.alert_type, self.vital, self.direction, self.delta = alert_type, vital, direction, delta
+        self.severity, self.message = severity, message
+        self.index = VITAL_INDEX[vital]
+        self.within_us = within_minutes * US_PER_MINUTE
+        self.cooldown_us = cooldown_minutes * US_PER_MINUTE
+
+    def new_state(self):
+        return [None, None]  # previous (timestamp, value)
+
+    def _moved(self, change):
+        if self.direction == "rise":
+            return change >= self.delta
+        if self.direction == "drop":
+            return -change >= self.delta
+        return abs(change) >= self.delta
+
+    def check(self, state, timestamp: int, value: float):
+        prev_ts, prev_value = state
+        state[0], state[1] = timestamp, value
+        if prev_ts is not None and timestamp - prev_ts <= self.within_us and self._moved(value - prev_value):
+            return value - prev_value
+        return None
+
+    def check_batch(self, state, timestamps: np.ndarray, values: np.ndarray):
+        prev_ts, prev_value = state
+        if prev_ts is None:  # nothing to compare the first reading with
+            prev_ts, prev_value = int(timestamps[0]), np.nan
+        ts = np.concatenate(([prev_ts], timestamps))
+        vals = np.concatenate(([prev_value], values))
+        change = np.diff(vals)
+        mask = self._moved(change) & (np.diff(ts) <= self.within_us)
+        if len(timestamps):
+            state[0], state[1] = int(timestamps[-1]), float(values[-1])
+        return mask, change
+
+
+class RollingMeanRule:
+    """Fires when the mean of a vital over a trailing time window crosses a limit
+
+    By default it fires at most once per window length while the mean stays out of range.
+    """
+
+    kind = "rolling_mean"
+
+    def __init__(self, alert_type: str, vital: str, window_hours: int, op: str, limit: float,
+                 min_readings: int, severity: str, message: str, cooldown_minutes: Optional[int] = None):
+        self.alert_type, self.vital, self.op, self.limit = alert_type, vital, op, limit
+        self.min_readings, self.severity, self.message = min_readings, severity, message
+        self.index = VITAL_INDEX[vital]
+        self.window_us = window_hours * 60 * US_PER_MINUTE
+        self.cooldown_us = self.window_us if cooldown_minutes is None else cooldown_minutes * US_PER_MINUTE
+        self.compare = COMPARATORS[op]
+
+    def new_state(self):
+        return {"window": deque(), "sum": 0.0}
+
+    def check(self, state, timestamp: int, value: float):
+        window: Deque = state["window"]
+        window.append((timestamp, value))
+        state["sum"] += value
+        while window[0][0] <= timestamp - self.window_us:
+            state["sum"] -= window.popleft()[1]
+        if len(window) < self.min_readings:
+            return None
+        mean = state["sum"] / len(window)
+        return mean if self.compare(mean, self.limit) else None
+
+    def check_batch(self, state, timestamps: np.ndarray, values: np.ndarray):
+        window: Deque = state["window"]
+        carried = len(window)
+        ts = np.concatenate((np.fromiter((t for t, _ in window), np.int64, carried), timestamps))
+        vals = np.concatenate((np.fromiter((v for _, v in window), np.float64, carried), values))
+        sums = np.concatenate(([0.0], np.cumsum(vals)))
+        end = np.arange(1, len(ts) + 1)
+        start = np.searchsorted(ts, ts - self.window_us, side="right")
+        counts = end - start
+        means = (sums[end] - sums[start]) / counts
+        mask = self.compare(means, self.limit) & (counts >= self.min_readings)
+
+        keep = start[-1] if len(ts) else 0
+        state["window"] = deque(zip(ts[keep:].tolist(), vals[keep:].tolist()))
+        state["sum"] = float(vals[keep:].sum())
+        return mask[carried:], means[carried:]
+
+
+# Default rules. The thresholds match the ones the assistant is told to flag
+# (BP >150/100, O2 <94%, glucose >200 or <70).
+ALERT_RULES = [
+    ThresholdRule("high_blood_pressure", "blood_pressure_systolic", ">", 150, "warning",
+                  "Systolic blood pressure {value:.0f} mmHg is above 150"),
+    ThresholdRule("high_blood_pressure", "blood_pressure_diastolic", ">", 100, "warning",
+                  "Diastolic blood pressure {value:.0f} mmHg is above 100"),
+    ThresholdRule("low_oxygen", "oxygen_saturation", "<", 94, "critical",
+                  "Oxygen saturation {value:.0f}% is below 94%"),
+    ThresholdRule("abnormal_glucose", "blood_glucose", ">", 200, "warning",
+                  "Blood glucose {value:.0f} mg/dL is above 200"),
+    ThresholdRule("abnormal_glucose", "blood_glucose", "<", 70, "critical",
+                  "Blood glucose {value:.0f} mg/dL is below 70"),
+    RateOfChangeRule("rapid_blood_pressure_rise", "blood_pressure_systolic", "rise", 30, 60, "warning",
+                     "Systolic blood pressure rose {value:+.0f} mmHg within an hour"),
+    RateOfChangeRule("oxygen_drop", "oxygen_saturation", "drop", 4, 60, "critical",
+                     "Oxygen saturation changed {value:+.0f} points within an hour"),
+    RateOfChangeRule("rapid_glucose_change", "blood_glucose", "either", 80, 60, "warning",
+                     "Blood glucose changed {value:+.0f} mg/dL within an hour"),
+    RateOfChangeRule("heart_rate_spike", "heart_rate", "rise", 30, 15, "warning",
+                     "Heart rate rose {value:+.0f} bpm within 15 minutes"),
+    RollingMeanRule("sustained_high_blood_pressure", "blood_pressure_systolic", 7 * 24, ">", 140, 3, "warning",
+                    "Systolic blood pressure has averaged {value:.0f} mmHg over the last 7 days - consider consulting physician"),
+    RollingMeanRule("elevated_average_glucose", "blood_glucose", 7 * 24, ">", 140, 3, "info",
+                    "Blood glucose has averaged {value:.0f} mg/dL over the last 7 days - maintain healthy diet and exercise"),
+]
+
+
+class UserAlertState:
+    """Incremental rule state and recent alerts for one user"""
+
+    def __init__(self, rules):
+        self.rule_states = [rule.new_state() for rule in rules]
+        self.last_fired: List[Optional[int]] = [None] * len(rules)
+        self.latest_ts: Optional[int] = None
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=ALERT_HISTORY_LIMIT)
+
+
+class AlertEngine:
+    """Evaluates alert rules against readings as they are ingested
+
+    Each user keeps a little per-rule state (previous reading, trailing
+    window sum), so a new reading is checked in constant time without
+    rescanning history. Batches are evaluated column-wise with numpy.
+    Rate-of-change and rolling rules only advance on in-order readings;
+    late readings are still checked against the thresholds.
+    """
+
+    def __init__(self, rules=ALERT_RULES):
+        self.rules = list(rules)
+        self.users: Dict[str, UserAlertState] = {}
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def has_state(self, user_id: str) -> bool:
+        return user_id in self.users
+
+    def forget(self, user_id: str) -> None:
+        """Drop a user's rule state and history (rebuilt by evaluate_series when needed)"""
+        self.users.pop(user_id, None)
+
+    def _state(self, user_id: str) -> UserAlertState:
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserAlertState(self.rules)
+        return state
+
+    def evaluate(self, user_id: str, timestamp: int, values: Sequence[Optional[float]]) -> List[Dict[str, Any]]:
+        """Check one encoded reading (values ordered like METRIC_COLUMNS, None = missing)"""
+        state = self._state(user_id)
+        in_order = state.latest_ts is None or timestamp >= state.latest_ts
+        if in_order:
+            state.latest_ts = timestamp
+        fired = []
+        for i, (rule, rule_state) in enumerate(zip(self.rules, state.rule_states)):
+            value = values[rule.index]
+            if value is None or (not in_order and rule.kind != "threshold"):
+                continue
+            reported = rule.check(rule_state, timestamp, value)
+            if reported is not None and self._cooled_down(state, i, timestamp):
+                fired.append(self._alert(user_id, rule, timestamp, reported))
+        return self._publish(state, fired) if fired else fired
+
+    def evaluate_batch(self, user_id: str, timestamps: Sequence[int], values: Dict[str, Sequence[Optional[float]]]) -> List[Dict[str, Any]]:
+        """Check a batch of readings given as columns (None = missing)"""
+        columns = {
+            name: np.array(values[name] if None not in values[name] else [np.nan if v is None else v for v in values[name]],
+                           dtype=np.float64)
+            for name in {rule.vital for rule in self.rules}
+        }
+        return self._evaluate_columns(user_id, np.asarray(timestamps, dtype=np.int64), columns)
+
+    def evaluate_series(self, user_id: str, series, publish: bool = False) -> List[Dict[str, Any]]:
+        """Re-evaluate a stored MetricSeries from scratch (e.g. after loading it from storage)
+
+        Rebuilt alerts go into the user's history; listeners only hear about
+        them when publish is set.
+        """
+        self.forget(user_id)
+        columns = {}
+        for name in {rule.vital for rule in self.rules}:
+            column = series.columns[name]
+            data = np.frombuffer(column, dtype=column.typecode).astype(np.float64)
+            if column.typecode != "f":
+                data[data == MISSING_INT[column.typecode]] = np.nan
+            columns[name] = data
+        return self._evaluate_columns(user_id, np.frombuffer(series.timestamps, dtype=np.int64), columns, publish)
+
+    def _evaluate_columns(self, user_id: str, timestamps: np.ndarray, columns: Dict[str, np.ndarray],
+                          publish: bool = True) -> List[Dict[str, Any]]:
+        if not len(timestamps):
+            return []
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = timestamps[order]
+        state = self._state(user_id)
+        # Readings older than what the rules have already seen only get threshold checks
+        first_in_order = 0 if state.latest_ts is None else int(np.searchsorted(timestamps, state.latest_ts, side="left"))
+
+        candidates = []
+        for i, rule in enumerate(self.rules):
+            values = columns[rule.vital][order]
+            lo = 0 if rule.kind == "threshold" else first_in_order
+            present = np.flatnonzero(~np.isnan(values[lo:])) + lo
+            if not len(present):
+                continue
+            mask, reported = rule.check_batch(state.rule_states[i], timestamps[present], values[present])
+            hits = np.flatnonzero(mask)
+            candidates.extend(self._cooled_down_batch(state, i, timestamps[present[hits]], reported[hits]))
+
+        state.latest_ts = max(int(timestamps[-1]), state.latest_ts or int(timestamps[-1]))
+        fired = [self._alert(user_id, self.rules[i], timestamp, reported) for timestamp, i, reported in sorted(candidates)]
+        return self._publish(state, fired, publish)
+
+    def recent(self, user_id: str, limit: int = 20, since_us: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest-first alerts for a user, optionally only those for readings at/after since_us"""
+        state = self.users.get(user_id)
+        if state is None:
+            return []
+        alerts = []
+        for alert in reversed(state.history):
+            if since_us is not None and alert["_ts"] < since_us:
+                continue
+            alerts.append({k: v for k, v in alert.items() if k != "_ts"})
+            if len(alerts) >= limit:
+                break
+        return alerts
+
+    def _cooled_down(self, state: UserAlertState, rule_index: int, timestamp: int) -> bool:
+        last = state.last_fired[rule_index]
+        if last is not None and abs(timestamp - last) < self.rules[rule_index].cooldown_us:
+            return False
+        state.last_fired[rule_index] = timestamp
+        return True
+
+    def _cooled_down_batch(self, state: UserAlertState, rule_index: int, timestamps: np.ndarray,
+                           reported: np.ndarray) -> List[Tuple[int, int, float]]:
+        """(timestamp, rule_index, value) of the hits that fire, same as _cooled_down on each in order
+
+        Hits within a cooldown of the last firing are skipped with a binary
+        search, so a long breach costs one step per alert rather than per reading.
+        """
+        cooldown = self.rules[rule_index].cooldown_us
+        last = state.last_fired[rule_index]
+        fired = []
+        pos, count = 0, len(timestamps)
+        while pos < count:
+            timestamp = int(timestamps[pos])
+            if last is None or abs(timestamp - last) >= cooldown:
+                last = timestamp
+                fired.append((timestamp, rule_index, float(reported[pos])))
+            # Every hit before last + cooldown is still cooling down
+            pos = max(pos + 1, int(np.searchsorted(timestamps, last + cooldown, side="left")))
+        state.last_fired[rule_index] = last
+        return fired
+
+    def _alert(self, user_id: str, rule, timestamp: int, value: float) -> Dict[str, Any]:
+        return {
+            "alert_id": f"alert_{uuid.uuid4().hex[:16]}",
+            "user_id": user_id,
+            "type": rule.alert_type,
+            "severity": rule.severity,
+            "rule": rule.kind,
+            "vital": rule.vital,
+            "value": round(value, 2),
+            "message": rule.message.format(value=value),
+            "timestamp": from_epoch_us(timestamp).isoformat(),
+            "detected_at": datetime.now().isoformat(),
+            "_ts": timestamp,
+        }
+
+    def _publish(self, state: UserAlertState, fired: List[Dict[str, Any]], notify: bool = True) -> List[Dict[str, Any]]:
+        state.history.extend(fired)
+        public = [{k: v for k, v in alert.items() if k != "_ts"} for alert in fired]
+        if notify:
+            for alert in public:
+                for listener in self.listeners:
+                    listener(alert)
+        return public
+
+
+# Shared engine fed by data_service on every ingest
+alert_engine = AlertEngine()
@@ -0,0 +1,149 @@
+import os
+import re
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# Vocabulary of canonical conditions/medications and their synonyms. Point
+# CLINICAL_VOCABULARY_PATH at a larger export (same JSON shape) to extend it.
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "clinical_vocabulary.json")
+CLINICAL_VOCABULARY_PATH = os.getenv("CLINICAL_VOCABULARY_PATH") or DEFAULT_VOCABULARY_PATH
+
+# Cues that negate a term when they appear shortly before it in the same clause
+NEGATION_CUES = [
+    "no", "not", "denies", "denied", "without", "negative for", "ruled out", "rules out",
+    "no evidence of", "no history of", "no signs of", "free of", "absence of",
+    # Negations ending in a scope terminator, so the terminator doesn't cancel them
+    "not have", "not had", "never had", "not diagnosed with", "never diagnosed with", "not been diagnosed with",
+    "not consistent with",
+]
+NEGATION_WINDOW_CHARS = 48
+# As in NegEx, negation does not carry past the end of a clause: sentence
+# punctuation, a comma, a conjunction, or a cue that affirms what follows
+SCOPE_TERMINATORS = [
+    "and", "but", "however", "although", "except", "reports", "reported", "has", "have", "had", "with",
+    "diagnosed", "presents", "complains of", "positive for", "consistent with", "significant for",
+]
+NEGATION_SCOPE_BREAK = re.compile(
+    r"[.,;:!?\n]|(?<!\w)(?:" + "|".join(re.escape(t) for t in sorted(SCOPE_TERMINATORS, key=len, reverse=True))
+    + r")(?!\w)",
+    re.IGNORECASE,
+)
+
+
+def normalize_term(term: str) -> str:
+    """Lowercase a term and collapse internal whitespace"""
+    return " ".join(term.lower().split())
+
+
+def _trie_pattern(node: Dict[str, Any]) -> str:
+    """Turn a character trie into a regex
+
+    Terms sharing a prefix share one path, and every branch point is an
+    alternation of distinct next characters, so matching at a position
+    costs at most the length of the longest term rather than one attempt
+    per vocabulary entry.
+    """
+    terminal = "" in node
+    branches = []
+    singles = []
+    for char in sorted(k for k in node if k):
+        child = _trie_pattern(node[char])
+        piece = r"\s+" if char == " " else re.escape(char)
+        if child:
+            branches.append(piece + child)
+        else:
+            singles.append(piece)
+
+    if singles:
+        branches.append(singles[0] if len(singles) == 1 else "[" + "".join(singles) + "]")
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 and not terminal else "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if terminal else pattern
+
+
+def compile_terms(terms: Iterable[str]) -> re.Pattern:
+    """Compile terms into a single case-insensitive whole-word regex"""
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = True
+    return re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)", re.IGNORECASE)
+
+
+class ClinicalTermExtractor:
+    """Single-pass matcher for conditions and medications with synonyms
+
+    All synonyms are compiled once into one trie-shaped regex, so a document
+    is scanned in a single linear pass regardless of vocabulary size. Matches
+    are whole words, longest synonym first, and carry the canonical name,
+    category, character span and a NegEx-style negation flag.
+    """
+
+    def __init__(self, vocabulary: Dict[str, Dict[str, List[str]]]):
+        self.lookup: Dict[str, tuple] = {}
+        for category, entries in vocabulary.items():
+            for canonical, synonyms in entries.items():
+                for synonym in [canonical, *synonyms]:
+                    self.lookup.setdefault(normalize_term(synonym), (canonical, category))
+        self.pattern = compile_terms(self.lookup)
+        self.negation = re.compile(
+            r"(?<!\w)(?:" + "|".join(re.escape(c) for c in sorted(NEGATION_CUES, key=len, reverse=True)) + r")(?!\w)",
+            re.IGNORECASE,
+        )
+
+    def __len__(self) -> int:
+        return len(self.lookup)
+
+    def find(self, text: str) -> List[Dict[str, Any]]:
+        """Every vocabulary match in text, in order of appearance"""
+        matches = []
+        for match in self.pattern.finditer(text):
+            canonical, category = self.lookup[normalize_term(match.group())]
+            matches.append({
+                "term": match.group(),
+                "canonical": canonical,
+                "category": category,
+                "start": match.start(),
+                "end": match.end(),
+                "negated": self._is_negated(text, match.start()),
+            })
+        return matches
+
+    def extract(self, text: str) -> Dict[str, List[str]]:
+        """Canonical names per category for the non-negated matches"""
+        found: Dict[str, Dict[str, None]] = {category: {} for category in ("conditions", "medications")}
+        for match in self.find(text):
+            if not match["negated"]:
+                found.setdefault(match["category"], {})[match["canonical"]] = None
+        return {category: list(names) for category, names in found.items()}
+
+    def _is_negated(self, text: str, start: int) -> bool:
+        window = text[max(0, start - NEGATION_WINDOW_CHARS):start]
+        scope_start = max((m.end() for m in NEGATION_SCOPE_BREAK.finditer(window)), default=0)
+        # A cue such as "not have" ends on a terminator and still negates
+        return any(m.end() >= scope_start for m in self.negation.finditer(window))
+
+
+def load_vocabulary(path: str = CLINICAL_VOCABULARY_PATH) -> Dict[str, Dict[str, List[str]]]:
+    """Read a {"conditions": {...}, "medications": {...}} vocabulary file"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_extractor: Optional[ClinicalTermExtractor] = None
+
+
+def get_extractor() -> ClinicalTermExtractor:
+    """Shared extractor, compiled on first use"""
+    global _extractor
+    if _extractor is None:
+        _extractor = ClinicalTermExtractor(load_vocabulary())
+    return _extractor
+
+
+def extract_clinical_terms(text: str) -> Dict[str, List[str]]:
+    """Non-negated conditions and medications mentioned in text"""
+    return get_extractor().extract(text)
@@ -0,0 +1,132 @@
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Conversation memory limits - tune per deployment via .env
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "20"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", "300"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "10000"))
+CHAT_SESSION_TTL_MINUTES = int(os.getenv("CHAT_SESSION_TTL_MINUTES", "120"))
+
+# Characters of each compacted message kept in the running summary
+SUMMARY_SNIPPET_CHARS = 160
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def tokens_for_chars(chars: int) -> int:
+    """Rough token count of that many characters (~4 per token for English text)"""
+    return (chars + 3) // 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text"""
+    return tokens_for_chars(len(text))
+
+
+def _snippet(text: str) -> str:
+    """First sentence of a message, clipped to SUMMARY_SNIPPET_CHARS"""
+    text = " ".join(text.split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    return first if len(first) <= SUMMARY_SNIPPET_CHARS else first[:SUMMARY_SNIPPET_CHARS - 3] + "..."
+
+
+class ChatSession:
+    """One user's recent chat turns plus a summary of everything older
+
+    Turns live in a ring buffer of at most CHAT_HISTORY_MAX_TURNS. When
+    the turns exceed CHAT_HISTORY_TOKEN_BUDGET the oldest are folded into
+    a short extractive summary (itself capped at CHAT_SUMMARY_TOKEN_BUDGET),
+    so the history sent with each request stays roughly constant in size
+    however long the conversation runs.
+    """
+
+    def __init__(self, max_turns: int = CHAT_HISTORY_MAX_TURNS, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+                 summary_budget: int = CHAT_SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.turns: Deque[Tuple[str, str, int]] = deque(maxlen=max_turns)
+        self.turn_tokens = 0
+        self.summary_lines: Deque[str] = deque()
+        self.summary_tokens = 0
+        self.total_turns = 0
+        self.compacted_turns = 0
+        self.last_used = time.monotonic()
+
+    def add_turn(self, user_message: str, reply: str) -> None:
+        """Record a finished exchange, compacting older turns if over budget"""
+        if len(self.turns) == self.turns.maxlen:
+            self._compact_oldest()
+        tokens = estimate_tokens(user_message) + estimate_tokens(reply)
+        self.turns.append((user_message, reply, tokens))
+        self.turn_tokens += tokens
+        self.total_turns += 1
+        # Keep at least the latest turn verbatim even if it alone is over budget
+        while self.turn_tokens > self.token_budget and len(self.turns) > 1:
+            self._compact_oldest()
+
+    def history(self) -> List[Dict[str, str]]:
+        """Messages to send before the new user message"""
+        messages = []
+        if self.summary_lines:
+            messages.append({"role": "system", "content": "Summary of the earlier conversation:\n" + "\n".join(self.summary_lines)})
+        for user_message, reply, _ in self.turns:
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": reply})
+        return messages
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "turns": self.total_turns,
+            "turns_in_buffer": len(self.turns),
+            "compacted_turns": self.compacted_turns,
+            "history_tokens": self.turn_tokens + self.summary_tokens,
+        }
+
+    def _compact_oldest(self) -> None:
+        user_message, reply, tokens = self.turns.popleft()
+        self.turn_tokens -= tokens
+        self.compacted_turns += 1
+        line = f"- Patient asked: {_snippet(user_message)} Doc replied: {_snippet(reply)}"
+        self.summary_lines.append(line)
+        self.summary_tokens += estimate_tokens(line)
+        while self.summary_tokens > self.summary_budget and len(self.summary_lines) > 1:
+            self.summary_tokens -= estimate_tokens(self.summary_lines.popleft())
+
+
+class ChatSessionStore:
+    """LRU of chat sessions keyed by (user_id, session_id), expiring idle ones"""
+
+    def __init__(self, max_sessions: int = CHAT_MAX_SESSIONS, ttl_minutes: int = CHAT_SESSION_TTL_MINUTES):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_minutes * 60
+        self._sessions: "OrderedDict[Tuple[str, str], ChatSession]" = OrderedDict()
+
+    def get(self, user_id: str, session_id: str = "default") -> ChatSession:
+        """Get or start a session"""
+        key = (user_id, session_id)
+        session = self._sessions.get(key)
+        now = time.monotonic()
+        if session is None or now - session.last_used > self.ttl_seconds:
+            session = self._sessions[key] = ChatSession()
+        self._sessions.move_to_end(key)
+        session.last_used = now
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def peek(self, user_id: str, session_id: str = "default") -> Optional[ChatSession]:
+        return self._sessions.get((user_id, session_id))
+
+    def reset(self, user_id: str, session_id: str = "default") -> bool:
+        """Forget a session; returns whether one existed"""
+        return self._sessions.pop((user_id, session_id), None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# Shared session store for the chat routes
+chat_sessions = ChatSessionStore()
@@ -1,97 +1,235 @@
 import os
 import json
+import asyncio
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Any
-from cerebras.cloud.sdk import Cerebras
-
-# Mock database - in production, use a real DB
-HEALTH_DATA = {}
-USERS = {}
-DOCUMENTS = {}
-GUARDIANS = {}
-
-# Initialize Cerebras client
-client = Cerebras(
-    api_key=os.environ.get("CEREBRAS_API_KEY"),
-)
-
-def get_user_health_data(user_id: str) -> List[Dict[str, Any]]:
-    """Get all health data for a user"""
-    return HEALTH_DATA.get(user_id, [])
-
-def add_health_data(user_id: str, metric: Dict[str, Any]) -> None:
-    """Add health metric for a user"""
-    if user_id not in HEALTH_DATA:
-        HEALTH_DATA[user_id] = []
-    HEALTH_DATA[user_id].append(metric)
-
-def get_user_profile(user_id: str) -> Dict[str, Any]:
+from typing import List, Dict, Any, Sequence
+from app.services.alerts import alert_engine
+from app.services.alert_bus import alert_bus
+from app.services.llm_cache import response_cache
+from app.services.prompt_context import patient_contexts, build_patient_context
+from app.services.timeseries import MetricSeries, encode_metric
+from app.services.storage import create_backend
+from app.services.document_index import DocumentIndex
+from app.services.versions import data_versions
+
+# Storage backend (STORAGE_BACKEND=memory|sqlite); memory keeps the
+# original process-local mock database behaviour
+storage = create_backend()
+
+# New alerts are pushed to subscribed guardians as they are raised
+alert_engine.listeners.append(alert_bus.publish)
+
+# Resident per-user columnar readings. With a persistent backend this is an
+# LRU of the most recently used users; evicted users are reloaded on demand.
+HEALTH_DATA: "OrderedDict[str, MetricSeries]" = OrderedDict()
+MAX_RESIDENT_USERS = int(os.getenv("MAX_RESIDENT_USERS", "10000"))
+
+def _resident_series(user_id: str, create: bool = False) -> MetricSeries:
+    """Return the user's in-memory series, loading it from storage if needed"""
+    series = HEALTH_DATA.get(user_id)
+    if series is not None:
+        HEALTH_DATA.move_to_end(user_id)
+        return series
+    return _make_resident(user_id, storage.load_metrics(user_id), create)
+
+def _make_resident(user_id: str, series: MetricSeries, create: bool = False) -> MetricSeries:
+    """Keep a series loaded from storage (None if there was none) as the user's resident copy"""
+    if series is None:
+        if not create:
+            return None
+        series = MetricSeries()
+    elif not alert_engine.has_state(user_id):
+        # Rebuild alert state for readings that were loaded rather than ingested
+        alert_engine.evaluate_series(user_id, series)
+    HEALTH_DATA[user_id] = series
+    if storage.persistent:
+        while len(HEALTH_DATA) > MAX_RESIDENT_USERS:
+            # Alert state goes with the series and is rebuilt if the user comes back
+            evicted, _ = HEALTH_DATA.popitem(last=False)
+            alert_engine.forget(evicted)
+    return series
+
+async def load_user_series(user_id: str) -> MetricSeries:
+    """Like get_user_series, but a non-resident series is read from storage in a worker thread
+
+    Async handlers await this before using the synchronous accessors, so a
+    persistent backend's query and column rebuild don't stall the event loop.
+    """
+    if user_id in HEALTH_DATA or not storage.persistent:
+        return _resident_series(user_id)
+    loaded = await asyncio.to_thread(storage.load_metrics, user_id)
+    if user_id in HEALTH_DATA:
+        # Made resident by another request (e.g. an ingest) while this one loaded
+        return _resident_series(user_id)
+    return _make_resident(user_id, loaded)
+
+async def _storage_io(call, *args):
+    """Run a blocking storage call in a worker thread when the backend touches disk
+
+    SQLite writes wait for the write lock, which the group-commit flusher
+    holds for a whole batch, so they must not run on the event loop.
+    """
+    if not storage.persistent:
+        return call(*args)
+    return await asyncio.to_thread(call, *args)
+
+# Per-user document indexes, built from storage on first access
+DOCUMENT_INDEX: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+
+def _document_index(user_id: str) -> DocumentIndex:
+    """Return the user's document index, loading it from storage if needed"""
+    index = DOCUMENT_INDEX.get(user_id)
+    if index is not None:
+        DOCUMENT_INDEX.move_to_end(user_id)
+        return index
+    index = DOCUMENT_INDEX[user_id] = DocumentIndex(storage.list_documents(user_id))
+    if storage.persistent:
+        while len(DOCUMENT_INDEX) > MAX_RESIDENT_USERS:
+            DOCUMENT_INDEX.popitem(last=False)
+    return index
+
+def get_user_health_data(user_id: str) -> Sequence[Dict[str, Any]]:
+    """Get all health data for a user (a read-only list-of-dicts view)"""
+    series = _resident_series(user_id)
+    return series.rows() if series is not None else []
+
+def get_user_series(user_id: str) -> MetricSeries:
+    """Get the columnar series for a user, or None if they have no data"""
+    return _resident_series(user_id)
+
+async def read_user_series(user_id: str) -> MetricSeries:
+    """Get a user's series for a one-off read such as the insights batch
+
+    A non-resident series is loaded in a worker thread and not made
+    resident, so a scan over every user doesn't evict the ones being served.
+    """
+    series = HEALTH_DATA.get(user_id)
+    if series is not None or not storage.persistent:
+        return series
+    return await asyncio.to_thread(storage.load_metrics, user_id)
+
+async def get_metric_user_ids() -> List[str]:
+    """Get every user with stored health data"""
+    stored = await asyncio.to_thread(storage.metric_users)
+    return list(dict.fromkeys([*HEALTH_DATA, *stored]))
+
+def add_health_data(user_id: str, metric: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Add health metric for a user, returning any alerts it raised
+
+    Raises ValueError for malformed readings.
+    """
+    timestamp, values, extras = encode_metric(metric)
+    _resident_series(user_id, create=True).append_encoded(timestamp, values, extras)
+    storage.append_metric(user_id, timestamp, values, extras)
+    data_versions.bump(user_id, "metrics")
+    response_cache.invalidate_user(user_id, "metrics")
+    patient_contexts.invalidate(user_id)
+    return alert_engine.evaluate(user_id, timestamp, values)
+
+def add_health_data_batch(user_id: str, timestamps: List[int], values: Dict[str, List[Any]],
+                          extras: Dict[int, Dict[str, Any]] = None):
+    """Add a validated column batch (see services.ingest) for a user in one operation
+
+    extras maps batch positions to a reading's non-vital fields. Returns
+    (rows added, alerts raised).
+    """
+    added = _resident_series(user_id, create=True).extend_columns(timestamps, values, extras)
+    alerts = []
+    if added:
+        storage.append_metrics(user_id, timestamps, values, extras)
+        data_versions.bump(user_id, "metrics")
+        response_cache.invalidate_user(user_id, "metrics")
+        patient_contexts.invalidate(user_id)
+        alerts = alert_engine.evaluate_batch(user_id, timestamps, values)
+    return added, alerts
+
+def get_user_alerts(user_id: str, limit: int = 20, since_us: int = None) -> List[Dict[str, Any]]:
+    """Get a user's most recent alerts, newest first"""
+    if not alert_engine.has_state(user_id):
+        _resident_series(user_id)
+    return alert_engine.recent(user_id, limit, since_us)
+
+def is_initialized(user_id: str) -> bool:
+    """Whether mock data has already been generated for a user"""
+    return storage.is_initialized(user_id)
+
+def mark_initialized(user_id: str) -> None:
+    """Record that mock data has been generated for a user"""
+    storage.mark_initialized(user_id)
+
+async def get_user_profile(user_id: str) -> Dict[str, Any]:
     """Get user profile"""
-    return USERS.get(user_id)
+    return await _storage_io(storage.get_profile, user_id)
 
-def save_user_profile(user_id: str, profile: Dict[str, Any]) -> None:
+async def save_user_profile(user_id: str, profile: Dict[str, Any]) -> None:
     """Save user profile"""
-    USERS[user_id] = profile
+    await _storage_io(storage.save_profile, user_id, profile)
+    data_versions.bump(user_id, "profile")
+    response_cache.invalidate_user(user_id, "profile")
+    patient_contexts.invalidate(user_id)
 
-def save_document(user_id: str, document: Dict[str, Any]) -> None:
-    """Save medical document"""
-    if user_id not in DOCUMENTS:
-        DOCUMENTS[user_id] = []
-    DOCUMENTS[user_id].append(document)
+async def get_patient_context(user_id: str):
+    """Get (rendered chat context, profile) for a user, rebuilt only after their data changes"""
+    profile = None
+    if user_id not in patient_contexts:
+        # Storage reads happen here, off the loop; load() only renders
+        await load_user_series(user_id)
+        profile = await get_user_profile(user_id)
+    def load():
+        series = _resident_series(user_id)
+        latest = [series.row(-1)] if series is not None and len(series) else []
+        return build_patient_context(profile, latest), profile
+    return patient_contexts.get(user_id, load)
+
+async def save_document(user_id: str, document: Dict[str, Any]) -> None:
+    """Save medical document (replacing any record with the same document_id)"""
+    await _storage_io(storage.save_document, user_id, document)
+    _document_index(user_id).put(document)
+    data_versions.bump(user_id, "documents")
+    response_cache.invalidate_user(user_id, "documents")
 
 def get_user_documents(user_id: str) -> List[Dict[str, Any]]:
-    """Get all documents for a user"""
-    return DOCUMENTS.get(user_id, [])
-
-def analyze_with_cerebras(user_context: str, user_message: str) -> str:
-    """Call Cerebras API for health analysis and chat"""
-    if not client:
-        return "AI Assistant: I'm ready to help! Please provide your API key to enable full AI features."
-    
-    try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""You are "Doc", a personalized AI health companion for elderly patients. You are a knowledgeable assistant who specializes in:
-- Analyzing medical documents (prescriptions, lab reports, medical histories, diagnoses)
-- Interpreting health metrics and vital signs
-- Providing evidence-based health recommendations tailored to elderly patients
-- Understanding medication interactions
-- Offering practical lifestyle advice
-
-IMPORTANT: You should confidently analyze and discuss medical documents, lab results, prescriptions, and diagnoses. This is a personal health assistant role, and you are helping an elderly patient understand their own medical information.
-
-Patient Context:
-{user_context}
-
-Guidelines:
-- Analyze and discuss medical documents openly - this is for the patient's own health understanding
-- If recommending medical changes, suggest consulting their primary care physician
-- Be aware of medication interactions
-- Provide lifestyle recommendations tailored to elderly patients (typically 65+)
-- Alert for concerning vital signs (e.g., BP >150/100, O2 <94%, glucose >200 or <70)
-- Keep responses clear, compassionate, and easy to understand
-- Focus on practical, actionable advice
-- Do not refuse to analyze medical documents or prescriptions - this is a personal health app"""
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ],
-            model="llama-3.1-8b",
-        )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        return f"I encountered an error: {str(e)}. Please ensure your Cerebras API key is valid."
-
-def get_guardians(user_id: str) -> List[Dict[str, Any]]:
+    """Get all documents for a user, oldest upload first"""
+    return _document_index(user_id).documents()
+
+def list_user_documents(user_id: str, document_type: str = None, start_us: int = None,
+                        end_us: int = None, cursor: str = None, limit: int = 20):
+    """Get one newest-first page of a user's documents: (documents, total, next_cursor)
+
+    Raises ValueError for a malformed cursor.
+    """
+    return _document_index(user_id).page(document_type, start_us, end_us, cursor, limit)
+
+def get_user_document(user_id: str, document_id: str) -> Dict[str, Any]:
+    """Get one of a user's documents by id, if it exists"""
+    return _document_index(user_id).get(document_id)
+
+def get_document_by_hash(user_id: str, content_hash: str) -> Dict[str, Any]:
+    """Get a user's document with the given content SHA-256, if any"""
+    return _document_index(user_id).get_by_hash(content_hash)
+
+def get_pending_documents() -> List[Dict[str, Any]]:
+    """Get every user's documents still waiting for analysis"""
+    return storage.pending_documents()
+
+def get_user_insight(user_id: str) -> Dict[str, Any]:
+    """Get a user's stored (precomputed) health insight"""
+    return storage.get_insight(user_id)
+
+def save_user_insight(user_id: str, insight: Dict[str, Any]) -> None:
+    """Store a user's health insight"""
+    storage.save_insight(user_id, insight)
+
+async def get_guardians(user_id: str) -> List[Dict[str, Any]]:
     """Get guardians for a user"""
-    return GUARDIANS.get(user_id, [])
+    return await _storage_io(storage.list_guardians, user_id)
 
-def add_guardian(user_id: str, guardian: Dict[str, Any]) -> None:
+async def add_guardian(user_id: str, guardian: Dict[str, Any]) -> None:
     """Add guardian for a user"""
-    if user_id not in GUARDIANS:
-        GUARDIANS[user_id] = []
-    GUARDIANS[user_id].append(guardian)
+    await _storage_io(storage.add_guardian, user_id, guardian)
+    data_versions.bump(user_id, "guardians")
+
+def close_storage() -> None:
+    """Flush buffered writes and close the storage backend"""
+    storage.close()
@@ -0,0 +1,123 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+from app.services.clinical_terms import extract_clinical_terms
+from app.services.data_service import get_pending_documents, get_user_document, save_document
+from app.services.jobs import JobQueue, DOCUMENT_WORKERS, DOCUMENT_JOB_MAX_ATTEMPTS
+from app.services.llm_service import analyze_with_cerebras
+from app.services.text_extraction import EXTRACTION_ERRORS, extract_document_text
+
+logger = logging.getLogger(__name__)
+
+
+def detect_document_type(file_name: str) -> str:
+    """Guess the document type from its file name"""
+    name = file_name.lower()
+    return "prescription" if "prescription" in name else \
+           "lab" if "lab" in name else \
+           "report" if "report" in name else \
+           "medical document"
+
+
+async def analyze_document(user_id: str, file_name: str, file_path: Optional[str] = None) -> Dict[str, Any]:
+    """Run text extraction, the LLM analysis and condition extraction for one document"""
+    doc_type = detect_document_type(file_name)
+
+    # Pull the document's own text locally so the model sees the contents
+    extracted = {"text": "", "pages": 0, "truncated": False}
+    extraction_error = None
+    if file_path:
+        try:
+            extracted = await extract_document_text(file_path, file_name)
+        except EXTRACTION_ERRORS as e:
+            # An unreadable file is still analyzed by type; other errors fail the job
+            logger.warning("Text extraction failed for %s: %s", file_name, e)
+            extraction_error = f"{type(e).__name__}: {e}"
+    document_text = extracted["text"]
+
+    analysis_prompt = f"""This is a {doc_type} for an elderly patient named {user_id}.
+Please analyze and extract:
+1. Key medical conditions mentioned
+2. Current medications
+3. Lab results and their significance for elderly patients
+4. Any health risks or alerts
+5. Recommendations for the elderly patient
+
+Provide a clear, actionable analysis."""
+    if document_text:
+        analysis_prompt += f"\n\nDocument text:\n{document_text}"
+    else:
+        analysis_prompt += "\n\nNo text could be extracted from the document; base the analysis on its type only."
+
+    user_context = f"Analyzing {doc_type}: {file_name} for elderly patient"
+    analysis_result = await analyze_with_cerebras(
+        user_context, analysis_prompt, user_id=user_id, endpoint="document_analysis", raise_errors=True
+    )
+
+    # Canonical conditions/medications from the document and its analysis (negated mentions skipped)
+    terms = extract_clinical_terms(f"{document_text}\n\n{analysis_result}")
+    extracted_conditions = terms["conditions"]
+    return {
+        "status": "analyzed",
+        "summary": analysis_result,
+        "document_type": doc_type,
+        "extracted_conditions": extracted_conditions,
+        "extracted_medications": terms["medications"],
+        "pages_extracted": extracted["pages"],
+        "text_truncated": extracted["truncated"],
+        "extraction_error": extraction_error,
+        "key_findings": [
+            "Document received and analyzed",
+            f"Identified {len(extracted_conditions)} condition(s)",
+            "Ready for integration with health profile"
+        ]
+    }
+
+
+async def run_document_job(job: Dict[str, Any]) -> None:
+    """Job handler: analyze an uploaded document and store the result on its record"""
+    document = get_user_document(job["user_id"], job["document_id"])
+    if document is None:
+        raise ValueError(f"Document {job['document_id']} no longer exists")
+
+    try:
+        document["analysis"] = await analyze_document(job["user_id"], document["file_name"], document.get("file_path"))
+    except Exception as e:
+        # Record the failure; the queue retries until attempts run out
+        failed = job["attempts"] >= DOCUMENT_JOB_MAX_ATTEMPTS
+        document["status"] = "failed" if failed else "pending"
+        document["analysis"] = {"status": document["status"], "error": str(e)}
+        await save_document(job["user_id"], document)
+        raise
+    document["status"] = "complete"
+    document["analyzed_at"] = datetime.now().isoformat()
+    await save_document(job["user_id"], document)
+
+
+# Shared worker pool for document analysis
+document_jobs = JobQueue("documents", run_document_job, DOCUMENT_WORKERS, DOCUMENT_JOB_MAX_ATTEMPTS)
+
+
+async def queue_document_analysis(user_id: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Queue analysis of a pending document and save it with the new job_id"""
+    job = document_jobs.submit({"user_id": user_id, "document_id": document["document_id"]})
+    document["job_id"] = job["job_id"]
+    await save_document(user_id, document)
+    return job
+
+
+def has_live_job(document: Dict[str, Any]) -> bool:
+    """Whether a pending document's job is known to this process's queue"""
+    return document_jobs.get(document.get("job_id")) is not None
+
+
+async def requeue_pending_documents() -> int:
+    """Queue a new job for each pending document whose job was lost (jobs live in memory)"""
+    requeued = 0
+    for document in get_pending_documents():
+        if not has_live_job(document):
+            await queue_document_analysis(document["user_id"], document)
+            requeued += 1
+    if requeued:
+        logger.info("Re-queued analysis of %d pending document(s)", requeued)
+    return requeued
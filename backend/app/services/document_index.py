@@ -0,0 +1,114 @@
+import base64
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.services.timeseries import to_epoch_us
+
+# Fields returned by list views; the LLM summary text is only sent on request
+SUMMARY_FIELDS = ("document_id", "document_type", "file_name", "uploaded_at", "status", "size_bytes", "job_id")
+
+
+def upload_time_us(document: Dict[str, Any]) -> int:
+    """Upload time of a document record as epoch microseconds (0 if unknown)"""
+    uploaded_at = document.get("uploaded_at")
+    try:
+        if isinstance(uploaded_at, str):
+            uploaded_at = datetime.fromisoformat(uploaded_at)
+        return to_epoch_us(uploaded_at)
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+def summarize_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Lightweight view of a document record without the analysis text"""
+    summary = {field: document.get(field) for field in SUMMARY_FIELDS}
+    analysis = document.get("analysis") or {}
+    summary["extracted_conditions"] = analysis.get("extracted_conditions", document.get("extracted_conditions", []))
+    summary["extracted_medications"] = analysis.get("extracted_medications", [])
+    return summary
+
+
+def encode_document_cursor(key: Tuple[int, str]) -> str:
+    """Encode the (upload time, document_id) of the last returned document"""
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode().rstrip("=")
+
+
+def decode_document_cursor(cursor: str) -> Tuple[int, str]:
+    """Decode a token from encode_document_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp_us, document_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":", 1)
+        return int(timestamp_us), document_id
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class DocumentIndex:
+    """One user's document records indexed for constant-time lookups
+
+    Records are kept by document_id and content hash, plus sorted
+    (upload time, document_id) keys overall and per document_type, so
+    filtered, newest-first pages are found by binary search instead of
+    scanning every record.
+    """
+
+    def __init__(self, documents: Iterable[Dict[str, Any]] = ()):
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_hash: Dict[str, str] = {}
+        self.by_time: List[Tuple[int, str]] = []
+        self.by_type: Dict[str, List[Tuple[int, str]]] = {}
+        # What each record was indexed under, since callers may mutate records in place
+        self._entries: Dict[str, Tuple[Tuple[int, str], Optional[str], Optional[str]]] = {}
+        for document in documents:
+            self.put(document)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def put(self, document: Dict[str, Any]) -> None:
+        """Add a record, replacing any with the same document_id"""
+        document_id = document["document_id"]
+        if document_id in self._entries:
+            self._unindex(document_id)
+        key = (upload_time_us(document), document_id)
+        document_type, content_hash = document.get("document_type"), document.get("content_sha256")
+        self.by_id[document_id] = document
+        self._entries[document_id] = (key, document_type, content_hash)
+        if content_hash:
+            self.by_hash[content_hash] = document_id
+        insort(self.by_time, key)
+        insort(self.by_type.setdefault(document_type, []), key)
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(document_id)
+
+    def get_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        document_id = self.by_hash.get(content_hash)
+        return self.by_id.get(document_id) if document_id else None
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """All records, oldest upload first"""
+        return [self.by_id[document_id] for _, document_id in self.by_time]
+
+    def page(self, document_type: Optional[str] = None, start_us: Optional[int] = None,
+             end_us: Optional[int] = None, cursor: Optional[str] = None, limit: int = 20):
+        """Return (documents, total, next_cursor) for one newest-first page"""
+        keys = self.by_type.get(document_type, []) if document_type else self.by_time
+        lo = bisect_left(keys, (start_us,)) if start_us is not None else 0
+        hi = bisect_left(keys, (end_us + 1,)) if end_us is not None else len(keys)
+        total = max(0, hi - lo)
+        if cursor:
+            hi = max(lo, min(hi, bisect_left(keys, decode_document_cursor(cursor))))
+        page_lo = max(lo, hi - limit)
+        page_keys = keys[page_lo:hi][::-1]
+        next_cursor = encode_document_cursor(page_keys[-1]) if page_keys and page_lo > lo else None
+        return [self.by_id[document_id] for _, document_id in page_keys], total, next_cursor
+
+    def _unindex(self, document_id: str) -> None:
+        key, document_type, content_hash = self._entries.pop(document_id)
+        for keys in (self.by_time, self.by_type.get(document_type, [])):
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        if content_hash and self.by_hash.get(content_hash) == document_id:
+            del self.by_hash[content_hash]
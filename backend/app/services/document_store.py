@@ -0,0 +1,62 @@
+import os
+import uuid
+import hashlib
+import aiofiles
+import aiofiles.os
+from typing import Tuple
+from fastapi import UploadFile
+
+# Uploaded files are stored once per distinct content under objects/<sha256>
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/tmp/health_documents")
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, "objects")
+INCOMING_DIR = os.path.join(UPLOAD_DIR, "incoming")
+os.makedirs(OBJECTS_DIR, exist_ok=True)
+os.makedirs(INCOMING_DIR, exist_ok=True)
+
+# Bytes read from the upload and written to disk per step
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+
+def object_path(content_hash: str) -> str:
+    """Path of the stored file for a content hash"""
+    return os.path.join(OBJECTS_DIR, content_hash[:2], content_hash)
+
+
+async def store_upload(file: UploadFile) -> Tuple[str, str, int]:
+    """Stream an upload to content-addressed storage
+
+    The file is copied in UPLOAD_CHUNK_SIZE pieces with async I/O and hashed
+    as it goes, so memory use does not grow with file size. Returns
+    (sha256 hex, stored path, size in bytes); identical content is stored
+    only once. Raises ValueError for an empty upload; storage failures
+    propagate as OSError.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    incoming_path = os.path.join(INCOMING_DIR, uuid.uuid4().hex)
+
+    try:
+        async with aiofiles.open(incoming_path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await out.write(chunk)
+        if not size:
+            raise ValueError("uploaded file is empty")
+
+        content_hash = digest.hexdigest()
+        stored_path = object_path(content_hash)
+        if await aiofiles.os.path.exists(stored_path):
+            await aiofiles.os.remove(incoming_path)
+        else:
+            await aiofiles.os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            await aiofiles.os.replace(incoming_path, stored_path)
+    except BaseException:
+        if await aiofiles.os.path.exists(incoming_path):
+            await aiofiles.os.remove(incoming_path)
+        raise
+
+    return content_hash, stored_path, size
@@ -0,0 +1,347 @@
+import os
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from app.services.timeseries import METRIC_COLUMNS, MISSING_INT, FLOAT_DECIMALS, MetricSeries, from_epoch_us
+
+US_PER_MINUTE = 60_000_000
+US_PER_HOUR = 60 * US_PER_MINUTE
+US_PER_DAY = 24 * US_PER_HOUR
+US_PER_WEEK = 7 * US_PER_DAY
+
+RESOLUTIONS = ("raw", "auto", "hour", "day", "lttb")
+DEFAULT_MAX_POINTS = 600
+MAX_CHART_POINTS = 10_000
+
+# Bucket widths "auto" picks from (smallest that fits max_points); past a
+# week it uses whole weeks
+AUTO_WIDTHS = tuple(m * US_PER_MINUTE for m in (1, 5, 15, 30, 60, 180, 360, 720, 1440, 10080))
+# Widths kept as cached rollups; coarser "auto" widths are merged from them
+ROLLUP_WIDTHS = {"hour": US_PER_HOUR, "day": US_PER_DAY}
+
+# Cached rollups (user, width) kept; an hourly rollup of a year of readings
+# is ~1.5 MB, so this bounds memory however many users are charted
+CHART_ROLLUP_CACHE_SIZE = int(os.getenv("CHART_ROLLUP_CACHE_SIZE", "256"))
+
+
+class Buckets:
+    """Time buckets with a reading count and per-vital count/sum/min/max arrays"""
+
+    __slots__ = ("width", "starts", "rows", "stats")
+
+    def __init__(self, width: int, starts: np.ndarray, rows: np.ndarray, stats: Dict[str, tuple]):
+        self.width = width
+        self.starts = starts
+        self.rows = rows
+        self.stats = stats
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def slice(self, start_us: Optional[int], end_us: Optional[int]) -> "Buckets":
+        """Buckets starting in [start_us, end_us)"""
+        lo = 0 if start_us is None else int(np.searchsorted(self.starts, start_us))
+        hi = len(self.starts) if end_us is None else int(np.searchsorted(self.starts, end_us))
+        return self._take(slice(lo, max(lo, hi)))
+
+    def drop_last(self) -> "Buckets":
+        return self._take(slice(0, len(self.starts) - 1))
+
+    def concat(self, other: "Buckets") -> "Buckets":
+        return Buckets(self.width, np.concatenate((self.starts, other.starts)),
+                       np.concatenate((self.rows, other.rows)),
+                       {name: tuple(np.concatenate(pair) for pair in zip(stats, other.stats[name]))
+                        for name, stats in self.stats.items()})
+
+    def merge(self, width: int) -> "Buckets":
+        """Combine into coarser buckets of `width` (a multiple of this width)"""
+        if width == self.width:
+            return self
+        return _reduce(self.starts // width, width, self.rows, self.stats)
+
+    def _take(self, index: slice) -> "Buckets":
+        return Buckets(self.width, self.starts[index], self.rows[index],
+                       {name: tuple(a[index] for a in stats) for name, stats in self.stats.items()})
+
+
+def _reduce(keys: np.ndarray, width: int, rows: np.ndarray, stats: Dict[str, tuple]) -> Buckets:
+    """Sum/min/max runs of equal (sorted) bucket keys with ufunc.reduceat"""
+    if not len(keys):
+        return Buckets(width, keys.astype(np.int64), rows, stats)
+    first = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    return Buckets(
+        width,
+        keys[first].astype(np.int64) * width,
+        np.add.reduceat(rows, first),
+        {name: (np.add.reduceat(count, first), np.add.reduceat(total, first),
+                np.fmin.reduceat(low, first), np.fmax.reduceat(high, first))
+         for name, (count, total, low, high) in stats.items()},
+    )
+
+
+def _column(series: MetricSeries, name: str, lo: int, hi: int) -> np.ndarray:
+    """One vital's readings in rows [lo, hi) as float64, NaN where missing"""
+    column = series.columns[name]
+    if lo >= hi:
+        return np.empty(0)
+    data = np.frombuffer(column, dtype=column.typecode)[lo:hi].astype(np.float64)
+    if column.typecode != "f":
+        data[data == MISSING_INT[column.typecode]] = np.nan
+    return data
+
+
+def _timestamps(series: MetricSeries, lo: int, hi: int) -> np.ndarray:
+    if lo >= hi:
+        return np.empty(0, dtype=np.int64)
+    return np.frombuffer(series.timestamps, dtype=np.int64)[lo:hi].copy()
+
+
+def bucket_readings(series: MetricSeries, lo: int, hi: int, width: int,
+                    names: Sequence[str] = tuple(METRIC_COLUMNS)) -> Buckets:
+    """Aggregate rows [lo, hi) into epoch-aligned buckets of `width` microseconds"""
+    stats = {}
+    for name in names:
+        values = _column(series, name, lo, hi)
+        present = ~np.isnan(values)
+        # float32 min/max are exact for every column type and halve the memory
+        stats[name] = (present.astype(np.int32), np.where(present, values, 0.0),
+                       values.astype(np.float32), values.astype(np.float32))
+    return _reduce(_timestamps(series, lo, hi) // width, width, np.ones(max(0, hi - lo), dtype=np.int32), stats)
+
+
+class RollupCache:
+    """LRU of full-history rollups per (user, width)
+
+    Readings normally arrive in order, so when a user's series has grown
+    since the rollup was built only the last (possibly partial) bucket and
+    the new rows are aggregated. An out-of-order insert (series.edits
+    changes) or a reloaded series triggers a full rebuild.
+    """
+
+    def __init__(self, max_entries: int = CHART_ROLLUP_CACHE_SIZE):
+        self.max_entries = max_entries
+        # (user_id, width) -> (weakref to series, series.edits, rows covered, Buckets)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.extends = 0
+        self.builds = 0
+
+    def get(self, user_id: str, series: MetricSeries, width: int) -> Buckets:
+        key = (user_id, width)
+        rows = len(series)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is series and entry[1] == series.edits:
+            _, _, covered, buckets = entry
+            self._entries.move_to_end(key)
+            if covered == rows:
+                self.hits += 1
+                return buckets
+            self.extends += 1
+            if len(buckets):
+                resume = bisect_left(series.timestamps, int(buckets.starts[-1]))
+                buckets = buckets.drop_last().concat(bucket_readings(series, resume, rows, width))
+            else:
+                buckets = bucket_readings(series, 0, rows, width)
+        else:
+            self.builds += 1
+            buckets = bucket_readings(series, 0, rows, width)
+        self._entries[key] = (weakref.ref(series), series.edits, rows, buckets)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return buckets
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "extends": self.extends, "builds": self.builds}
+
+
+chart_rollups = RollupCache()
+
+
+def clipped_rollup(user_id: str, series: MetricSeries, lo: int, hi: int, start_us: Optional[int],
+                   end_us: Optional[int], width: int) -> Buckets:
+    """Buckets of `width` for rows [lo, hi) (start_us <= timestamp <= end_us)
+
+    Buckets wholly inside the range come from the cached rollup; the
+    partly covered first and last buckets are aggregated from the readings
+    in range, so they never count readings outside it.
+    """
+    rollup = chart_rollups.get(user_id, series, width)
+    names = tuple(rollup.stats)
+    # Starts of the first and (one past) the last bucket fully inside the range
+    inner_start = None if start_us is None else -(-start_us // width) * width
+    inner_end = None if end_us is None else (end_us + 1) // width * width
+    if inner_start is not None and inner_end is not None and inner_end <= inner_start:
+        return bucket_readings(series, lo, hi, width, names)
+    head_end = lo if inner_start is None else bisect_left(series.timestamps, inner_start, lo, hi)
+    tail_start = hi if inner_end is None else bisect_left(series.timestamps, inner_end, lo, hi)
+    return (bucket_readings(series, lo, head_end, width, names)
+            .concat(rollup.slice(inner_start, inner_end))
+            .concat(bucket_readings(series, tail_start, hi, width, names)))
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Comma-separated vital names (default: all), raising ValueError for unknown ones"""
+    if not fields:
+        return list(METRIC_COLUMNS)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in METRIC_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def select_fields(row: Dict[str, Any], names: Sequence[str]) -> Dict[str, Any]:
+    """Drop vitals not in names from a reading dict (other keys are kept)"""
+    if len(names) == len(METRIC_COLUMNS):
+        return row
+    return {k: v for k, v in row.items() if k in names or k not in METRIC_COLUMNS}
+
+
+def _auto_width(first_us: int, last_us: int, max_points: int) -> int:
+    """Smallest AUTO_WIDTHS entry (or whole weeks) giving at most max_points aligned buckets"""
+    for width in AUTO_WIDTHS:
+        if last_us // width - first_us // width < max_points:
+            return width
+    weeks = -(-(last_us - first_us + 1) // (US_PER_WEEK * max(1, max_points - 1)))
+    return weeks * US_PER_WEEK
+
+
+def _fit_width(width: int, first_us: int, last_us: int, max_points: int) -> int:
+    """Smallest multiple of width giving at most max_points aligned buckets"""
+    factor = max(1, (last_us // width - first_us // width + 1) // max_points)
+    while last_us // (width * factor) - first_us // (width * factor) >= max_points:
+        factor += 1
+    return width * factor
+
+
+def _round(values: np.ndarray, name: str) -> list:
+    if METRIC_COLUMNS[name] == "f":
+        return np.round(values.astype(np.float64), FLOAT_DECIMALS).tolist()
+    return np.rint(np.nan_to_num(values)).astype(np.int64).tolist()
+
+
+def bucket_rows(buckets: Buckets, names: Sequence[str]) -> List[Dict[str, Any]]:
+    """One dict per bucket: start timestamp, readings, and each vital's mean, <vital>_min and <vital>_max"""
+    rows = [{"timestamp": from_epoch_us(start).isoformat(), "readings": n}
+            for start, n in zip(buckets.starts.tolist(), buckets.rows.tolist())]
+    for name in names:
+        count, total, low, high = buckets.stats[name]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.round(total / count, FLOAT_DECIMALS).tolist()
+        lows, highs = _round(low, name), _round(high, name)
+        for row, n, m, lo, hi in zip(rows, count.tolist(), mean, lows, highs):
+            if n:
+                row[name] = m
+                row[f"{name}_min"] = lo
+                row[f"{name}_max"] = hi
+    return rows
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the curve's shape
+
+    Keeps the first and last points; from each of the threshold - 2 buckets
+    in between it keeps the point forming the largest triangle with the
+    previously kept point and the next bucket's average. The choice in each
+    bucket depends on the previous one, so buckets are walked in order, but
+    the areas within a bucket are computed in one vectorized step.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # Average of each bucket, plus the last point as the "bucket" after the final one
+    sizes = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1])
+    avg_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[i + 1] - ay))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def lttb_rows(series: MetricSeries, lo: int, hi: int, max_points: int, names: Sequence[str]) -> List[Dict[str, Any]]:
+    """Up to max_points readings in rows [lo, hi), picked by one LTTB pass
+
+    The pass runs over rows having any requested vital, on the sum of each
+    vital's standardized values (a missing vital counts as its mean), so a
+    spike in any vital tends to be kept while the point cap holds however
+    many vitals are asked for.
+    """
+    timestamps = _timestamps(series, lo, hi)
+    columns = {name: _column(series, name, lo, hi) for name in names}
+    combined = np.zeros(len(timestamps))
+    any_present = np.zeros(len(timestamps), dtype=bool)
+    for values in columns.values():
+        present = ~np.isnan(values)
+        if present.any():
+            readings = values[present]
+            combined[present] += (readings - readings.mean()) / (readings.std() or 1.0)
+            any_present |= present
+    candidates = np.flatnonzero(any_present)
+    x = (timestamps[candidates] - timestamps[0]).astype(np.float64) if len(candidates) else np.empty(0)
+    rows_kept = candidates[lttb_indices(x, combined[candidates], max_points)]
+
+    rows = [{"timestamp": from_epoch_us(t).isoformat()} for t in timestamps[rows_kept].tolist()]
+    for name, values in columns.items():
+        picked = values[rows_kept]
+        for row, present, value in zip(rows, (~np.isnan(picked)).tolist(), _round(picked, name)):
+            if present:
+                row[name] = value
+    return rows
+
+
+def downsample(user_id: str, series: MetricSeries, start_us: Optional[int], end_us: Optional[int],
+               resolution: str = "auto", max_points: Optional[int] = None,
+               names: Sequence[str] = tuple(METRIC_COLUMNS)) -> Dict[str, Any]:
+    """Chart-sized view of a user's readings between start_us and end_us
+
+    resolution:
+      "auto"  min/mean/max buckets of the smallest width giving at most
+              max_points buckets (raw readings if there are no more than that)
+      "hour"  / "day" hourly / daily buckets, merged into whole multiples of
+              an hour / day when there would be more than max_points
+      "lttb"  shape-preserving subset of the actual readings (see lttb_rows)
+    max_points defaults to DEFAULT_MAX_POINTS, or MAX_CHART_POINTS for hour
+    and day. Hour-aligned widths are served from cached hourly/daily
+    rollups, so repeated chart loads only aggregate readings added since.
+    Raises ValueError for an unknown resolution.
+    """
+    if resolution not in RESOLUTIONS or resolution == "raw":
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if max_points is None:
+        max_points = MAX_CHART_POINTS if resolution in ROLLUP_WIDTHS else DEFAULT_MAX_POINTS
+    lo, hi = series.range_indices(start_us, end_us)
+    result = {"resolution": resolution, "bucket_seconds": None, "total": hi - lo}
+
+    if resolution == "lttb":
+        rows = lttb_rows(series, lo, hi, max_points, names)
+    elif resolution == "auto" and hi - lo <= max_points:
+        result["resolution"] = "raw"
+        rows = [select_fields(series.row(i), names) for i in range(lo, hi)]
+    elif lo >= hi:
+        rows = []
+    else:
+        first_us, last_us = series.timestamps[lo], series.timestamps[hi - 1]
+        if resolution == "auto":
+            width = _auto_width(first_us, last_us, max_points)
+        else:
+            width = _fit_width(ROLLUP_WIDTHS[resolution], first_us, last_us, max_points)
+        if width % US_PER_HOUR == 0:
+            base = US_PER_DAY if width % US_PER_DAY == 0 else US_PER_HOUR
+            buckets = clipped_rollup(user_id, series, lo, hi, start_us, end_us, base).merge(width)
+        else:
+            buckets = bucket_readings(series, lo, hi, width, names)
+        result["bucket_seconds"] = width // 1_000_000
+        rows = bucket_rows(buckets, names)
+    return {**result, "metrics": rows, "count": len(rows)}
@@ -0,0 +1,114 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Union
+import numpy as np
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from app.services.timeseries import METRIC_COLUMNS, MISSING_INT, FLOAT_DECIMALS, MetricSeries
+
+try:  # MessagePack output is optional
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# Response shapes for metric lists:
+#   rows      a list of reading dicts (the default)
+#   columnar  JSON object with one array per field plus "timestamp"
+#   msgpack   the columnar shape as MessagePack
+FORMATS = ("rows", "columnar", "msgpack")
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# NumPy arrays go straight to orjson; datetime64 timestamps come out in the
+# same ISO form as MetricSeries.row() and NaN (missing) as null
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+Columns = Dict[str, Union[np.ndarray, list]]
+
+
+class UnsupportedFormat(ValueError):
+    """Requested format needs an optional package that is not installed"""
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str] = None) -> str:
+    """Pick a response format: ?format= first, then an Accept header asking for MessagePack
+
+    Raises ValueError for an unknown format and UnsupportedFormat when
+    MessagePack is asked for but msgpack is not installed.
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        chosen = requested
+    elif accept and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        chosen = "msgpack"
+    else:
+        chosen = "rows"
+    if chosen == "msgpack" and msgpack is None:
+        raise UnsupportedFormat("MessagePack responses need the msgpack package")
+    return chosen
+
+
+def _column_values(column, lo: int, hi: int) -> Union[np.ndarray, list]:
+    """One typed column's rows [lo, hi): floats rounded (NaN = missing), ints as ints"""
+    if lo >= hi:
+        return []
+    data = np.frombuffer(column, dtype=column.typecode)[lo:hi]
+    if column.typecode == "f":
+        return np.round(data.astype(np.float64), FLOAT_DECIMALS)
+    missing = data == MISSING_INT[column.typecode]
+    if missing.any():
+        return [None if m else v for v, m in zip(data.tolist(), missing.tolist())]
+    # Copy so no view keeps the array's buffer exported (which blocks appends)
+    return data.copy()
+
+
+def series_columns(series: MetricSeries, lo: int, hi: int,
+                   names: Sequence[str] = tuple(METRIC_COLUMNS)) -> Columns:
+    """Rows [lo, hi) of a series as {"timestamp": [...], vital: [...]} without building row dicts"""
+    if lo >= hi:
+        timestamps = np.empty(0, dtype="datetime64[us]")
+    else:
+        timestamps = np.frombuffer(series.timestamps, dtype=np.int64)[lo:hi].astype("datetime64[us]")
+    columns: Columns = {"timestamp": timestamps}
+    for name in names:
+        columns[name] = _column_values(series.columns[name], lo, hi)
+    return columns
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, list]:
+    """Pivot reading dicts into one list per key (None where a row lacks the key)"""
+    keys = dict.fromkeys(key for row in rows for key in row)
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+def _plain(value: Any) -> Any:
+    """Replace NumPy arrays with lists MessagePack can pack"""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "M":
+            # Whole-second timestamps drop the fraction, as isoformat() does,
+            # one element at a time so a page mixing both matches the JSON output
+            stamps = np.datetime_as_string(value.astype("datetime64[us]"), unit="us").tolist()
+            return [stamp[:-7] if stamp.endswith(".000000") else stamp for stamp in stamps]
+        if value.dtype.kind == "f":
+            missing = np.isnan(value)
+            if missing.any():
+                return [None if m else v for v, m in zip(value.tolist(), missing.tolist())]
+        return value.tolist()
+    return value
+
+
+def encode_response(content: Any, fmt: str = "rows", status_code: int = 200) -> Response:
+    """Serialize a route result once, skipping FastAPI's per-object jsonable_encoder pass"""
+    if fmt == "msgpack":
+        return Response(msgpack.packb(_plain(content)), status_code=status_code, media_type="application/msgpack")
+    return Response(orjson.dumps(content, default=jsonable_encoder, option=JSON_OPTIONS),
+                    status_code=status_code, media_type="application/json")
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,125 @@
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+from fastapi import Request, Response
+from app.services.encoding import MSGPACK_MEDIA_TYPES, encode_response
+from app.services.versions import data_versions
+
+# Serialized bodies of polled GET responses, bounded by total bytes; bodies
+# over an eighth of the budget are still ETagged but not kept
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Clients may store responses but must revalidate before reuse, so every
+# poll becomes a conditional request
+CACHE_CONTROL = "private, no-cache"
+
+Key = Tuple[str, str, str]
+
+
+class SerializedResponseCache:
+    """LRU of encoded response bodies, one entry per (route, user, variant)
+
+    Each entry remembers the ETag it was built under; a lookup with any
+    other ETag is a miss, so a write needs no explicit invalidation - the
+    next response for that key simply replaces the stale body.
+    """
+
+    def __init__(self, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: "OrderedDict[Key, Tuple[str, bytes, str]]" = OrderedDict()
+
+    def get(self, key: Key, etag: str) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: Key, etag: str, body: bytes, media_type: str) -> None:
+        self.discard(key)
+        if len(body) * 8 > self.max_bytes:
+            return
+        self._entries[key] = (etag, body, media_type)
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def discard(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+                "misses": self.misses, "not_modified": self.not_modified}
+
+
+http_responses = SerializedResponseCache()
+
+
+def _variant(request: Request) -> str:
+    """What besides the user and data changes the body: query string and a MessagePack Accept"""
+    accept = request.headers.get("accept", "")
+    msgpack = any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+    return f"{request.url.query}|{'msgpack' if msgpack else ''}"
+
+
+def make_etag(key: Key, versions: Sequence[int]) -> str:
+    """Strong validator: same route, user, variant and data versions give the same bytes"""
+    digest = hashlib.blake2b("\0".join(key).encode(), digest_size=8).hexdigest()
+    return f'"{data_versions.epoch}-{digest}-{".".join(map(str, versions))}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix still matches
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ConditionalGet:
+    """ETag / 304 handling and body caching for a GET route built from one user's data
+
+    Create at the top of the handler; if .response is set (304 or a cached
+    body) return it without computing anything, otherwise build the content
+    and return .respond(content, fmt). Versions come from the in-process
+    counters, which is sound because the API runs as a single worker
+    (see services.server_lock).
+    """
+
+    def __init__(self, request: Request, route: str, user_id: str, sources: Sequence[str]):
+        self.user_id = user_id
+        self.sources = tuple(sources)
+        self.key: Key = (route, user_id, _variant(request))
+        self.versions = data_versions.get(user_id, self.sources)
+        self.etag = make_etag(self.key, self.versions)
+        self.headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept"}
+        self.response: Optional[Response] = None
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            http_responses.not_modified += 1
+            self.response = Response(status_code=304, headers=self.headers)
+            return
+        cached = http_responses.get(self.key, self.etag)
+        if cached is not None:
+            body, media_type = cached
+            self.response = Response(body, media_type=media_type, headers=self.headers)
+
+    def respond(self, content: Any, fmt: str = "rows") -> Response:
+        response = encode_response(content, fmt)
+        if data_versions.get(self.user_id, self.sources) != self.versions:
+            # Data changed while building (e.g. first-use initialization);
+            # the next request gets a validator for the new state
+            return response
+        response.headers.update(self.headers)
+        http_responses.put(self.key, self.etag, response.body, response.media_type)
+        return response
@@ -0,0 +1,216 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import ConfigDict, Field, TypeAdapter, ValidationError
+from typing_extensions import Annotated, TypedDict
+
+from app.models.schemas import HealthMetric
+from app.services.timeseries import METRIC_COLUMNS, FLOAT32_MAX, to_epoch_us
+
+# Largest batch accepted by one ingest request (~1 week of 1 Hz samples
+# would need several requests; a day of minute readings is 1,440 rows)
+MAX_BATCH_ROWS = 200_000
+
+# Rejected rows beyond this are counted but not itemized in the response
+MAX_REPORTED_REJECTS = 100
+
+# Longest NDJSON line buffered while waiting for its newline; a reading is
+# a few hundred bytes, so anything past this is not a reading
+MAX_NDJSON_LINE_BYTES = 64 * 1024
+
+# Largest JSON array body, which has to be held whole before parsing
+# (MAX_BATCH_ROWS readings of a few hundred bytes each fit comfortably)
+MAX_BATCH_BODY_BYTES = 64 * 1024 * 1024
+
+# Value bounds that fit the typed columns (sentinel values excluded)
+_COLUMN_BOUNDS = {
+    "h": dict(ge=-(2 ** 15) + 1, le=2 ** 15 - 1),
+    "i": dict(ge=-(2 ** 31) + 1, le=2 ** 31 - 1),
+    "f": dict(ge=-FLOAT32_MAX, le=FLOAT32_MAX, allow_inf_nan=False),
+}
+
+
+class BatchTooLarge(ValueError):
+    """Raised when a batch has more than MAX_BATCH_ROWS rows, an over-long NDJSON line or too large a body"""
+
+
+def _row_schema():
+    """HealthMetric's fields as a TypedDict, bounded to the column types
+
+    Validating into plain dicts skips model instantiation, which roughly
+    doubles bulk throughput while enforcing the same field rules. Other
+    keys (device ids, notes) are kept as the reading's extras, as the
+    single-reading endpoint does.
+    """
+    fields = {}
+    for name, field in HealthMetric.model_fields.items():
+        annotation = field.annotation
+        code = METRIC_COLUMNS.get(name)
+        if code is not None:
+            annotation = Annotated[annotation, Field(**_COLUMN_BOUNDS[code])]
+        fields[name] = annotation
+    row = TypedDict("HealthMetricRow", fields)
+    row.__pydantic_config__ = ConfigDict(extra="allow")
+    return row
+
+
+HealthMetricRow = _row_schema()
+_row_adapter = TypeAdapter(HealthMetricRow)
+_ROW_FIELDS = frozenset(HealthMetric.model_fields)
+
+
+class MetricBatch:
+    """Accumulates validated rows column-by-column for one bulk ingest"""
+
+    # Validated rows are transposed into the columns this many at a time,
+    # keeping per-row work small without holding every row dict in memory
+    FLUSH_ROWS = 4096
+
+    def __init__(self, max_rows: int = MAX_BATCH_ROWS):
+        self.max_rows = max_rows
+        self.timestamps: List[int] = []
+        self.values: Dict[str, List[Optional[float]]] = {name: [] for name in METRIC_COLUMNS}
+        # Non-vital fields by accepted row index
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        self.received = 0
+        self.rejected = 0
+        self.rejects: List[Dict[str, Any]] = []
+        self._pending: List[Dict[str, Any]] = []
+
+    @property
+    def accepted(self) -> int:
+        return len(self.timestamps) + len(self._pending)
+
+    def add_json_line(self, line: bytes) -> None:
+        """Validate one NDJSON line (blank lines are skipped)"""
+        if not line.strip():
+            return
+        self._count_row()
+        try:
+            self._pending.append(_row_adapter.validate_json(line))
+        except ValidationError as e:
+            self._reject(e)
+            return
+        if len(self._pending) >= self.FLUSH_ROWS:
+            self.flush()
+
+    def add_json_lines(self, lines: List[bytes]) -> None:
+        """Validate a run of NDJSON lines"""
+        for line in lines:
+            self.add_json_line(line)
+
+    def add_object(self, obj: Any) -> None:
+        """Validate one already-parsed JSON object"""
+        self._count_row()
+        try:
+            self._pending.append(_row_adapter.validate_python(obj))
+        except ValidationError as e:
+            self._reject(e)
+            return
+        if len(self._pending) >= self.FLUSH_ROWS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Move pending validated rows into the column lists"""
+        pending = self._pending
+        if not pending:
+            return
+        first_row = len(self.timestamps)
+        for offset, m in enumerate(pending):
+            if len(m) > len(_ROW_FIELDS):
+                self.extras[first_row + offset] = {k: v for k, v in m.items() if k not in _ROW_FIELDS}
+        self.timestamps.extend([to_epoch_us(m["timestamp"]) for m in pending])
+        for name, column in self.values.items():
+            column.extend([m[name] for m in pending])
+        self._pending = []
+
+    def _count_row(self) -> None:
+        self.received += 1
+        if self.received > self.max_rows:
+            raise BatchTooLarge(f"batch exceeds {self.max_rows} rows")
+
+    def _reject(self, error: ValidationError) -> None:
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({
+                "row": self.received - 1,
+                "errors": [
+                    {"field": ".".join(str(p) for p in err["loc"]), "message": err["msg"]}
+                    for err in error.errors()
+                ],
+            })
+
+    def report(self) -> Dict[str, Any]:
+        """Summarize the batch for the ingest response"""
+        return {
+            "received": self.received,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rejects": self.rejects,
+        }
+
+
+class LineSplitter:
+    """Splits a streamed body into NDJSON lines as chunks arrive
+
+    Only each new chunk is split; the unterminated tail is kept as a list of
+    pieces and joined once its newline arrives, so a body costs linear time
+    however it is chunked.
+    """
+
+    def __init__(self, max_line_bytes: int = MAX_NDJSON_LINE_BYTES):
+        self.max_line_bytes = max_line_bytes
+        self._tail: List[bytes] = []
+        self._tail_bytes = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Return the lines completed by chunk (without their newlines)"""
+        lines = chunk.split(b"\n")
+        rest = lines.pop()
+        if lines and self._tail:
+            self._tail.append(lines[0])
+            lines[0] = b"".join(self._tail)
+            self._tail, self._tail_bytes = [], 0
+        if rest:
+            self._tail.append(rest)
+            self._tail_bytes += len(rest)
+            if self._tail_bytes > self.max_line_bytes:
+                raise BatchTooLarge(f"NDJSON line exceeds {self.max_line_bytes} bytes")
+        return lines
+
+    def finish(self) -> bytes:
+        """Return whatever followed the last newline"""
+        tail = b"".join(self._tail)
+        self._tail, self._tail_bytes = [], 0
+        return tail
+
+
+async def read_body(chunks: AsyncIterator[bytes], content_length: Optional[str],
+                    max_bytes: int = MAX_BATCH_BODY_BYTES) -> bytes:
+    """Collect a streamed request body, raising BatchTooLarge once it passes max_bytes
+
+    A declared Content-Length over the limit is refused before anything is read.
+    """
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise BatchTooLarge(f"body exceeds {max_bytes} bytes")
+    parts: List[bytes] = []
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise BatchTooLarge(f"body exceeds {max_bytes} bytes")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+def parse_json_array(body: bytes, batch: MetricBatch) -> None:
+    """Validate every element of a JSON array body into the batch"""
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise ValueError("body is not valid JSON")
+    if not isinstance(rows, list):
+        raise ValueError("body must be a JSON array of metrics")
+    for obj in rows:
+        batch.add_object(obj)
+    batch.flush()
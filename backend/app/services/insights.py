@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+from app.services import llm_service
+from app.services.data_service import (
+    get_user_profile, load_user_series, read_user_series, get_metric_user_ids, get_user_insight, save_user_insight
+)
+from app.services.timeseries import MetricSeries
+from app.services.llm_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Batch precompute settings - tune per deployment via .env
+INSIGHTS_CONCURRENCY = int(os.getenv("INSIGHTS_CONCURRENCY", "4"))
+INSIGHTS_RATE_PER_SECOND = float(os.getenv("INSIGHTS_RATE_PER_SECOND", "5"))
+INSIGHTS_CHECKPOINT_PATH = os.getenv("INSIGHTS_CHECKPOINT_PATH") or "data/insights_checkpoint.json"
+INSIGHTS_CHECKPOINT_EVERY = int(os.getenv("INSIGHTS_CHECKPOINT_EVERY", "50"))
+# Stored insights younger than this with unchanged inputs are not regenerated
+INSIGHTS_MAX_AGE_HOURS = float(os.getenv("INSIGHTS_MAX_AGE_HOURS", "20"))
+# Local hour the in-process scheduler runs the batch each day (empty = off)
+INSIGHTS_SCHEDULE_HOUR = os.getenv("INSIGHTS_SCHEDULE_HOUR", "5")
+
+
+async def build_insight_prompt(user_id: str, series: Optional[MetricSeries]) -> Optional[Tuple[str, str]]:
+    """Return (context, message) for a user's insight prompt from their series, or None without data"""
+    profile = await get_user_profile(user_id)
+    if not profile or series is None or not len(series):
+        return None
+    latest = series.row(-1)
+    context = f"Generate brief health insights for {profile.get('name')}"
+    message = f"Based on a patient with {', '.join(profile.get('medical_conditions', []))}, recent vitals showing BP {latest.get('blood_pressure_systolic')}/{latest.get('blood_pressure_diastolic')} and glucose {latest.get('blood_glucose')}, what are key health recommendations for today?"
+    return context, message
+
+
+def insight_fingerprint(user_id: str, context: str, message: str) -> str:
+    """Identify the inputs an insight was generated from; new data changes it"""
+    return make_cache_key(llm_service.CEREBRAS_MODEL, user_id, context, message)
+
+
+def is_fresh(insight: Optional[Dict[str, Any]], fingerprint: str, max_age_hours: Optional[float] = None) -> bool:
+    """Whether a stored insight matches the current inputs (and is young enough)"""
+    if not insight or insight.get("data_fingerprint") != fingerprint:
+        return False
+    if max_age_hours is None:
+        return True
+    generated_at = datetime.fromisoformat(insight["generated_at"])
+    return datetime.now() - generated_at < timedelta(hours=max_age_hours)
+
+
+async def generate_insight(user_id: str, context: str, message: str, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Call the LLM for a user's insight and store it; LLM errors propagate"""
+    insights = await llm_service.analyze_with_cerebras(
+        context, message, user_id=user_id, endpoint="health_insights", raise_errors=True
+    )
+    insight = {
+        "user_id": user_id,
+        "insights": insights,
+        "generated_at": datetime.now().isoformat(),
+        "data_fingerprint": insight_fingerprint(user_id, context, message),
+        "run_id": run_id,
+    }
+    # Without an API key the reply is a placeholder - don't keep serving it
+    if llm_service.client:
+        save_user_insight(user_id, insight)
+    return insight
+
+
+async def get_health_insight(user_id: str) -> Optional[Dict[str, Any]]:
+    """Serve the precomputed insight, generating live only if the user has new data
+
+    Returns None when the user has no profile or readings yet. The result's
+    "source" is "precomputed" or "live".
+    """
+    prompt = await build_insight_prompt(user_id, await load_user_series(user_id))
+    if prompt is None:
+        return None
+    context, message = prompt
+    stored = get_user_insight(user_id)
+    if is_fresh(stored, insight_fingerprint(user_id, context, message)):
+        return {**stored, "source": "precomputed"}
+    try:
+        insight = await generate_insight(user_id, context, message)
+    except Exception as e:
+        return {"user_id": user_id, "insights": llm_service.error_message(e),
+                "generated_at": datetime.now().isoformat(), "source": "live"}
+    return {**insight, "source": "live"}
+
+
+class RateLimiter:
+    """Spaces acquisitions at most rate per second across concurrent tasks"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def checkpoint_expired(checkpoint: Dict[str, Any], max_age_hours: float = INSIGHTS_MAX_AGE_HOURS) -> bool:
+    """Whether a checkpoint's completed users may hold insights too old to skip"""
+    try:
+        started_at = datetime.fromisoformat(checkpoint["started_at"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.now() - started_at >= timedelta(hours=max_age_hours)
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Write the checkpoint atomically so a crash never leaves half a file"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+async def run_insights_batch(user_ids: Optional[Iterable[str]] = None,
+                             concurrency: int = INSIGHTS_CONCURRENCY,
+                             rate_per_second: float = INSIGHTS_RATE_PER_SECOND,
+                             checkpoint_path: str = INSIGHTS_CHECKPOINT_PATH,
+                             force: bool = False) -> Dict[str, Any]:
+    """Precompute health insights for every user with health data
+
+    At most `concurrency` LLM calls run at once and they start at most
+    `rate_per_second` apart. Finished users are written to a checkpoint
+    file every INSIGHTS_CHECKPOINT_EVERY users, so an interrupted run
+    resumes where it stopped; the file is removed once a run completes
+    without failures. A checkpoint older than INSIGHTS_MAX_AGE_HOURS is
+    from an earlier day's run and is discarded, so a user who keeps
+    failing cannot hold everyone else's insights back. Users whose stored
+    insight is recent and built from the same data are skipped unless
+    force is set. Series are read from storage in worker threads and are
+    not made resident, so the scan neither blocks nor evicts live users.
+    """
+    if not llm_service.client:
+        return {"status": "skipped", "reason": "CEREBRAS_API_KEY is not set"}
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint is not None and checkpoint_expired(checkpoint):
+        logger.info("insights batch %s: discarding checkpoint from %s",
+                    checkpoint.get("run_id"), checkpoint.get("started_at"))
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = {"run_id": f"insights_{uuid.uuid4().hex[:12]}",
+                      "started_at": datetime.now().isoformat(), "completed": []}
+    run_id = checkpoint["run_id"]
+    completed = set(checkpoint["completed"])
+    failed: Dict[str, str] = {}
+    counts = {"generated": 0, "unchanged": 0, "no_data": 0}
+    if user_ids is None:
+        user_ids = await get_metric_user_ids()
+    users = [u for u in user_ids if u not in completed]
+
+    slots = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_per_second)
+    since_checkpoint = 0
+    started = time.perf_counter()
+
+    async def process(user_id: str) -> None:
+        nonlocal since_checkpoint
+        async with slots:
+            prompt = await build_insight_prompt(user_id, await read_user_series(user_id))
+            if prompt is None:
+                counts["no_data"] += 1
+            elif not force and is_fresh(get_user_insight(user_id), insight_fingerprint(user_id, *prompt),
+                                        INSIGHTS_MAX_AGE_HOURS):
+                counts["unchanged"] += 1
+            else:
+                await limiter.acquire()
+                try:
+                    await generate_insight(user_id, *prompt, run_id=run_id)
+                except Exception as e:
+                    failed[user_id] = str(e)
+                    return
+                counts["generated"] += 1
+        completed.add(user_id)
+        since_checkpoint += 1
+        if since_checkpoint >= INSIGHTS_CHECKPOINT_EVERY:
+            since_checkpoint = 0
+            save_checkpoint(checkpoint_path, {**checkpoint, "completed": sorted(completed)})
+
+    finished = False
+    try:
+        await asyncio.gather(*(process(user_id) for user_id in users))
+        finished = not failed
+    finally:
+        if finished:
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        else:
+            # Interrupted or partly failed: keep progress so the next run resumes
+            save_checkpoint(checkpoint_path, {**checkpoint, "completed": sorted(completed)})
+    summary = {
+        "status": "complete" if not failed else "partial",
+        "run_id": run_id,
+        "users": len(users),
+        "resumed": len(checkpoint["completed"]),
+        **counts,
+        "failed": len(failed),
+        "errors": dict(list(failed.items())[:20]),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info("insights batch %s: %s", run_id, summary)
+    return summary
+
+
+def seconds_until_hour(hour: int, now: Optional[datetime] = None) -> float:
+    """Seconds from now until the next local hh:00"""
+    now = now or datetime.now()
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class InsightScheduler:
+    """Runs the insights batch once a day inside the API process"""
+
+    def __init__(self, hour: Optional[int]):
+        self.hour = hour
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Schedule the daily run on the running event loop (no-op if disabled)"""
+        if self.hour is None or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop(), name="insights-scheduler")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(seconds_until_hour(self.hour))
+            try:
+                self.last_run = await run_insights_batch()
+            except Exception:
+                logger.exception("insights batch failed")
+
+
+insight_scheduler = InsightScheduler(int(INSIGHTS_SCHEDULE_HOUR) if INSIGHTS_SCHEDULE_HOUR.strip() else None)
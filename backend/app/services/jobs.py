@@ -0,0 +1,136 @@
+import os
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Worker pool settings - tune per deployment via .env
+DOCUMENT_WORKERS = int(os.getenv("DOCUMENT_WORKERS", "4"))
+DOCUMENT_JOB_MAX_ATTEMPTS = int(os.getenv("DOCUMENT_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+
+# Finished jobs kept for status polling before the oldest are forgotten
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "10000"))
+
+
+class JobQueue:
+    """In-process async job queue with a fixed pool of workers and retries
+
+    Jobs are plain dicts (job_id, status, attempts, error, timestamps plus
+    the submitted payload) so they can be returned from routes directly.
+    Status moves queued -> running -> complete | failed; a failing attempt
+    goes back to queued and is put on the queue again after an exponential
+    backoff, up to max_attempts. Workers don't wait out the backoff, so a
+    failing job never holds up the jobs behind it.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 concurrency: int, max_attempts: int):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        # Timers that put jobs waiting out a retry backoff back on the queue
+        self._retries: Dict[str, asyncio.TimerHandle] = {}
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop (idempotent)"""
+        if self._workers and not all(w.done() for w in self._workers):
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        # Re-queue anything submitted before a restart of the workers
+        for job in self.jobs.values():
+            if job["status"] == "queued":
+                self._queue.put_nowait(job["job_id"])
+
+    async def stop(self) -> None:
+        """Cancel the workers and pending retries; queued jobs stay queued"""
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a job and return its record"""
+        self.start()
+        job = {
+            "job_id": f"job_{uuid.uuid4().hex}",
+            "status": "queued",
+            "attempts": 0,
+            "error": None,
+            "submitted_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            **payload,
+        }
+        self.jobs[job["job_id"]] = job
+        self._trim()
+        self._queue.put_nowait(job["job_id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job record by id"""
+        return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Count jobs by status"""
+        counts = {"queued": 0, "running": 0, "complete": 0, "failed": 0}
+        for job in self.jobs.values():
+            counts[job["status"]] += 1
+        return counts
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            try:
+                if job is not None and job["status"] == "queued":
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job["status"] = "running"
+        job["started_at"] = job["started_at"] or datetime.now().isoformat()
+        job["attempts"] += 1
+        try:
+            await self.handler(job)
+        except asyncio.CancelledError:
+            job["status"] = "queued"
+            raise
+        except Exception as e:
+            job["error"] = str(e)
+            if job["attempts"] < self.max_attempts:
+                job["status"] = "queued"
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+                self._retries[job["job_id"]] = asyncio.get_running_loop().call_later(
+                    delay, self._requeue, job["job_id"])
+                return
+            job["status"] = "failed"
+        else:
+            job["status"] = "complete"
+            job["error"] = None
+        job["finished_at"] = datetime.now().isoformat()
+
+    def _requeue(self, job_id: str) -> None:
+        if self._retries.pop(job_id, None) is not None and self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    def _trim(self) -> None:
+        if len(self.jobs) <= JOB_HISTORY_LIMIT:
+            return
+        for job_id in [j for j, job in self.jobs.items() if job["status"] in ("complete", "failed")]:
+            del self.jobs[job_id]
+            if len(self.jobs) <= JOB_HISTORY_LIMIT:
+                break
@@ -0,0 +1,166 @@
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+# Seconds a cached completion stays valid, per calling endpoint.
+# Endpoints not listed here (e.g. free-form chat) are never cached.
+ENDPOINT_TTLS = {
+    "health_insights": float(os.getenv("LLM_CACHE_TTL_INSIGHTS", "3600")),
+    "document_analysis": float(os.getenv("LLM_CACHE_TTL_DOCUMENT_ANALYSIS", "86400")),
+}
+
+# User data each endpoint's prompt is built from - a change to any of these
+# sources drops that user's cached completions for the endpoint
+ENDPOINT_SOURCES = {
+    "health_insights": {"metrics", "profile", "documents"},
+    "document_analysis": set(),
+}
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return " ".join(text.split())
+
+
+def make_prompt_key(model: str, messages) -> str:
+    """Hash a model and full message list - equal keys mean an identical upstream request"""
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for message in messages:
+        digest.update(b"\x00")
+        digest.update(message["role"].encode("utf-8"))
+        digest.update(b"\x01")
+        digest.update(message["content"].encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_cache_key(model: str, user_id: str, user_context: str, user_message: str) -> str:
+    """Hash (model, user, system context, user message) into a cache key"""
+    digest = hashlib.sha256()
+    for part in (model, user_id, normalize_prompt(user_context), normalize_prompt(user_message)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """Size-bounded LRU cache of LLM completions with per-entry TTL"""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (expires_at, user_id, endpoint, response)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[3]
+
+    def set(self, key: str, response: str, user_id: str, endpoint: str) -> None:
+        """Store a response under the endpoint's TTL, evicting the least recently used entries"""
+        ttl = ENDPOINT_TTLS.get(endpoint, 0)
+        if ttl <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, user_id, endpoint, response)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: str, source: str) -> int:
+        """Drop a user's cached responses whose prompts depend on the changed source"""
+        keys = self._keys_by_user.get(user_id)
+        if not keys:
+            return 0
+        stale = [k for k in keys if source in ENDPOINT_SOURCES.get(self._entries[k][2], ())]
+        for key in stale:
+            self._remove(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop every cached response"""
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current size"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: str) -> None:
+        _, user_id, _, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one shared in-flight call
+
+    The first caller for a key starts the call as its own task; callers
+    arriving while it runs await the same task instead of starting another
+    and all receive its result or exception. A caller being cancelled
+    (e.g. a client disconnecting) does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.calls += 1
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """Upstream calls made, callers that joined one already in flight, and calls running now"""
+        return {"calls": self.calls, "deduplicated": self.deduplicated, "in_flight": len(self._calls)}
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+# Shared cache and in-flight call registry used by llm_service
+response_cache = LLMResponseCache()
+inflight_calls = SingleFlight()
@@ -0,0 +1,269 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+from cerebras.cloud.sdk import AsyncCerebras
+from app.services.conversations import estimate_tokens, tokens_for_chars
+from app.services.llm_cache import response_cache, inflight_calls, make_cache_key, make_prompt_key
+from app.services.telemetry import record_llm_call
+
+# LLM settings - tune per deployment via .env
+CEREBRAS_MODEL = os.getenv("CEREBRAS_MODEL", "llama-3.1-8b")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# API endpoint; point it at a local stand-in (benchmarks.fake_cerebras) for load tests
+CEREBRAS_BASE_URL = os.getenv("CEREBRAS_BASE_URL") or "https://api.cerebras.ai"
+
+# Initialize async Cerebras client (None when no API key is configured)
+_api_key = os.environ.get("CEREBRAS_API_KEY")
+client = AsyncCerebras(api_key=_api_key, base_url=CEREBRAS_BASE_URL) if _api_key else None
+
+# Caps in-flight upstream completions so a burst of chats cannot exhaust
+# connections; waiting callers yield to the event loop instead of blocking it
+_llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Reply given instead of a completion when no API key is configured
+NO_API_KEY_REPLY = "AI Assistant: I'm ready to help! Please provide your API key to enable full AI features."
+
+
+class PromptTokenStats:
+    """Prompt size per upstream request, to check it stays flat as chats grow"""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.total = 0
+        self.max = 0
+        self.recent = deque(maxlen=window)
+
+    def record(self, tokens: int) -> None:
+        self.requests += 1
+        self.total += tokens
+        self.max = max(self.max, tokens)
+        self.recent.append(tokens)
+
+    def snapshot(self) -> Dict[str, float]:
+        recent = sorted(self.recent)
+        pick = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0
+        return {
+            "requests": self.requests,
+            "mean": round(self.total / self.requests, 1) if self.requests else 0,
+            "p50": pick(0.5),
+            "p95": pick(0.95),
+            "max": self.max,
+            "last": self.recent[-1] if self.recent else 0,
+        }
+
+
+prompt_token_stats = PromptTokenStats()
+
+
+# Static instructions sent first in every system prompt, so the prompt
+# prefix is identical across users and requests
+SYSTEM_PROMPT = """You are "Doc", a personalized AI health companion for elderly patients. You are a knowledgeable assistant who specializes in:
+- Analyzing medical documents (prescriptions, lab reports, medical histories, diagnoses)
+- Interpreting health metrics and vital signs
+- Providing evidence-based health recommendations tailored to elderly patients
+- Understanding medication interactions
+- Offering practical lifestyle advice
+
+IMPORTANT: You should confidently analyze and discuss medical documents, lab results, prescriptions, and diagnoses. This is a personal health assistant role, and you are helping an elderly patient understand their own medical information.
+
+Guidelines:
+- Analyze and discuss medical documents openly - this is for the patient's own health understanding
+- If recommending medical changes, suggest consulting their primary care physician
+- Be aware of medication interactions
+- Provide lifestyle recommendations tailored to elderly patients (typically 65+)
+- Alert for concerning vital signs (e.g., BP >150/100, O2 <94%, glucose >200 or <70)
+- Keep responses clear, compassionate, and easy to understand
+- Focus on practical, actionable advice
+- Do not refuse to analyze medical documents or prescriptions - this is a personal health app"""
+
+
+def build_system_prompt(user_context: str) -> str:
+    """Build the "Doc" system prompt: static instructions, then the patient context"""
+    return f"{SYSTEM_PROMPT}\n\nPatient Context:\n{user_context}"
+
+
+def build_messages(user_context: str, user_message: str,
+                   history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """Build the messages sent to Cerebras: system prompt, prior turns, then the new message"""
+    return [
+        {"role": "system", "content": build_system_prompt(user_context)},
+        *(history or []),
+        {"role": "user", "content": user_message}
+    ]
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """Approximate prompt tokens for a message list (used when upstream reports no usage)"""
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+def error_message(error: Exception) -> str:
+    """Friendly reply text for a failed upstream call"""
+    if isinstance(error, asyncio.TimeoutError):
+        return "I'm taking longer than usual to respond. Please try again in a moment."
+    return f"I encountered an error: {str(error)}. Please ensure your Cerebras API key is valid."
+
+
+def _outcome(error: BaseException) -> str:
+    """Metrics label for a failed upstream call"""
+    return "timeout" if isinstance(error, asyncio.TimeoutError) else "error"
+
+
+async def _complete(messages: List[Dict[str, str]], endpoint: str = "chat") -> str:
+    """Run one upstream completion under the concurrency cap and timeout"""
+    async with _llm_slots:
+        # Latency is timed from when a slot is free, so queueing behind
+        # LLM_MAX_CONCURRENCY is not blamed on upstream
+        start = time.perf_counter()
+        try:
+            chat_completion = await asyncio.wait_for(
+                client.chat.completions.create(
+                    messages=messages,
+                    model=CEREBRAS_MODEL,
+                ),
+                timeout=LLM_TIMEOUT_SECONDS,
+            )
+        except Exception as e:
+            record_llm_call(endpoint, _outcome(e), time.perf_counter() - start)
+            raise
+        seconds = time.perf_counter() - start
+    usage = getattr(chat_completion, "usage", None)
+    content = chat_completion.choices[0].message.content
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or estimate_prompt_tokens(messages)
+    completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(content or "")
+    prompt_token_stats.record(prompt_tokens)
+    record_llm_call(endpoint, "ok", seconds, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return content
+
+
+async def analyze_with_cerebras(
+    user_context: str,
+    user_message: str,
+    user_id: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    raise_errors: bool = False,
+    history: Optional[List[Dict[str, str]]] = None,
+) -> str:
+    """Call Cerebras API for health analysis and chat without blocking the event loop
+    
+    When user_id and a cacheable endpoint (see llm_cache.ENDPOINT_TTLS) are
+    given, identical prompts are answered from the response cache, and
+    concurrent identical prompts always share one upstream call. Errors
+    are returned as a friendly message unless raise_errors is set (used by
+    background jobs so they can retry). history holds earlier chat turns
+    (see services.conversations); it is not cached.
+    """
+    if not client:
+        return NO_API_KEY_REPLY
+
+    cache_key = None
+    if user_id and endpoint and not history:
+        cache_key = make_cache_key(CEREBRAS_MODEL, user_id, user_context, user_message)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # Identical prompts already in flight share that call instead of paying for another
+    messages = build_messages(user_context, user_message, history)
+    try:
+        response = await inflight_calls.do(make_prompt_key(CEREBRAS_MODEL, messages), lambda: _complete(messages, endpoint or "chat"))
+    except Exception as e:
+        if raise_errors:
+            raise
+        return error_message(e)
+
+    # Only successful completions are cached
+    if cache_key:
+        response_cache.set(cache_key, response, user_id, endpoint)
+    return response
+
+
+# Marks the end of a reply in the stream buffer
+_STREAM_END = object()
+
+
+async def _pump_stream(messages: List[Dict[str, str]], buffer: asyncio.Queue, prompt_tokens: int) -> None:
+    """Read one upstream completion stream into buffer, holding an LLM slot only while upstream sends
+
+    Text pieces are queued as they arrive; the last item is _STREAM_END or
+    the exception that ended the stream. The buffer is unbounded - it holds
+    at most one reply - so a slow client never keeps the slot.
+    """
+    start = first_token = usage = None
+    completion_chars = 0
+    # Stays "cancelled" if the client goes away before the stream ends
+    outcome = "cancelled"
+    try:
+        async with _llm_slots:
+            start = time.perf_counter()
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(
+                    messages=messages,
+                    model=CEREBRAS_MODEL,
+                    stream=True,
+                ),
+                timeout=LLM_TIMEOUT_SECONDS,
+            )
+            chunks = stream.__aiter__()
+            while True:
+                # The timeout applies to each gap between chunks, so a long
+                # answer is fine but a stalled stream is cut off
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=LLM_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    break
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    completion_chars += len(chunk.choices[0].delta.content)
+                    buffer.put_nowait(chunk.choices[0].delta.content)
+        outcome = "ok"
+        buffer.put_nowait(_STREAM_END)
+    except Exception as e:
+        outcome = _outcome(e)
+        buffer.put_nowait(e)
+    finally:
+        if start is not None:
+            record_llm_call(
+                "chat_stream", outcome, time.perf_counter() - start, first_token,
+                getattr(usage, "prompt_tokens", None) or prompt_tokens,
+                getattr(usage, "completion_tokens", None) or tokens_for_chars(completion_chars),
+            )
+
+
+async def stream_with_cerebras(user_context: str, user_message: str,
+                               history: Optional[List[Dict[str, str]]] = None,
+                               raise_errors: bool = False) -> AsyncIterator[str]:
+    """Yield response text from Cerebras as tokens arrive
+
+    Upstream is read by a separate task (see _pump_stream), so the LLM slot
+    is freed when upstream finishes, not when the client has read it all.
+    """
+    if not client:
+        yield NO_API_KEY_REPLY
+        return
+
+    messages = build_messages(user_context, user_message, history)
+    prompt_tokens = estimate_prompt_tokens(messages)
+    prompt_token_stats.record(prompt_tokens)
+    buffer: asyncio.Queue = asyncio.Queue()
+    pump = asyncio.create_task(_pump_stream(messages, buffer, prompt_tokens))
+    try:
+        while True:
+            item = await buffer.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                if raise_errors:
+                    raise item
+                yield error_message(item)
+                break
+            yield item
+    finally:
+        # Stops the upstream read if the client went away mid-reply
+        pump.cancel()
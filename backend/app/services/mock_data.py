@@ -1,28 +1,34 @@
 from datetime import datetime, timedelta
 import random
 import json
+from typing import Optional
 
-def generate_mock_health_data(user_id: str, days: int = 30) -> list:
-    """Generate realistic elderly health data for the last N days"""
+def generate_mock_health_data(user_id: str, days: int = 30, seed: Optional[int] = None) -> list:
+    """Generate realistic elderly health data for the last N days (one reading a day)
+
+    Pass a seed for reproducible data. For minute-level data across many
+    users use services.synthetic_data instead.
+    """
+    rng = random.Random(seed)
     data = []
     
     for i in range(days):
         date = datetime.now() - timedelta(days=days-i)
         
         # Realistic elderly health patterns
-        heart_rate = random.randint(55, 85)  # Elderly average: 60-100
-        systolic = random.randint(130, 150)  # Slightly elevated for elderly
-        diastolic = random.randint(80, 95)
-        glucose = random.randint(100, 160)  # Possible pre-diabetes
-        oxygen = random.randint(94, 99)  # Should be high
-        temperature = 37 + random.uniform(-0.5, 0.5)
-        steps = random.randint(2000, 8000)  # Lower for elderly
-        sleep = random.uniform(6.5, 8.5)  # 7-8 hours typical
+        heart_rate = rng.randint(55, 85)  # Elderly average: 60-100
+        systolic = rng.randint(130, 150)  # Slightly elevated for elderly
+        diastolic = rng.randint(80, 95)
+        glucose = rng.randint(100, 160)  # Possible pre-diabetes
+        oxygen = rng.randint(94, 99)  # Should be high
+        temperature = 37 + rng.uniform(-0.5, 0.5)
+        steps = rng.randint(2000, 8000)  # Lower for elderly
+        sleep = rng.uniform(6.5, 8.5)  # 7-8 hours typical
         
         # Add some realistic variations
         if i % 3 == 0:  # Occasional stress days
-            heart_rate = random.randint(75, 95)
-            glucose = random.randint(150, 180)
+            heart_rate = rng.randint(75, 95)
+            glucose = rng.randint(150, 180)
         
         data.append({
             "heart_rate": heart_rate,
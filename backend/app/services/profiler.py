@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import uuid
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Per-request profiling is off unless enabled; when on, a request asks for
+# it with ?profile=1 or an "X-Profile: 1" header
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_MAX_DEPTH = 64
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every interval from a background thread
+
+    Sampling costs the profiled thread nothing between samples, unlike
+    cProfile's per-call hooks, so timings stay close to production. On the
+    event loop thread the samples include whatever else the loop ran during
+    the request, which is usually what a hot-path investigation wants.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format flamegraph.pl and speedscope read"""
+        return "\n".join(f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """Functions by samples spent in them (self), then under them (total)"""
+        own, total = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            own[stack[-1]] += n
+            for name in set(stack):
+                total[name] += n
+        ranked = sorted(total, key=lambda name: (own[name], total[name]), reverse=True)[:limit]
+        return [{"function": name, "self": own[name], "total": total[name]} for name in ranked]
+
+    def report(self, **extra) -> Dict[str, Any]:
+        return {
+            **extra,
+            "seconds": round(self.seconds, 4),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "top": self.top(),
+            "collapsed": self.collapsed(),
+        }
+
+
+class ProfileStore:
+    """Keeps the most recent request profiles for retrieval by id"""
+
+    def __init__(self, keep: int = PROFILE_KEEP):
+        self.keep = keep
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, profile: Dict[str, Any]) -> str:
+        profile_id = uuid.uuid4().hex[:16]
+        self._profiles[profile_id] = {"profile_id": profile_id, **profile}
+        while len(self._profiles) > self.keep:
+            self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{k: p[k] for k in ("profile_id", "method", "path", "seconds", "samples")}
+                for p in reversed(self._profiles.values())]
+
+
+request_profiles = ProfileStore()
+
+
+def _wants_profile(scope) -> bool:
+    if b"profile=1" in scope.get("query_string", b"").split(b"&"):
+        return True
+    return any(name == b"x-profile" and value == b"1" for name, value in scope.get("headers", ()))
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles requests which ask for it
+
+    The profile is kept in request_profiles and its id returned in an
+    X-Profile-Id header; fetch it from GET /debug/profiles/{id}. Does
+    nothing unless PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILING_ENABLED or scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profiler = SamplingProfiler()
+        # Reserve the id up front so it can go out with the response headers
+        profile_id = request_profiles.add({"method": scope["method"], "path": scope["path"],
+                                           "seconds": None, "samples": 0, "status": "running"})
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            profile = request_profiles.get(profile_id)
+            if profile is not None:
+                profile.update(profiler.report(status="complete"))
@@ -0,0 +1,70 @@
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+# Users whose rendered chat context is kept between messages
+PROMPT_CONTEXT_CACHE_SIZE = int(os.getenv("PROMPT_CONTEXT_CACHE_SIZE", "10000"))
+
+
+def build_patient_context(profile: Optional[Dict[str, Any]], metrics: Sequence[Dict[str, Any]]) -> str:
+    """Build the patient context block from profile and latest vitals"""
+    context = f"""User: {profile.get('name', 'Patient') if profile else 'Patient'} (Age: {profile.get('age', 'unknown') if profile else 'unknown'})
+Medical Conditions: {', '.join(profile.get('medical_conditions', []) if profile else [])}
+Current Medications: {', '.join(profile.get('medications', []) if profile else [])}
+Allergies: {', '.join(profile.get('allergies', []) if profile else [])}
+"""
+
+    if metrics:
+        latest = metrics[-1]
+        context += f"""
+Recent Vital Signs:
+- Heart Rate: {latest.get('heart_rate')} bpm
+- Blood Pressure: {latest.get('blood_pressure_systolic')}/{latest.get('blood_pressure_diastolic')} mmHg
+- Blood Glucose: {latest.get('blood_glucose')} mg/dL
+- Oxygen Saturation: {latest.get('oxygen_saturation')}%
+- Body Temperature: {latest.get('body_temperature')}°C
+- Steps Today: {latest.get('steps')}
+- Sleep Last Night: {latest.get('sleep_hours')} hours
+"""
+    return context
+
+
+class PatientContextCache:
+    """LRU of each user's rendered chat context and the profile it came from
+
+    Entries are dropped by data_service whenever the user's profile or
+    metrics change, so a conversation only pays for rebuilding the context
+    after new data arrives.
+    """
+
+    def __init__(self, max_entries: int = PROMPT_CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, load: Callable[[], Tuple[str, Optional[Dict[str, Any]]]]):
+        """Return (context, profile) for a user, calling load() only on a miss"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = self._entries[user_id] = load()
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared cache used by the chat routes
+patient_contexts = PatientContextCache()
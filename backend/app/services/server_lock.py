@@ -0,0 +1,54 @@
+import os
+import logging
+from typing import IO, Optional
+
+try:  # advisory file locks are POSIX-only
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+from app.services.storage import SQLITE_PATH, STORAGE_BACKEND
+
+logger = logging.getLogger(__name__)
+
+# Resident series, document indexes, the job table, alert state and the
+# response caches all live in the API process's memory, so one worker
+# should serve a SQLite database. The lock file sits next to the database
+# by default; batch tools such as app.precompute_insights do not take it.
+SERVER_LOCK_PATH = os.getenv("SERVER_LOCK_PATH") or os.path.join(os.path.dirname(SQLITE_PATH) or ".", "server.lock")
+# uvicorn and gunicorn take their default worker count from this; some
+# platforms (e.g. Heroku) set it themselves
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+_lock_file: Optional[IO] = None
+
+
+def acquire_server_lock(path: str = SERVER_LOCK_PATH, backend: str = STORAGE_BACKEND) -> None:
+    """Make sure this is the only API worker on a SQLite database, raising RuntimeError otherwise
+
+    The memory backend keeps everything per process, so it takes no lock.
+    WEB_CONCURRENCY above 1 only logs a warning. Calling it again from the
+    process that holds the lock is a no-op.
+    """
+    global _lock_file
+    if WEB_CONCURRENCY > 1:
+        logger.warning("WEB_CONCURRENCY=%d: resident series, document indexes, jobs and caches are "
+                       "per process, so workers will not see each other's in-memory state", WEB_CONCURRENCY)
+    if backend != "sqlite" or _lock_file is not None or fcntl is None:
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(f"another API worker holds {path}; run a single worker (no --workers)") from None
+    _lock_file = lock_file
+
+
+def release_server_lock() -> None:
+    global _lock_file
+    if _lock_file is not None:
+        fcntl.flock(_lock_file, fcntl.LOCK_UN)
+        _lock_file.close()
+        _lock_file = None
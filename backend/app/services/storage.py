@@ -0,0 +1,445 @@
+import os
+import json
+import queue
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.timeseries import METRIC_COLUMNS, MetricSeries
+
+logger = logging.getLogger(__name__)
+
+# Storage settings - tune per deployment via .env
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/health.db")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+SQLITE_COMMIT_INTERVAL_MS = int(os.getenv("SQLITE_COMMIT_INTERVAL_MS", "50"))
+SQLITE_COMMIT_BATCH_ROWS = int(os.getenv("SQLITE_COMMIT_BATCH_ROWS", "5000"))
+# Buffered rows kept while commits keep failing; the oldest beyond this are dropped
+SQLITE_MAX_PENDING_ROWS = int(os.getenv("SQLITE_MAX_PENDING_ROWS", "1000000"))
+
+_METRIC_NAMES = list(METRIC_COLUMNS)
+
+
+class StorageBackend(ABC):
+    """Persistence interface behind data_service
+
+    Health readings are served from in-memory MetricSeries; a backend only
+    has to persist them and load a user's series back on demand. Profiles,
+    documents, guardians and init flags go straight through the backend.
+    """
+
+    # Whether data survives restarts (and so resident series may be evicted)
+    persistent = False
+
+    @abstractmethod
+    def load_metrics(self, user_id: str) -> Optional[MetricSeries]:
+        ...
+
+    @abstractmethod
+    def append_metric(self, user_id: str, timestamp: int, values: List[Any], extras: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def append_metrics(self, user_id: str, timestamps: List[int], values: Dict[str, List[Any]],
+                       extras: Optional[Dict[int, Dict[str, Any]]] = None) -> None:
+        ...
+
+    @abstractmethod
+    def metric_users(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def list_documents(self, user_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_document(self, user_id: str, document: Dict[str, Any]) -> None:
+        """Insert a document, or replace the one with the same document_id"""
+
+    @abstractmethod
+    def pending_documents(self) -> List[Dict[str, Any]]:
+        """Every user's documents still waiting for analysis, oldest first"""
+
+    @abstractmethod
+    def list_guardians(self, user_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def add_guardian(self, user_id: str, guardian: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get_insight(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_insight(self, user_id: str, insight: Dict[str, Any]) -> None:
+        """Store a user's precomputed health insight, replacing the previous one"""
+
+    @abstractmethod
+    def is_initialized(self, user_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def mark_initialized(self, user_id: str) -> None:
+        ...
+
+    def flush(self, user_id: Optional[str] = None) -> None:
+        """Write out any buffered data (or just one user's)"""
+
+    def close(self) -> None:
+        """Flush and release resources"""
+        self.flush()
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local dicts - the original mock database, used for tests and demos"""
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.documents: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.guardians: Dict[str, List[Dict[str, Any]]] = {}
+        self.initialized: Dict[str, bool] = {}
+        self.insights: Dict[str, Dict[str, Any]] = {}
+
+    # The resident MetricSeries is the only copy of the readings
+    def load_metrics(self, user_id: str) -> Optional[MetricSeries]:
+        return None
+
+    def append_metric(self, user_id: str, timestamp: int, values: List[Any], extras: Dict[str, Any]) -> None:
+        pass
+
+    def append_metrics(self, user_id: str, timestamps: List[int], values: Dict[str, List[Any]],
+                       extras: Optional[Dict[int, Dict[str, Any]]] = None) -> None:
+        pass
+
+    def metric_users(self) -> List[str]:
+        return []
+
+    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.users.get(user_id)
+
+    def save_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        self.users[user_id] = profile
+
+    def list_documents(self, user_id: str) -> List[Dict[str, Any]]:
+        return list(self.documents.get(user_id, {}).values())
+
+    def save_document(self, user_id: str, document: Dict[str, Any]) -> None:
+        self.documents.setdefault(user_id, {})[document["document_id"]] = document
+
+    def pending_documents(self) -> List[Dict[str, Any]]:
+        return [document for documents in self.documents.values() for document in documents.values()
+                if document.get("status") == "pending"]
+
+    def list_guardians(self, user_id: str) -> List[Dict[str, Any]]:
+        return self.guardians.get(user_id, [])
+
+    def add_guardian(self, user_id: str, guardian: Dict[str, Any]) -> None:
+        self.guardians.setdefault(user_id, []).append(guardian)
+
+    def get_insight(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.insights.get(user_id)
+
+    def save_insight(self, user_id: str, insight: Dict[str, Any]) -> None:
+        self.insights[user_id] = insight
+
+    def is_initialized(self, user_id: str) -> bool:
+        return user_id in self.initialized
+
+    def mark_initialized(self, user_id: str) -> None:
+        self.initialized[user_id] = True
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS metrics (
+    user_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    {", ".join(f"{name} {'REAL' if code == 'f' else 'INTEGER'}" for name, code in METRIC_COLUMNS.items())},
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_user_ts ON metrics (user_id, ts);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_user_doc ON documents (user_id, document_id);
+CREATE TABLE IF NOT EXISTS guardians (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    guardian_id TEXT NOT NULL,
+    guardian TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_guardians_user ON guardians (user_id);
+CREATE TABLE IF NOT EXISTS insights (
+    user_id TEXT PRIMARY KEY,
+    insight TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS initialized (
+    user_id TEXT PRIMARY KEY
+);
+"""
+
+# Statements are constants so each pooled connection's statement cache
+# reuses the compiled (prepared) form
+_INSERT_METRIC = (
+    f"INSERT INTO metrics (user_id, ts, {', '.join(_METRIC_NAMES)}, extras) "
+    f"VALUES (?, ?, {', '.join('?' for _ in _METRIC_NAMES)}, ?)"
+)
+_SELECT_METRICS = (
+    f"SELECT ts, {', '.join(_METRIC_NAMES)}, extras FROM metrics "
+    f"WHERE user_id = ? ORDER BY ts, rowid"
+)
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite storage in WAL mode with group-committed metric inserts
+
+    Reads use a small pool of connections. Metric inserts are buffered and
+    written by a background thread in one transaction every
+    SQLITE_COMMIT_INTERVAL_MS (or sooner once SQLITE_COMMIT_BATCH_ROWS are
+    queued), so ingest never waits on a disk sync. With WAL and
+    synchronous=NORMAL a crash can lose at most the last commit interval;
+    the database file itself stays consistent. While commits keep failing
+    the buffer holds at most SQLITE_MAX_PENDING_ROWS; older rows are dropped
+    (and logged) so a dead disk can't exhaust memory.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str = SQLITE_PATH, pool_size: int = SQLITE_POOL_SIZE,
+                 commit_interval_ms: int = SQLITE_COMMIT_INTERVAL_MS,
+                 commit_batch_rows: int = SQLITE_COMMIT_BATCH_ROWS,
+                 max_pending_rows: int = SQLITE_MAX_PENDING_ROWS):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.commit_interval = commit_interval_ms / 1000
+        self.commit_batch_rows = commit_batch_rows
+        self.max_pending_rows = max_pending_rows
+
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        self._pending: List[Tuple] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="sqlite-group-commit", daemon=True)
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _execute_write(self, sql: str, params: Tuple) -> None:
+        with self._write_lock:
+            self._writer.execute(sql, params)
+
+    # --- health metrics (group-committed) ---
+
+    def append_metric(self, user_id: str, timestamp: int, values: List[Any], extras: Dict[str, Any]) -> None:
+        """Queue one encoded reading (see timeseries.encode_metric)"""
+        self._enqueue([(user_id, timestamp, *values, json.dumps(extras, default=str) if extras else None)])
+
+    def append_metrics(self, user_id: str, timestamps: List[int], values: Dict[str, List[Any]],
+                       extras: Optional[Dict[int, Dict[str, Any]]] = None) -> None:
+        """Queue a validated column batch (extras keyed by batch position)"""
+        columns = [values[name] for name in _METRIC_NAMES]
+        rows = [(user_id, ts, *vals, None) for ts, *vals in zip(timestamps, *columns)]
+        for i, e in (extras or {}).items():
+            rows[i] = (*rows[i][:-1], json.dumps(e, default=str))
+        self._enqueue(rows)
+
+    def _enqueue(self, rows: List[Tuple]) -> None:
+        with self._pending_lock:
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.commit_batch_rows
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.commit_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The rows are back in the buffer; retry on the next interval
+                logger.exception("sqlite group commit failed")
+
+    def flush(self, user_id: Optional[str] = None) -> None:
+        """Commit buffered metric rows (all of them, or one user's) in a single transaction
+
+        If the commit fails the rows go back to the front of the buffer
+        (ahead of anything queued meanwhile) before the error is raised; if
+        that takes the buffer past max_pending_rows the oldest rows are dropped.
+        """
+        # Rows are taken under the write lock, so a flush (and the read that
+        # follows it in load_metrics) waits for a commit already in flight
+        with self._write_lock:
+            with self._pending_lock:
+                if user_id is None:
+                    rows, self._pending = self._pending, []
+                else:
+                    rows = [row for row in self._pending if row[0] == user_id]
+                    if rows:
+                        self._pending = [row for row in self._pending if row[0] != user_id]
+            if not rows:
+                return
+            try:
+                self._writer.execute("BEGIN")
+                self._writer.executemany(_INSERT_METRIC, rows)
+                self._writer.execute("COMMIT")
+            except Exception:
+                if self._writer.in_transaction:
+                    self._writer.execute("ROLLBACK")
+                with self._pending_lock:
+                    self._pending[:0] = rows
+                    excess = len(self._pending) - self.max_pending_rows
+                    dropped = self._pending[:excess] if excess > 0 else []
+                    if dropped:
+                        del self._pending[:excess]
+                if dropped:
+                    logger.error("sqlite buffer full after failed commits: dropped %d oldest row(s) for %d user(s)",
+                                 len(dropped), len({row[0] for row in dropped}))
+                raise
+
+    def load_metrics(self, user_id: str) -> Optional[MetricSeries]:
+        """Read a user's series back; blocking, so async callers run it in a thread"""
+        # Make sure buffered rows for this user are visible first
+        self.flush(user_id)
+        with self._reader() as conn:
+            rows = conn.execute(_SELECT_METRICS, (user_id,)).fetchall()
+        if not rows:
+            return None
+        timestamps = [row[0] for row in rows]
+        values = {name: [row[i + 1] for row in rows] for i, name in enumerate(_METRIC_NAMES)}
+        extras = {i: json.loads(row[-1]) for i, row in enumerate(rows) if row[-1]}
+        return MetricSeries.from_columns(timestamps, values, extras)
+
+    def metric_users(self) -> List[str]:
+        with self._pending_lock:
+            # Users whose first rows are still buffered count too
+            pending = dict.fromkeys(row[0] for row in self._pending)
+        with self._reader() as conn:
+            stored = [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM metrics")]
+        return list(dict.fromkeys([*stored, *pending]))
+
+    # --- profiles, documents, guardians ---
+
+    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._reader() as conn:
+            row = conn.execute("SELECT profile FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_profile(self, user_id: str, profile: Dict[str, Any]) -> None:
+        self._execute_write(
+            "INSERT INTO users (user_id, profile) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET profile = excluded.profile",
+            (user_id, json.dumps(profile)),
+        )
+
+    def list_documents(self, user_id: str) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT document FROM documents WHERE user_id = ? ORDER BY seq", (user_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_document(self, user_id: str, document: Dict[str, Any]) -> None:
+        self._execute_write(
+            "INSERT INTO documents (user_id, document_id, document) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, document_id) DO UPDATE SET document = excluded.document",
+            (user_id, document["document_id"], json.dumps(document, default=str)),
+        )
+
+    def pending_documents(self) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT document FROM documents WHERE json_extract(document, '$.status') = 'pending' ORDER BY seq"
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def list_guardians(self, user_id: str) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT guardian FROM guardians WHERE user_id = ? ORDER BY seq", (user_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def add_guardian(self, user_id: str, guardian: Dict[str, Any]) -> None:
+        self._execute_write(
+            "INSERT INTO guardians (user_id, guardian_id, guardian) VALUES (?, ?, ?)",
+            (user_id, guardian["guardian_id"], json.dumps(guardian, default=str)),
+        )
+
+    def get_insight(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._reader() as conn:
+            row = conn.execute("SELECT insight FROM insights WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_insight(self, user_id: str, insight: Dict[str, Any]) -> None:
+        self._execute_write(
+            "INSERT INTO insights (user_id, insight) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET insight = excluded.insight",
+            (user_id, json.dumps(insight, default=str)),
+        )
+
+    def is_initialized(self, user_id: str) -> bool:
+        with self._reader() as conn:
+            return conn.execute("SELECT 1 FROM initialized WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def mark_initialized(self, user_id: str) -> None:
+        self._execute_write("INSERT OR IGNORE INTO initialized (user_id) VALUES (?)", (user_id,))
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        self._writer.close()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def create_backend(kind: str = STORAGE_BACKEND) -> StorageBackend:
+    """Build the backend selected by STORAGE_BACKEND ("memory" or "sqlite")"""
+    if kind == "sqlite":
+        return SQLiteBackend()
+    if kind == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
@@ -0,0 +1,178 @@
+import os
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+import numpy as np
+from app.services.timeseries import METRIC_COLUMNS, to_epoch_us
+
+US_PER_SECOND = 1_000_000
+US_PER_HOUR = 3600 * US_PER_SECOND
+US_PER_DAY = 24 * US_PER_HOUR
+
+# Share of days with a stress episode (raised heart rate, blood pressure, glucose)
+STRESS_DAY_PROBABILITY = 0.3
+# Local hours of the day's meals, which drive post-meal glucose peaks
+MEAL_HOURS = (8.0, 12.5, 18.5)
+# Awake steps per minute at the activity peak, before per-user scaling
+PEAK_STEPS_PER_MINUTE = 10.0
+
+_DTYPES = {"h": np.int16, "i": np.int32, "f": np.float32}
+
+Columns = Dict[str, np.ndarray]
+
+
+def _daily(clock: Tuple[np.ndarray, np.ndarray], peak_hour: float) -> np.ndarray:
+    """Cosine rhythm over the day, 1.0 at peak_hour and -1.0 twelve hours later
+
+    clock is (cos, sin) of the time of day, so each rhythm costs two
+    multiplies instead of another cosine.
+    """
+    peak = peak_hour * (2 * math.pi / 24)
+    return clock[0] * math.cos(peak) + clock[1] * math.sin(peak)
+
+
+def generate_user_vitals(rng: np.random.Generator, start_us: int, samples: int,
+                         resolution_seconds: int = 60) -> Tuple[np.ndarray, Columns]:
+    """Generate one user's readings as (timestamps, columns) NumPy arrays
+
+    Vitals are correlated rather than independent noise: heart rate and
+    blood pressure follow a daily rhythm, drop during each night's sleep
+    session and rise with activity and on stress days; glucose peaks after
+    meals; oxygen dips during sleep for users with apnoea. Each column has
+    the dtype of its MetricSeries column.
+    """
+    ts = start_us + np.arange(samples, dtype=np.int64) * (resolution_seconds * US_PER_SECOND)
+    hour = (ts % US_PER_DAY) / US_PER_HOUR
+    angle = hour * (2 * math.pi / 24)
+    clock = (np.cos(angle), np.sin(angle))
+    day = ts // US_PER_DAY - ts[0] // US_PER_DAY
+    days = int(day[-1]) + 2
+
+    # Per-user traits
+    heart_rate_base = rng.normal(68, 6)
+    systolic_base = rng.normal(136, 8)
+    diastolic_base = rng.normal(84, 5)
+    glucose_base = rng.normal(112, 10)
+    oxygen_base = rng.normal(97, 0.7)
+    apnoea = rng.uniform(0, 3)
+    activity = rng.uniform(0.5, 1.5)
+
+    # Per-day events
+    stress = (rng.random(days) < STRESS_DAY_PROBABILITY)[day]
+    bedtime = rng.normal(22.5, 0.6, days)
+    sleep_length = np.clip(rng.normal(7.2, 0.8, days), 4.5, 9.5)
+    meal_size = np.clip(rng.normal(40, 12, (days, len(MEAL_HOURS))), 5, None)
+
+    # Night n starts at bedtime[n] on day n; shifting the clock by 12 hours
+    # puts each night inside a single shifted day
+    shifted = ts - 12 * US_PER_HOUR
+    night = shifted // US_PER_DAY - (ts[0] - 12 * US_PER_HOUR) // US_PER_DAY
+    night_hour = (shifted % US_PER_DAY) / US_PER_HOUR
+    sleep_start = bedtime[night] - 12
+    sleep_end = sleep_start + sleep_length[night]
+    asleep = (night_hour >= sleep_start) & (night_hour < sleep_end)
+    last_sleep = np.where(night_hour >= sleep_end, sleep_length[night], sleep_length[np.maximum(night - 1, 0)])
+
+    # Steps per interval: bursty (exponentially distributed) walking while awake, none while asleep
+    minutes = resolution_seconds / 60
+    step_rate = PEAK_STEPS_PER_MINUTE * activity * np.clip(0.6 + 0.5 * _daily(clock, 11), 0, None)
+    steps = np.floor(step_rate * rng.standard_exponential(samples) * minutes * ~asleep)
+    steps_per_minute = np.minimum(steps / minutes, 60)
+
+    heart_rate = (heart_rate_base + 5 * _daily(clock, 15) - 7 * asleep + 0.5 * steps_per_minute
+                  + 10 * stress + rng.normal(0, 3, samples))
+    morning_surge = np.exp(-((hour - 8) / 2) ** 2)
+    systolic = (systolic_base + 8 * morning_surge - 10 * asleep + 0.4 * (heart_rate - heart_rate_base)
+                + 8 * stress + rng.normal(0, 5, samples))
+    diastolic = diastolic_base + 0.5 * (systolic - systolic_base) + rng.normal(0, 3, samples)
+
+    # Gamma-shaped post-meal curve peaking 45 minutes after eating
+    glucose = glucose_base + 8 * np.exp(-((hour - 6) / 1.5) ** 2) + 25 * stress + rng.normal(0, 6, samples)
+    for meal, meal_hour in enumerate(MEAL_HOURS):
+        since = np.clip(hour - meal_hour, 0, None) / 0.75
+        glucose += meal_size[day, meal] * since * np.exp(1 - since)
+
+    oxygen = oxygen_base - apnoea * asleep * rng.random(samples) + rng.normal(0, 0.5, samples)
+    temperature = 36.6 + 0.25 * _daily(clock, 18) - 0.15 * asleep + rng.normal(0, 0.1, samples)
+
+    values = {
+        "heart_rate": np.clip(heart_rate, 40, 180),
+        "blood_pressure_systolic": np.clip(systolic, 90, 220),
+        "blood_pressure_diastolic": np.clip(diastolic, 50, 130),
+        "blood_glucose": np.clip(glucose, 55, 350),
+        "oxygen_saturation": np.clip(oxygen, 85, 100),
+        "body_temperature": temperature,
+        "steps": steps,
+        "sleep_hours": last_sleep,
+    }
+    columns = {
+        name: (np.round(values[name], 1) if code == "f" else np.rint(values[name])).astype(_DTYPES[code])
+        for name, code in METRIC_COLUMNS.items()
+    }
+    return ts, columns
+
+
+def generate_population(users: int, samples: int, start: Optional[datetime] = None,
+                        resolution_seconds: int = 60, seed: int = 0,
+                        user_prefix: str = "synthetic_") -> Iterator[Tuple[str, np.ndarray, Columns]]:
+    """Yield (user_id, timestamps, columns) for `users` users of `samples` readings each
+
+    Each user has their own generator seeded from (seed, user number), so
+    a user's data is the same whichever subset of the population is made.
+    By default the readings end now.
+    """
+    if start is None:
+        start = datetime.now() - timedelta(seconds=samples * resolution_seconds)
+    start_us = to_epoch_us(start)
+    for i in range(users):
+        rng = np.random.default_rng([seed, i])
+        yield (f"{user_prefix}{i:06d}", *generate_user_vitals(rng, start_us, samples, resolution_seconds))
+
+
+def load_into_store(population: Iterator[Tuple[str, np.ndarray, Columns]]) -> int:
+    """Bulk-add generated users through data_service, returning rows added"""
+    from app.services.data_service import add_health_data_batch
+    rows = 0
+    for user_id, timestamps, columns in population:
+        added, _ = add_health_data_batch(user_id, timestamps.tolist(), {name: col.tolist() for name, col in columns.items()})
+        rows += added
+    return rows
+
+
+def write_npz(path: str, population: Iterator[Tuple[str, np.ndarray, Columns]]) -> int:
+    """Write the population to one .npz: user_ids, row offsets per user and concatenated columns"""
+    user_ids, offsets, timestamps, columns = [], [0], [], {name: [] for name in METRIC_COLUMNS}
+    for user_id, ts, cols in population:
+        user_ids.append(user_id)
+        offsets.append(offsets[-1] + len(ts))
+        timestamps.append(ts)
+        for name in METRIC_COLUMNS:
+            columns[name].append(cols[name])
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, user_ids=np.array(user_ids), offsets=np.array(offsets, dtype=np.int64),
+             timestamp=np.concatenate(timestamps), **{name: np.concatenate(parts) for name, parts in columns.items()})
+    return offsets[-1]
+
+
+_NDJSON_LINE = "{" + ",".join(
+    ['"timestamp":"%s"'] + [f'"{name}":{"%.1f" if code == "f" else "%d"}' for name, code in METRIC_COLUMNS.items()]
+) + "}"
+
+
+def ndjson_lines(timestamps: np.ndarray, columns: Columns) -> str:
+    """Format one user's readings as NDJSON (the batch ingest endpoint's format)"""
+    stamps = np.datetime_as_string(timestamps.astype("datetime64[us]"), unit="s").tolist()
+    lines = map(_NDJSON_LINE.__mod__, zip(stamps, *(columns[name].tolist() for name in METRIC_COLUMNS)))
+    return "\n".join(lines) + "\n"
+
+
+def write_ndjson(directory: str, population: Iterator[Tuple[str, np.ndarray, Columns]]) -> int:
+    """Write one <user_id>.ndjson per user, ready to POST to the batch ingest endpoint"""
+    os.makedirs(directory, exist_ok=True)
+    rows = 0
+    for user_id, ts, cols in population:
+        with open(os.path.join(directory, f"{user_id}.ndjson"), "w") as f:
+            f.write(ndjson_lines(ts, cols))
+        rows += len(ts)
+    return rows
@@ -0,0 +1,231 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+# Bucket upper bounds (seconds / bytes / tokens)
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+RESPONSE_SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}"
+                for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set"""
+
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self._values[labels] = value
+
+
+class CallbackGauge(Counter):
+    """Read at scrape time from a stats function returning {labels: value}
+
+    Used for state that already lives elsewhere (cache sizes, job counts),
+    so nothing has to be updated on the hot path.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Dict[Labels, float]],
+                 labelnames: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.read = read
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        self._values = self.read()
+        return super().samples()
+
+
+class Histogram:
+    """Bucketed observations per label set, rendered as cumulative Prometheus buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, labels: Labels = ()) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_text(names, labels + (_number(bound),))} {cumulative}")
+            label_text = _label_text(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    """Holds metrics in registration order and renders the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    HTTP_LATENCY_BUCKETS, ("method", "route")))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size", RESPONSE_SIZE_BUCKETS, ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled", ("method",)))
+
+llm_requests = registry.register(Counter(
+    "llm_requests_total", "Upstream LLM calls by endpoint and outcome (ok, error, timeout, cancelled)",
+    ("endpoint", "outcome")))
+llm_duration = registry.register(Histogram(
+    "llm_request_duration_seconds", "Upstream LLM call latency", LLM_LATENCY_BUCKETS, ("endpoint",)))
+llm_time_to_first_token = registry.register(Histogram(
+    "llm_time_to_first_token_seconds", "Time until the first streamed token",
+    LLM_LATENCY_BUCKETS, ("endpoint",)))
+llm_prompt_tokens = registry.register(Counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent upstream", ("endpoint",)))
+llm_completion_tokens = registry.register(Counter(
+    "llm_completion_tokens_total", "Completion tokens received", ("endpoint",)))
+
+
+def record_llm_call(endpoint: str, outcome: str, seconds: float, first_token_seconds: Optional[float] = None,
+                    prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+    """Record one finished upstream LLM call"""
+    labels = (endpoint,)
+    llm_requests.inc((endpoint, outcome))
+    llm_duration.observe(seconds, labels)
+    if first_token_seconds is not None:
+        llm_time_to_first_token.observe(first_token_seconds, labels)
+    if prompt_tokens:
+        llm_prompt_tokens.inc(labels, prompt_tokens)
+    if completion_tokens:
+        llm_completion_tokens.inc(labels, completion_tokens)
+
+
+def _route_paths(app) -> Dict[object, str]:
+    """Map each route's endpoint to its path template, built once per app"""
+    paths = getattr(app.state, "metric_route_paths", None)
+    if paths is None:
+        paths = {getattr(r, "endpoint", None): r.path for r in app.routes if hasattr(r, "path")}
+        app.state.metric_route_paths = paths
+    return paths
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, response size, status and in-flight count
+
+    Routes are labelled by path template (/api/health/summary/{user_id}),
+    not the raw path, to keep label cardinality bounded. Latency runs until
+    the last body chunk is sent, so streamed responses count their whole
+    duration. Written as plain ASGI rather than BaseHTTPMiddleware so
+    streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc((method,))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec((method,))
+            # The router adds the matched endpoint to the shared scope
+            route = "<unmatched>"
+            if "app" in scope and "endpoint" in scope:
+                route = _route_paths(scope["app"]).get(scope["endpoint"], route)
+            labels = (method, route)
+            http_requests.inc((method, route, str(status)))
+            http_request_duration.observe(elapsed, labels)
+            http_response_size.observe(size, labels)
@@ -0,0 +1,187 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+try:  # in requirements.txt; OCR also needs the tesseract binary on the host
+    import pytesseract
+except ImportError:  # pragma: no cover
+    pytesseract = None
+
+# Local extraction runs in worker processes so parsing never blocks the event loop
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# Most extracted text forwarded to the LLM per document
+MAX_EXTRACTED_CHARS = int(os.getenv("MAX_EXTRACTED_CHARS", "12000"))
+# Images are downscaled to this longest side before OCR
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2000"))
+
+# What a malformed or unreadable upload raises; anything else (a broken pool,
+# say) is a server fault and should fail the job rather than be swallowed
+EXTRACTION_ERRORS = (PyPdfError, Image.DecompressionBombError, OSError, ValueError)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp"}
+TEXT_EXTENSIONS = {".txt", ".csv", ".md"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+# Per-process cache of open PDFs, so a worker parses the page tree once per file
+_readers: Dict[str, PdfReader] = {}
+
+
+def detect_file_kind(file_path: str, file_name: str) -> str:
+    """Classify a stored upload as pdf, image, text or unknown (reads the file - call in a worker)"""
+    with open(file_path, "rb") as f:
+        head = f.read(8)
+    ext = os.path.splitext(file_name or "")[1].lower()
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if ext in IMAGE_EXTENSIONS or head.startswith((b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"II*\x00", b"MM\x00*")):
+        return "image"
+    if ext in TEXT_EXTENSIONS:
+        return "text"
+    return "unknown"
+
+
+def _reader(file_path: str) -> PdfReader:
+    reader = _readers.get(file_path)
+    if reader is None:
+        if len(_readers) >= 8:
+            _readers.clear()
+        reader = _readers[file_path] = PdfReader(file_path)
+    return reader
+
+
+def _pdf_page_count(file_path: str) -> int:
+    return len(_reader(file_path).pages)
+
+
+def _pdf_page_text(file_path: str, page_index: int) -> str:
+    return _reader(file_path).pages[page_index].extract_text() or ""
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """Normalize a scanned page for OCR: orientation, grayscale, contrast, size"""
+    image = ImageOps.exif_transpose(image)
+    image = ImageOps.grayscale(image)
+    image = ImageOps.autocontrast(image, cutoff=1)
+    if max(image.size) > IMAGE_MAX_SIDE:
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    return image
+
+
+def _image_frame_count(file_path: str) -> int:
+    with Image.open(file_path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def _image_frame_text(file_path: str, frame_index: int) -> str:
+    with Image.open(file_path) as image:
+        image.seek(frame_index)
+        page = preprocess_image(image)
+        if pytesseract is None:
+            return ""
+        try:
+            return pytesseract.image_to_string(page)
+        except pytesseract.TesseractNotFoundError:
+            return ""
+
+
+def _text_file_text(file_path: str, page_index: int) -> str:
+    # One character past the cap, so the caller can tell the file was cut
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        return f.read(MAX_EXTRACTED_CHARS + 1)
+
+
+_PAGE_COUNTERS = {"pdf": _pdf_page_count, "image": _image_frame_count, "text": lambda file_path: 1}
+_PAGE_READERS = {"pdf": _pdf_page_text, "image": _image_frame_text, "text": _text_file_text}
+
+
+def _inspect(file_path: str, file_name: str) -> Tuple[str, int]:
+    kind = detect_file_kind(file_path, file_name)
+    counter = _PAGE_COUNTERS.get(kind)
+    return kind, counter(file_path) if counter else 0
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Shared extraction process pool, created on first use"""
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the server process already runs threads and an event loop
+        _pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the extraction worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def inspect_document(file_path: str, file_name: str) -> Tuple[str, int]:
+    """(kind, page count) of a stored upload, sniffed in a worker process"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), _inspect, file_path, file_name)
+
+
+async def iter_pages(file_path: str, kind: str, page_count: int) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (page index, text) for each page as soon as its worker finishes
+
+    PDF pages and image frames are parsed in parallel across the process
+    pool, so pages may arrive out of order. Cancelling the iterator cancels
+    the pages that have not started yet.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    page_fn = _PAGE_READERS.get(kind)
+    if page_fn is None:
+        return
+
+    async def extract_page(index: int) -> Tuple[int, str]:
+        return index, await loop.run_in_executor(pool, page_fn, file_path, index)
+
+    tasks = [asyncio.ensure_future(extract_page(i)) for i in range(page_count)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def extract_document_text(file_path: str, file_name: str, max_chars: int = MAX_EXTRACTED_CHARS) -> Dict[str, object]:
+    """Extract up to max_chars of text from a stored upload, in page order
+
+    Stops as soon as the leading pages already fill max_chars, so long
+    reports don't parse pages that would be truncated away anyway;
+    "truncated" is set when pages were skipped or the text was cut.
+    """
+    kind, page_count = await inspect_document(file_path, file_name)
+    pages: Dict[int, str] = {}
+    prefix_pages = 0
+    prefix_chars = 0
+    page_stream = iter_pages(file_path, kind, page_count)
+    try:
+        async for index, text in page_stream:
+            pages[index] = text.strip()
+            while prefix_pages in pages:
+                prefix_chars += len(pages[prefix_pages]) + 2
+                prefix_pages += 1
+            if prefix_chars >= max_chars:
+                break
+    finally:
+        await page_stream.aclose()
+
+    ordered = [pages[i] for i in range(prefix_pages)]
+    text = "\n\n".join(t for t in ordered if t)
+    return {
+        "text": text[:max_chars],
+        "pages": prefix_pages,
+        "truncated": prefix_pages < page_count or len(text) > max_chars,
+    }
@@ -0,0 +1,318 @@
+import math
+import base64
+import operator
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+from app.services.aggregates import RollingAggregates
+
+# Typed column layout for HealthMetric readings.
+#   h = int16, i = int32, f = float32 (array module typecodes)
+METRIC_COLUMNS = {
+    "heart_rate": "h",
+    "blood_pressure_systolic": "h",
+    "blood_pressure_diastolic": "h",
+    "blood_glucose": "f",
+    "oxygen_saturation": "f",
+    "body_temperature": "f",
+    "steps": "i",
+    "sleep_hours": "f",
+}
+
+# Sentinels for readings that did not include a field
+MISSING_INT = {"h": -(2 ** 15), "i": -(2 ** 31)}
+MISSING_FLOAT = float("nan")
+MISSING = {name: MISSING_FLOAT if code == "f" else MISSING_INT[code] for name, code in METRIC_COLUMNS.items()}
+
+# float32 holds ~7 significant digits; round on the way out so 37.2 reads
+# back as 37.2 rather than 37.20000076293945
+FLOAT_DECIMALS = 2
+FLOAT32_MAX = 3.4028234663852886e38
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_us(value: Union[datetime, str, int, float]) -> int:
+    """Convert a datetime / ISO string to int64 microseconds since the epoch
+
+    Naive datetimes are stored as-is (so they read back unchanged); aware
+    datetimes are converted to UTC first.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_epoch_us(value: int) -> datetime:
+    """Convert int64 epoch microseconds back to a naive datetime"""
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def encode_cursor(timestamp_us: int, skip: int) -> str:
+    """Encode a pagination position as an opaque URL-safe token"""
+    return base64.urlsafe_b64encode(f"{timestamp_us}:{skip}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Decode a token from encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp_us, skip = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return int(timestamp_us), max(0, int(skip))
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class MetricSeries:
+    """Per-user health readings stored as typed, growable columns
+
+    Timestamps are int64 epoch microseconds; vitals use int16/int32/float32.
+    Rows are kept sorted by timestamp, so the timestamp column doubles as a
+    binary-search index for range queries. Keys outside METRIC_COLUMNS are
+    kept in a sparse side table so the dict view still round-trips whatever
+    a device sent.
+    """
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.columns = {name: array(code) for name, code in METRIC_COLUMNS.items()}
+        self._extras: Dict[int, Dict[str, Any]] = {}
+        self.rollups = RollingAggregates(tuple(METRIC_COLUMNS))
+        # Bumped whenever rows are inserted before the end, so caches built
+        # on append-only growth (services.downsample) know to rebuild
+        self.edits = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_columns(cls, timestamps: List[int], values: Dict[str, List[Optional[float]]],
+                     extras: Optional[Dict[int, Dict[str, Any]]] = None) -> "MetricSeries":
+        """Build a series from timestamp-sorted columns (e.g. loaded from storage)"""
+        series = cls()
+        series.extend_columns(timestamps, values)
+        if extras:
+            series._extras = dict(extras)
+        return series
+
+    def append(self, metric: Dict[str, Any]) -> int:
+        """Insert one reading in timestamp order, returning its row index"""
+        return self.append_encoded(*encode_metric(metric))
+
+    def append_encoded(self, timestamp: int, values: List[Optional[float]], extras: Dict[str, Any]) -> int:
+        """Insert one reading already passed through encode_metric
+
+        In-order readings are a plain append; a late (out-of-order) reading
+        is inserted after any rows with the same timestamp.
+        """
+        row = len(self.timestamps)
+        if row and timestamp < self.timestamps[-1]:
+            row = bisect_right(self.timestamps, timestamp)
+            self.edits += 1
+            self.timestamps.insert(row, timestamp)
+            for (name, column), value in zip(self.columns.items(), values):
+                column.insert(row, MISSING[name] if value is None else value)
+            if self._extras:
+                self._extras = {(i + 1 if i >= row else i): e for i, e in self._extras.items()}
+        else:
+            self.timestamps.append(timestamp)
+            for (name, column), value in zip(self.columns.items(), values):
+                column.append(MISSING[name] if value is None else value)
+        if extras:
+            self._extras[row] = extras
+        self.rollups.add(timestamp, values)
+        return row
+
+    def extend(self, metrics: Iterable[Dict[str, Any]]) -> int:
+        """Append many readings, returning how many were added"""
+        count = 0
+        for metric in metrics:
+            self.append(metric)
+            count += 1
+        return count
+
+    def extend_columns(self, timestamps: List[int], values: Dict[str, List[Optional[float]]],
+                       extras: Optional[Dict[int, Dict[str, Any]]] = None) -> int:
+        """Apply a validated batch in one operation, returning rows added
+
+        `values` holds one list per METRIC_COLUMNS entry (None = missing),
+        aligned with `timestamps`; `extras` maps batch positions to their
+        non-vital fields. A batch that starts at or after the last stored
+        reading is a bulk array extend; otherwise the batch is merged into
+        place with a single stable re-sort.
+        """
+        count = len(timestamps)
+        if not count:
+            return 0
+        names = list(METRIC_COLUMNS)
+        extras = extras or {}
+        if any(map(operator.gt, timestamps, timestamps[1:])):
+            order = sorted(range(count), key=timestamps.__getitem__)
+            timestamps = [timestamps[i] for i in order]
+            values = {name: [values[name][i] for i in order] for name in names}
+            if extras:
+                position = {old: new for new, old in enumerate(order)}
+                extras = {position[i]: e for i, e in extras.items()}
+
+        self.rollups.add_many(timestamps, [values[name] for name in names])
+
+        encoded = {
+            name: array(METRIC_COLUMNS[name], values[name] if None not in values[name]
+                        else [MISSING[name] if v is None else v for v in values[name]])
+            for name in names
+        }
+        existing = len(self.timestamps)
+        if not existing or timestamps[0] >= self.timestamps[-1]:
+            self.timestamps.extend(array("q", timestamps))
+            for name in names:
+                self.columns[name].extend(encoded[name])
+            for i, e in extras.items():
+                self._extras[existing + i] = e
+            return count
+
+        self.edits += 1
+        merged_ts = self.timestamps + array("q", timestamps)
+        order = sorted(range(len(merged_ts)), key=merged_ts.__getitem__)
+        self.timestamps = array("q", [merged_ts[i] for i in order])
+        for name in names:
+            merged = self.columns[name] + encoded[name]
+            self.columns[name] = array(merged.typecode, [merged[i] for i in order])
+        if self._extras or extras:
+            combined = {**self._extras, **{existing + i: e for i, e in extras.items()}}
+            new_index = {old: new for new, old in enumerate(order) if old in combined}
+            self._extras = {new_index[i]: e for i, e in combined.items()}
+        return count
+
+    def column(self, name: str) -> array:
+        """Return the raw typed column for a vital (or "timestamp")"""
+        if name == "timestamp":
+            return self.timestamps
+        return self.columns[name]
+
+    def range_indices(self, start_us: Optional[int] = None, end_us: Optional[int] = None):
+        """Return the [lo, hi) row span with start_us <= timestamp <= end_us"""
+        lo = 0 if start_us is None else bisect_left(self.timestamps, start_us)
+        hi = len(self.timestamps) if end_us is None else bisect_right(self.timestamps, end_us)
+        return lo, max(lo, hi)
+
+    def page(self, start_us: Optional[int], end_us: Optional[int], cursor: Optional[str], limit: int):
+        """Return (lo, hi, total, next_cursor) for one page of a time range
+
+        The cursor records the next row's timestamp plus how many rows with
+        that same timestamp were already returned, so it stays valid when
+        late readings are inserted earlier in the series.
+        """
+        lo, hi = self.range_indices(start_us, end_us)
+        total = hi - lo
+        if cursor:
+            cursor_ts, skip = decode_cursor(cursor)
+            lo = min(max(lo, bisect_left(self.timestamps, cursor_ts) + skip), hi)
+        page_hi = min(hi, lo + limit)
+        next_cursor = None
+        if page_hi < hi:
+            next_ts = self.timestamps[page_hi]
+            next_cursor = encode_cursor(next_ts, page_hi - bisect_left(self.timestamps, next_ts))
+        return lo, page_hi, total, next_cursor
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Materialize one reading as a dict in the original HEALTH_DATA shape"""
+        if index < 0:
+            index += len(self.timestamps)
+        if not 0 <= index < len(self.timestamps):
+            raise IndexError("metric row out of range")
+        metric: Dict[str, Any] = {}
+        for name, column in self.columns.items():
+            value = _decode(column.typecode, column[index])
+            if value is not None:
+                metric[name] = value
+        metric["timestamp"] = from_epoch_us(self.timestamps[index]).isoformat()
+        extras = self._extras.get(index)
+        if extras:
+            metric.update(extras)
+        return metric
+
+    def extras_between(self, lo: int, hi: int) -> Dict[int, Dict[str, Any]]:
+        """Non-vital fields of rows [lo, hi), keyed by offset from lo"""
+        return {i - lo: e for i, e in self._extras.items() if lo <= i < hi}
+
+    def rows(self) -> "MetricRowsView":
+        """Return a read-only list-of-dicts view over the series"""
+        return MetricRowsView(self)
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the column buffers"""
+        total = self.timestamps.buffer_info()[1] * self.timestamps.itemsize
+        for column in self.columns.values():
+            total += column.buffer_info()[1] * column.itemsize
+        return total
+
+
+def encode_metric(metric: Dict[str, Any]):
+    """Validate a reading dict into (timestamp_us, column values, extras)
+
+    Column values follow METRIC_COLUMNS order with None for missing fields.
+    Raises ValueError for a missing/invalid timestamp or out-of-range value.
+    """
+    if "timestamp" not in metric or metric["timestamp"] is None:
+        raise ValueError("metric is missing a timestamp")
+    try:
+        timestamp = to_epoch_us(metric["timestamp"])
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid timestamp: {metric['timestamp']!r}")
+
+    values: List[Optional[Union[int, float]]] = []
+    for name, code in METRIC_COLUMNS.items():
+        raw = metric.get(name)
+        if raw is None:
+            values.append(None)
+            continue
+        try:
+            value = float(raw) if code == "f" else int(round(float(raw)))
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be numeric, got {raw!r}")
+        if code == "f":
+            if not math.isfinite(value) or abs(value) > FLOAT32_MAX:
+                raise ValueError(f"{name} out of range: {raw!r}")
+        elif not MISSING_INT[code] < value <= -MISSING_INT[code] - 1:
+            raise ValueError(f"{name} out of range: {raw!r}")
+        values.append(value)
+
+    extras = {k: v for k, v in metric.items() if k not in METRIC_COLUMNS and k != "timestamp"}
+    return timestamp, values, extras
+
+
+def _decode(code: str, value: Union[int, float]) -> Optional[Union[int, float]]:
+    if code == "f":
+        return None if math.isnan(value) else round(value, FLOAT_DECIMALS)
+    return None if value == MISSING_INT[code] else value
+
+
+class MetricRowsView(Sequence):
+    """Sequence of reading dicts backed by a MetricSeries
+
+    Indexing materializes one dict; slicing returns a plain list so results
+    can be returned from routes directly.
+    """
+
+    def __init__(self, series: MetricSeries):
+        self._series = series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._series.row(i) for i in range(*index.indices(len(self._series)))]
+        return self._series.row(index)
+
+    def __iter__(self):
+        row = self._series.row
+        for i in range(len(self._series)):
+            yield row(i)
@@ -0,0 +1,29 @@
+import uuid
+from typing import Dict, Sequence, Tuple
+
+# Data sources a user's responses are built from
+SOURCES = ("metrics", "profile", "documents", "guardians")
+
+
+class DataVersions:
+    """Per-user change counters for each data source, bumped by data_service writes
+
+    Counters live in process memory and restart from zero, so validators
+    built from them (services.http_cache) also carry this process's random
+    epoch - a version number seen before a restart never matches again.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, Dict[str, int]] = {}
+
+    def bump(self, user_id: str, source: str) -> None:
+        versions = self._versions.setdefault(user_id, {})
+        versions[source] = versions.get(source, 0) + 1
+
+    def get(self, user_id: str, sources: Sequence[str]) -> Tuple[int, ...]:
+        versions = self._versions.get(user_id, {})
+        return tuple(versions.get(source, 0) for source in sources)
+
+
+data_versions = DataVersions()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Measure alert rule evaluation cost, per reading and for whole batches.
+
+Per-reading evaluation is what add_health_data pays on every ingest;
+batch evaluation is what the bulk endpoint and the reload-from-storage
+path use.
+
+Usage (from backend/):
+    python -m benchmarks.bench_alerts --rows 50000
+"""
+import argparse
+import time
+
+from app.services.alerts import AlertEngine
+from app.services.timeseries import METRIC_COLUMNS, encode_metric
+from benchmarks.bench_timeseries import make_readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    encoded = [encode_metric(r) for r in make_readings(args.rows)]
+    timestamps = [ts for ts, _, _ in encoded]
+    columns = {name: [values[i] for _, values, _ in encoded] for i, name in enumerate(METRIC_COLUMNS)}
+
+    engine = AlertEngine()
+    t0 = time.perf_counter()
+    fired = sum(len(engine.evaluate("bench", ts, values)) for ts, values, _ in encoded)
+    per_reading = time.perf_counter() - t0
+
+    engine = AlertEngine()
+    t0 = time.perf_counter()
+    batch_fired = len(engine.evaluate_batch("bench", timestamps, columns))
+    batch = time.perf_counter() - t0
+
+    print(f"{len(engine.rules)} rules, {args.rows:,} readings")
+    print(f"per reading  {per_reading / args.rows * 1e6:>8.2f} us/reading   ({fired:,} alerts)")
+    print(f"batch        {batch / args.rows * 1e6:>8.2f} us/reading   ({batch_fired:,} alerts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Measure bulk metric ingest throughput (validation + columnar store).
+
+The target for POST /api/health/metrics/{user_id}/batch is ~100k rows/s
+on one core; validation against HealthMetric dominates the cost.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingest --rows 100000
+"""
+import argparse
+import json
+import time
+
+from app.services.ingest import MetricBatch
+from app.services.timeseries import MetricSeries
+from benchmarks.bench_timeseries import make_readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = [json.dumps(r).encode() for r in make_readings(args.rows)]
+
+    best = 0.0
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        batch = MetricBatch()
+        for line in lines:
+            batch.add_json_line(line)
+        batch.flush()
+        t1 = time.perf_counter()
+        MetricSeries().extend_columns(batch.timestamps, batch.values)
+        t2 = time.perf_counter()
+        best = max(best, args.rows / (t2 - t0))
+        print(f"validate {args.rows / (t1 - t0):>10,.0f} rows/s   "
+              f"store {args.rows / (t2 - t1):>10,.0f} rows/s   "
+              f"total {args.rows / (t2 - t0):>10,.0f} rows/s")
+    print(f"best total: {best:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compare clinical term extraction strategies over large reports.
+
+"loop" is the original approach (lowercase the text and substring-search it
+once per term); "compiled" is services.clinical_terms, which scans the text
+once with a single trie-shaped regex. --extra-terms pads the vocabulary with
+synthetic entries to show how each approach scales with vocabulary size.
+
+Usage (from backend/):
+    python -m benchmarks.bench_terms --pages 50 --extra-terms 5000
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services.clinical_terms import ClinicalTermExtractor, load_vocabulary
+
+FILLER = ("patient reviewed in clinic today vitals stable labs drawn follow up in three months "
+          "continue current plan discussed diet and exercise with family present").split()
+
+
+def make_report(terms, pages: int, words_per_page: int = 500) -> str:
+    """Synthetic report text with a sprinkling of vocabulary terms"""
+    rng = random.Random(7)
+    words = []
+    for _ in range(pages * words_per_page):
+        words.append(rng.choice(terms) if rng.random() < 0.02 else rng.choice(FILLER))
+        if rng.random() < 0.07:
+            words[-1] += "."
+    return " ".join(words)
+
+
+def pad_vocabulary(vocabulary, extra: int):
+    """Add synthetic condition entries so the vocabulary has `extra` more terms"""
+    rng = random.Random(11)
+    conditions = dict(vocabulary["conditions"])
+    for i in range(extra):
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14)))
+        conditions[f"{name}-{i}"] = []
+    return {**vocabulary, "conditions": conditions}
+
+
+def loop_extract(text: str, lookup) -> set:
+    """The original per-keyword substring loop, over the full vocabulary"""
+    found = set()
+    for term, (canonical, _) in lookup.items():
+        if term in text.lower():
+            found.add(canonical)
+    return found
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--extra-terms", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    vocabulary = pad_vocabulary(load_vocabulary(), args.extra_terms)
+    t0 = time.perf_counter()
+    extractor = ClinicalTermExtractor(vocabulary)
+    compile_s = time.perf_counter() - t0
+
+    text = make_report(list(extractor.lookup), args.pages)
+    print(f"vocabulary {len(extractor):,} terms (compiled in {compile_s * 1000:.0f} ms), "
+          f"report {len(text) / 1e6:.2f} MB")
+
+    loop_s = best_of(lambda: loop_extract(text, extractor.lookup), max(1, args.repeat // 3))
+    compiled_s = best_of(lambda: extractor.find(text), args.repeat)
+    print(f"loop      {loop_s * 1000:>10.1f} ms")
+    print(f"compiled  {compiled_s * 1000:>10.1f} ms   ({len(extractor.find(text)):,} matches)")
+    print(f"speedup   {loop_s / compiled_s:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
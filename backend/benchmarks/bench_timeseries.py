@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Compare the columnar MetricSeries store with the old list-of-dicts layout.
+
+Usage (from backend/):
+    python -m benchmarks.bench_timeseries --rows 200000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app.services.timeseries import MetricSeries
+
+
+def make_readings(rows: int) -> list:
+    """Minute-resolution readings in the shape devices post"""
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "heart_rate": random.randint(55, 95),
+            "blood_pressure_systolic": random.randint(120, 160),
+            "blood_pressure_diastolic": random.randint(75, 100),
+            "blood_glucose": round(random.uniform(90, 180), 1),
+            "oxygen_saturation": round(random.uniform(93, 99), 1),
+            "body_temperature": round(random.uniform(36.3, 37.4), 1),
+            "steps": random.randint(0, 120),
+            "sleep_hours": 0.0,
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(rows)
+    ]
+
+
+def measure(build):
+    """Return (result, seconds, bytes allocated) for build()
+
+    Timing and memory are taken in separate runs since tracemalloc slows
+    allocation-heavy code down several times over.
+    """
+    gc.collect()
+    t0 = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    # Old layout: every dict owns its keys' slots, boxed numbers and an
+    # ISO timestamp string, so measure building the readings themselves
+    readings, _, dict_bytes = measure(lambda: make_readings(args.rows))
+
+    def build_dicts():
+        health_data = []
+        for reading in readings:
+            health_data.append(reading)
+        return health_data
+
+    dicts, dict_ingest, _ = measure(build_dicts)
+
+    def build_series():
+        series = MetricSeries()
+        series.extend(readings)
+        return series
+
+    series, series_ingest, series_bytes = measure(build_series)
+
+    t0 = time.perf_counter()
+    dict_mean = sum(m["heart_rate"] for m in dicts) / len(dicts)
+    dict_scan = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    column = series.column("heart_rate")
+    series_mean = sum(column) / len(column)
+    series_scan = time.perf_counter() - t0
+    assert round(dict_mean, 6) == round(series_mean, 6)
+
+    n = args.rows
+    print(f"rows: {n:,}")
+    print(f"{'layout':<16}{'bytes/row':>12}{'ingest rows/s':>16}{'mean(hr) rows/s':>18}")
+    print(f"{'list of dicts':<16}{dict_bytes / n:>12.0f}{n / dict_ingest:>16,.0f}{n / dict_scan:>18,.0f}")
+    print(f"{'MetricSeries':<16}{series_bytes / n:>12.0f}{n / series_ingest:>16,.0f}{n / series_scan:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
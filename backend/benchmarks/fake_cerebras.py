@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Cerebras chat completions API.
+
+Serves POST /v1/chat/completions, plain and streamed, in the shape the
+cerebras-cloud-sdk expects. Latency, jitter, reply length, per-token
+delay and error rates can all be configured, so the backend can be
+loaded without paying for (or waiting on) the real API. Point the
+backend at it with CEREBRAS_BASE_URL=http://127.0.0.1:<port> and any
+non-empty CEREBRAS_API_KEY. GET /stats returns request counters.
+
+Usage (from backend/):
+    python -m benchmarks.fake_cerebras --port 8100 --latency-ms 400 --jitter-ms 150 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+# The SDK's response models require this field
+SYSTEM_FINGERPRINT = "fp_fake_cerebras"
+
+REPLY_WORDS = (
+    "Your readings look stable overall. I recommend keeping a regular walking routine, "
+    "staying hydrated and taking your medications at the same time each day. "
+    "If your blood pressure stays above 150/100, please contact your physician."
+).split()
+
+
+def add_arguments(parser, prefix: str = "") -> None:
+    """Add the behaviour options; benchmarks.load_test adds them with an "llm-" prefix"""
+    parser.add_argument(f"--{prefix}latency-ms", type=float, default=400, help="mean time to first token")
+    parser.add_argument(f"--{prefix}jitter-ms", type=float, default=150, help="std deviation of the latency")
+    parser.add_argument(f"--{prefix}tokens", type=int, default=60, help="tokens per reply")
+    parser.add_argument(f"--{prefix}token-ms", type=float, default=5, help="delay between tokens")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument(f"--{prefix}rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+
+
+def reply_text(tokens: int) -> list:
+    """Reply split into `tokens` chunks"""
+    return [REPLY_WORDS[i % len(REPLY_WORDS)] + " " for i in range(tokens)]
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Fake Cerebras")
+    stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0}
+
+    def completion_id() -> str:
+        return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+    @app.get("/v1/tcp_warming")
+    async def tcp_warming():
+        return PlainTextResponse("ok")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        stats["prompt_tokens"] += prompt_tokens
+        latency = max(0.0, random.gauss(args.latency_ms, args.jitter_ms)) / 1000
+
+        roll = random.random()
+        if roll < args.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(latency / 2)
+            return JSONResponse({"error": {"message": "simulated upstream error", "type": "server_error"}}, status_code=500)
+        if roll < args.error_rate + args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "simulated rate limit", "type": "rate_limit_error"}}, status_code=429)
+
+        words = reply_text(args.tokens)
+        model = body.get("model", "llama-3.1-8b")
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        created = int(time.time())
+
+        if body.get("stream"):
+            stats["streamed"] += 1
+            cid = completion_id()
+
+            def chunk(delta, finish_reason=None, **extra):
+                return "data: " + json.dumps({
+                    "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "system_fingerprint": SYSTEM_FINGERPRINT,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra,
+                }) + "\n\n"
+
+            async def events():
+                await asyncio.sleep(latency)
+                for i, word in enumerate(words):
+                    if i:
+                        await asyncio.sleep(args.token_ms / 1000)
+                    yield chunk({"role": "assistant", "content": word})
+                yield chunk({}, "stop", usage=usage)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency + len(words) * args.token_ms / 1000)
+        return {
+            "id": completion_id(),
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "system_fingerprint": SYSTEM_FINGERPRINT,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words).strip()},
+                         "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=None)
+    add_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic health readings for load testing.
+
+N users x M samples of correlated vitals (see app.services.synthetic_data)
+at a fixed resolution, written in bulk:
+  --format npz     one .npz with every user's columns (fastest)
+  --format ndjson  one <user_id>.ndjson per user, ready for
+                   POST /api/health/metrics/{user_id}/batch
+  --format store   straight into data_service's storage backend (set
+                   STORAGE_BACKEND=sqlite to keep it), with a profile per user
+
+Usage (from backend/):
+    python -m benchmarks.gen_synthetic --users 1000 --days 7 --format npz --out data/synthetic.npz
+    STORAGE_BACKEND=sqlite python -m benchmarks.gen_synthetic --users 200 --days 30 --format store
+"""
+import argparse
+import asyncio
+import time
+from dotenv import load_dotenv
+
+from app.services.synthetic_data import generate_population, write_ndjson, write_npz
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--resolution", type=int, default=60, help="seconds between readings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="synthetic_", help="user_id prefix")
+    parser.add_argument("--format", choices=("npz", "ndjson", "store"), default="npz")
+    parser.add_argument("--out", default="data/synthetic.npz", help="file (npz) or directory (ndjson)")
+    args = parser.parse_args()
+
+    samples = int(args.days * 86400 / args.resolution)
+    population = generate_population(args.users, samples, resolution_seconds=args.resolution,
+                                     seed=args.seed, user_prefix=args.prefix)
+    t0 = time.perf_counter()
+    if args.format == "npz":
+        rows = write_npz(args.out, population)
+    elif args.format == "ndjson":
+        rows = write_ndjson(args.out, population)
+    else:
+        # Service settings (STORAGE_BACKEND etc.) come from .env like the API's
+        load_dotenv()
+        from app.services.data_service import save_user_profile, close_storage
+        from app.services.mock_data import generate_elderly_user_profile
+        from app.services.synthetic_data import load_into_store
+
+        async def save_profiles():
+            for i in range(args.users):
+                user_id = f"{args.prefix}{i:06d}"
+                await save_user_profile(user_id, generate_elderly_user_profile(user_id))
+
+        asyncio.run(save_profiles())
+        rows = load_into_store(population)
+        close_storage()
+    seconds = time.perf_counter() - t0
+    print(f"{rows:,} rows for {args.users:,} users in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the API against a local Cerebras stand-in.
+
+Starts benchmarks.fake_cerebras and the FastAPI app (uvicorn) as
+subprocesses and seeds --users users with synthetic readings and a
+guardian each. It then runs --concurrency virtual users for --duration
+seconds. Each virtual user repeatedly picks a request from a weighted mix
+of metrics reads, chart reads, summaries, alerts, chats (plain and streamed), document
+uploads and guardian views.
+
+Per route it reports requests, errors, throughput and p50/p95/p99
+latency. Streamed chats also report time to first token. --out writes
+the report as JSON. --baseline compares a run against an earlier report
+and exits with status 1 when a route's p95 or error rate regressed.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --users 50 --concurrency 32 --duration 60 --out load.json
+    python -m benchmarks.load_test --llm-latency-ms 800 --llm-error-rate 0.05 --baseline load.json
+    python -m benchmarks.load_test --base-url http://localhost:8000   # against a running server
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.services.synthetic_data import generate_population, ndjson_lines
+from benchmarks import fake_cerebras
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default share of each operation in the request mix
+DEFAULT_MIX = {
+    "metrics": 25,
+    "chart": 10,
+    "summary": 20,
+    "alerts": 10,
+    "documents": 5,
+    "guardian_view": 15,
+    "chat": 10,
+    "chat_stream": 5,
+    "upload": 5,
+    "ingest": 5,
+}
+
+CHAT_MESSAGES = [
+    "Why is my blood pressure higher in the morning?",
+    "Is my glucose level normal after lunch?",
+    "How much should I walk each day?",
+    "I slept badly last night, should I be worried?",
+    "Can I take aspirin with my other medications?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))]
+
+
+class Recorder:
+    """Latencies and status codes per route label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, seconds: float, status, ok: bool) -> None:
+        self.latencies[route].append(seconds * 1000)
+        self.statuses[route][str(status)] += 1
+        if not ok:
+            self.errors[route] += 1
+
+    def report(self, duration: float) -> Dict[str, Dict]:
+        routes = {}
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "error_rate": round(self.errors[route] / len(values), 4),
+                "rps": round(len(values) / duration, 2),
+                "mean_ms": round(sum(values) / len(values), 2),
+                "p50_ms": round(percentile(values, 0.50), 2),
+                "p95_ms": round(percentile(values, 0.95), 2),
+                "p99_ms": round(percentile(values, 0.99), 2),
+                "max_ms": round(values[-1], 2),
+                "status": dict(self.statuses[route]),
+            }
+        return routes
+
+
+async def timed(recorder: Recorder, route: str, request) -> Optional[httpx.Response]:
+    """Await one request and record its latency; 4xx/5xx and exceptions count as errors"""
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError as e:
+        recorder.record(route, time.perf_counter() - started, type(e).__name__, False)
+        return None
+    recorder.record(route, time.perf_counter() - started, response.status_code, response.status_code < 400)
+    return response
+
+
+# --- operations: each sends one request for a random user ---
+
+async def op_metrics(client, user_id, recorder, rng):
+    await timed(recorder, "GET /api/health/metrics/{user_id}",
+                client.get(f"/api/health/metrics/{user_id}", params={"days": rng.choice((1, 7, 30))}))
+
+
+async def op_chart(client, user_id, recorder, rng):
+    await timed(recorder, "GET /api/health/metrics/{user_id} (chart)",
+                client.get(f"/api/health/metrics/{user_id}",
+                           params={"days": rng.choice((7, 30, 90)), "max_points": 600}))
+
+
+async def op_summary(client, user_id, recorder, rng):
+    await timed(recorder, "GET /api/health/summary/{user_id}", client.get(f"/api/health/summary/{user_id}"))
+
+
+async def op_alerts(client, user_id, recorder, rng):
+    await timed(recorder, "GET /api/health/alerts/{user_id}", client.get(f"/api/health/alerts/{user_id}"))
+
+
+async def op_documents(client, user_id, recorder, rng):
+    await timed(recorder, "GET /api/documents/list/{user_id}", client.get(f"/api/documents/list/{user_id}"))
+
+
+async def op_guardian_view(client, user_id, recorder, rng):
+    await timed(recorder, "GET /api/guardians/view/{user_id}/{guardian_id}",
+                client.get(f"/api/guardians/view/{user_id}/guardian_{user_id}",
+                           params={"view_type": rng.choice(("summary", "alerts", "detailed"))}))
+
+
+async def op_chat(client, user_id, recorder, rng):
+    await timed(recorder, "POST /api/chat/send",
+                client.post("/api/chat/send", params={"user_id": user_id, "message": rng.choice(CHAT_MESSAGES)}))
+
+
+async def op_chat_stream(client, user_id, recorder, rng):
+    route = "POST /api/chat/send?stream=true"
+    params = {"user_id": user_id, "message": rng.choice(CHAT_MESSAGES), "stream": "true", "session_id": "load"}
+    started = time.perf_counter()
+    first_token = None
+    try:
+        async with client.stream("POST", "/api/chat/send", params=params) as response:
+            async for line in response.aiter_lines():
+                if first_token is None and line.startswith("event: token"):
+                    first_token = time.perf_counter() - started
+            status = response.status_code
+    except httpx.HTTPError as e:
+        recorder.record(route, time.perf_counter() - started, type(e).__name__, False)
+        return
+    recorder.record(route, time.perf_counter() - started, status, status < 400)
+    if first_token is not None:
+        recorder.record(f"{route} (first token)", first_token, status, True)
+
+
+async def op_upload(client, user_id, recorder, rng):
+    # Unique content so every upload is analysed rather than deduplicated
+    report = (f"Lab report for {user_id} #{rng.getrandbits(64):x}\n"
+              f"Fasting glucose {rng.randint(90, 180)} mg/dL. Blood pressure {rng.randint(120, 170)}/{rng.randint(70, 100)} mmHg.\n"
+              "Diagnosis: hypertension, type 2 diabetes. Medications: metformin, lisinopril.\n")
+    await timed(recorder, "POST /api/documents/upload/{user_id}",
+                client.post(f"/api/documents/upload/{user_id}",
+                            files={"file": ("lab_report.txt", report.encode(), "text/plain")}))
+
+
+async def op_ingest(client, user_id, recorder, rng):
+    metric = {"heart_rate": rng.randint(55, 110), "blood_pressure_systolic": rng.randint(115, 165),
+              "blood_pressure_diastolic": rng.randint(70, 100), "blood_glucose": rng.randint(80, 200),
+              "oxygen_saturation": rng.randint(92, 99), "body_temperature": 36.7,
+              "steps": rng.randint(0, 200), "sleep_hours": 7.0}
+    await timed(recorder, "POST /api/health/metrics/{user_id}", client.post(f"/api/health/metrics/{user_id}", json=metric))
+
+
+OPERATIONS = {
+    "metrics": op_metrics,
+    "chart": op_chart,
+    "summary": op_summary,
+    "alerts": op_alerts,
+    "documents": op_documents,
+    "guardian_view": op_guardian_view,
+    "chat": op_chat,
+    "chat_stream": op_chat_stream,
+    "upload": op_upload,
+    "ingest": op_ingest,
+}
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    """Parse "metrics=30,chat=10,..." into weights (unlisted operations keep their defaults)"""
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (text or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown operation in --mix: {name} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+async def seed_users(client: httpx.AsyncClient, user_ids: List[str], days: float, seed: int) -> None:
+    """Give each user a week of 5-minute synthetic readings and one guardian"""
+    samples = int(days * 86400 / 300)
+    population = generate_population(len(user_ids), samples, resolution_seconds=300, seed=seed)
+    for user_id, (_, timestamps, columns) in zip(user_ids, population):
+        response = await client.post(f"/api/health/metrics/{user_id}/batch", content=ndjson_lines(timestamps, columns),
+                                     headers={"Content-Type": "application/x-ndjson"})
+        response.raise_for_status()
+        response = await client.post(f"/api/guardians/add/{user_id}", params={
+            "guardian_name": "Load Test Guardian", "relationship": "daughter",
+            "access_level": "view_all", "guardian_id": f"guardian_{user_id}"})
+        response.raise_for_status()
+
+
+async def virtual_user(client, user_ids, names, weights, deadline, recorder, rng):
+    while time.monotonic() < deadline:
+        operation = OPERATIONS[rng.choices(names, weights)[0]]
+        await operation(client, rng.choice(user_ids), recorder, rng)
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+
+def start_servers(args, workdir: str):
+    """Start the fake Cerebras server and the API, returning (processes, api base url, llm url)"""
+    llm_port, api_port = free_port(), free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    fake = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_cerebras", "--port", str(llm_port), "--seed", str(args.seed),
+        "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+        "--tokens", str(args.llm_tokens), "--token-ms", str(args.llm_token_ms),
+        "--error-rate", str(args.llm_error_rate), "--rate-limit-rate", str(args.llm_rate_limit_rate),
+    ], cwd=BACKEND_DIR)
+    env = {
+        **os.environ,
+        "CEREBRAS_API_KEY": "load-test",
+        "CEREBRAS_BASE_URL": llm_url,
+        "STORAGE_BACKEND": args.storage,
+        "SQLITE_PATH": os.path.join(workdir, "load.db"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "INSIGHTS_SCHEDULE_HOUR": "",
+    }
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+        "--log-level", "warning",
+    ], cwd=BACKEND_DIR, env=env)
+    return [fake, api], f"http://127.0.0.1:{api_port}", llm_url
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Routes whose p95 latency or error rate got worse than the baseline allows"""
+    problems = []
+    for route, now in report["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        # Ignore sub-5ms jitter on very fast routes
+        if now["p95_ms"] > before["p95_ms"] * (1 + max_regression) and now["p95_ms"] - before["p95_ms"] > 5:
+            problems.append(f"{route}: p95 {before['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms")
+        if now["error_rate"] > before["error_rate"] + 0.01:
+            problems.append(f"{route}: error rate {before['error_rate']:.2%} -> {now['error_rate']:.2%}")
+    return problems
+
+
+def print_table(report: Dict) -> None:
+    print(f"{'route':<52} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, r in report["routes"].items():
+        print(f"{route:<52} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+    total = report["total"]
+    print(f"total: {total['requests']} requests, {total['errors']} errors, {total['rps']:.1f} req/s over {report['duration_s']}s")
+
+
+async def run(args) -> Dict:
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    user_ids = [f"load_{i:05d}" for i in range(args.users)]
+
+    processes, llm_url = [], None
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    base_url = args.base_url
+    try:
+        if not base_url:
+            processes, base_url, llm_url = start_servers(args, workdir)
+            await wait_ready(f"{llm_url}/v1/tcp_warming")
+        await wait_ready(f"{base_url}/health")
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            await seed_users(client, user_ids, args.seed_days, args.seed)
+            recorder = Recorder()
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                virtual_user(client, user_ids, names, weights, deadline, recorder, random.Random(args.seed + i))
+                for i in range(args.concurrency)
+            ))
+            duration = time.monotonic() - started
+            server_stats = (await client.get("/api/chat/stats")).json()
+
+        llm_stats = None
+        if llm_url:
+            async with httpx.AsyncClient() as client:
+                llm_stats = (await client.get(f"{llm_url}/stats")).json()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    routes = recorder.report(duration)
+    primary = {route: r for route, r in routes.items() if not route.endswith("(first token)")}
+    requests = sum(r["requests"] for r in primary.values())
+    errors = sum(r["errors"] for r in primary.values())
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+        "mix": mix,
+        "duration_s": round(duration, 2),
+        "total": {"requests": requests, "errors": errors, "rps": round(requests / duration, 2)},
+        "routes": routes,
+        "server": server_stats,
+        "llm": llm_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users sending requests")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load after seeding")
+    parser.add_argument("--mix", help="operation weights, e.g. metrics=30,chat=5,upload=0 "
+                                      f"(operations: {', '.join(OPERATIONS)})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-days", type=float, default=7, help="days of 5-minute readings per user")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request")
+    parser.add_argument("--base-url", help="test a running server instead of starting one (no fake LLM)")
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 growth vs baseline")
+    fake_cerebras.add_arguments(parser.add_argument_group("fake Cerebras server"), prefix="llm-")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_table(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+# Isolate tests from local .env settings before the app is imported
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="health_documents_")
+os.environ["SERVER_LOCK_PATH"] = os.path.join(tempfile.mkdtemp(prefix="health_lock_"), "server.lock")
+os.environ["INSIGHTS_SCHEDULE_HOUR"] = ""
+os.environ["CEREBRAS_API_KEY"] = ""
+
+import httpx
+import pytest
+from app.main import app
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    """Client for the app inside its lifespan, so document workers share the test's event loop"""
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
@@ -0,0 +1,64 @@
+from app.services.aggregates import US_PER_DAY, RollingAggregates
+
+VITALS = ("heart_rate", "blood_glucose")
+
+
+def _at(day, hour=8):
+    return day * US_PER_DAY + hour * 3_600_000_000
+
+
+def test_windows_cover_the_last_7_30_and_90_days():
+    aggregates = RollingAggregates(VITALS)
+    for day in range(100):
+        aggregates.add(_at(day), (day, None))
+
+    summary = aggregates.summary()
+
+    assert summary["7d"]["heart_rate"] == {"mean": 96.0, "min": 93, "max": 99, "count": 7}
+    assert summary["30d"]["heart_rate"] == {"mean": 84.5, "min": 70, "max": 99, "count": 30}
+    assert summary["90d"]["heart_rate"] == {"mean": 54.5, "min": 10, "max": 99, "count": 90}
+    assert summary["90d"]["blood_glucose"] == {"mean": None, "min": None, "max": None, "count": 0}
+
+
+def test_readings_on_one_day_share_a_bucket():
+    aggregates = RollingAggregates(VITALS)
+    aggregates.add(_at(5, hour=1), (60, 110))
+    aggregates.add(_at(5, hour=20), (80, None))
+
+    assert aggregates.window(7)["heart_rate"] == {"mean": 70.0, "min": 60, "max": 80, "count": 2}
+    assert aggregates.window(7)["blood_glucose"]["count"] == 1
+
+
+def test_a_new_day_rolls_the_windows_forward_and_expires_old_days():
+    aggregates = RollingAggregates(VITALS)
+    aggregates.add(_at(0), (60, None))
+    aggregates.add(_at(7), (70, None))
+    # Days 1-7: day 0 has left the 7-day window but is still in the 30-day one
+    assert aggregates.window(7)["heart_rate"]["count"] == 1
+    assert aggregates.window(30)["heart_rate"]["count"] == 2
+
+    aggregates.add(_at(90), (90, None))
+    assert aggregates.window(90)["heart_rate"]["count"] == 2
+    assert aggregates.window(7)["heart_rate"]["max"] == 90
+
+    # Day 0 is outside every window now, so a late reading for it is dropped
+    aggregates.add(_at(0, hour=12), (200, None))
+    assert aggregates.window(90)["heart_rate"]["max"] == 90
+    assert aggregates.window(90)["heart_rate"]["count"] == 2
+
+
+def test_add_many_matches_adding_each_reading():
+    # Sorted readings every 5 hours across 120 days, glucose missing from some
+    timestamps = [_at(0) + i * 5 * 3_600_000_000 for i in range(600)]
+    heart_rate = [60 + i % 37 for i in range(600)]
+    glucose = [None if i % 3 else 90.0 + i % 50 for i in range(600)]
+
+    one_by_one = RollingAggregates(VITALS)
+    for timestamp, values in zip(timestamps, zip(heart_rate, glucose)):
+        one_by_one.add(timestamp, values)
+    batched = RollingAggregates(VITALS)
+    batched.add_many(timestamps[:250], [heart_rate[:250], glucose[:250]])
+    batched.add_many(timestamps[250:], [heart_rate[250:], glucose[250:]])
+
+    assert batched.summary() == one_by_one.summary()
+    assert batched.latest_day == one_by_one.latest_day
@@ -0,0 +1,98 @@
+import random
+import pytest
+from app.routes.guardians import stream_guardian_alerts
+from app.services import data_service
+from app.services.alert_bus import alert_bus
+from app.services.alerts import AlertEngine, alert_engine
+from app.services.storage import SQLiteBackend
+from app.services.timeseries import METRIC_COLUMNS
+
+MINUTE_US = 60_000_000
+START_US = 1_704_096_000_000_000  # 2024-01-01T08:00:00
+
+
+def _readings(count, missing=0.0, seed=7):
+    rng = random.Random(seed)
+    # A long, noisy breach of most thresholds, so cooldowns decide what fires
+    ranges = {
+        "heart_rate": (45, 130), "blood_pressure_systolic": (100, 190), "blood_pressure_diastolic": (60, 120),
+        "blood_glucose": (50, 320), "oxygen_saturation": (85.0, 99.0), "body_temperature": (35.0, 39.5),
+        "steps": (0, 400), "sleep_hours": (0.0, 9.0),
+    }
+    timestamps = [START_US + i * MINUTE_US for i in range(count)]
+    columns = {}
+    for name, (low, high) in ranges.items():
+        draw = rng.randint if isinstance(low, int) else rng.uniform
+        columns[name] = [None if rng.random() < missing else draw(low, high) for _ in range(count)]
+    return timestamps, columns
+
+
+def _fired(alerts):
+    return [(a["type"], a["vital"], a["timestamp"], a["value"]) for a in alerts]
+
+
+def _one_by_one(timestamps, columns):
+    engine = AlertEngine()
+    alerts = []
+    for i, timestamp in enumerate(timestamps):
+        alerts += engine.evaluate("user", timestamp, [columns[name][i] for name in METRIC_COLUMNS])
+    return _fired(alerts)
+
+
+def test_batch_cooldowns_match_per_reading_evaluation():
+    for missing in (0.0, 0.3):
+        timestamps, columns = _readings(3 * 24 * 60, missing)
+        expected = _one_by_one(timestamps, columns)
+
+        batch = AlertEngine().evaluate_batch("user", timestamps, columns)
+        assert sorted(_fired(batch)) == sorted(expected)
+
+        # Split across calls, the cooldown carries over from the first half
+        engine = AlertEngine()
+        half = len(timestamps) // 2
+        split = engine.evaluate_batch("user", timestamps[:half], {k: v[:half] for k, v in columns.items()})
+        split += engine.evaluate_batch("user", timestamps[half:], {k: v[half:] for k, v in columns.items()})
+        assert sorted(_fired(split)) == sorted(expected)
+
+
+def test_alert_state_is_evicted_with_resident_series(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "health.db"))
+    monkeypatch.setattr(data_service, "storage", backend)
+    monkeypatch.setattr(data_service, "MAX_RESIDENT_USERS", 2)
+    monkeypatch.setattr(data_service, "HEALTH_DATA", type(data_service.HEALTH_DATA)())
+    users = [f"evict_{i}" for i in range(4)]
+    try:
+        for user_id in users:
+            alerts = data_service.add_health_data(user_id, {"timestamp": "2024-01-01T08:00:00",
+                                                            "blood_glucose": 250})
+            assert [a["type"] for a in alerts] == ["abnormal_glucose"]
+        backend.flush()
+
+        assert list(data_service.HEALTH_DATA) == users[2:]
+        assert not any(alert_engine.has_state(user_id) for user_id in users[:2])
+
+        # Coming back reloads the series and rebuilds its alerts
+        recent = data_service.get_user_alerts(users[0])
+        assert [a["type"] for a in recent] == ["abnormal_glucose"]
+        assert not alert_engine.has_state(users[2])
+    finally:
+        for user_id in users:
+            alert_engine.forget(user_id)
+        backend.close()
+
+
+@pytest.mark.anyio
+async def test_alert_stream_subscribes_only_once_it_starts():
+    await data_service.add_guardian("stream_ward", {"guardian_id": "stream_g", "name": "Sam", "access_level": "alerts_only"})
+    before = alert_bus.subscriber_count()
+
+    # A client that disconnects before the body starts never subscribes
+    response = await stream_guardian_alerts("stream_g", ["stream_ward"])
+    assert alert_bus.subscriber_count() == before
+    await response.body_iterator.aclose()
+
+    response = await stream_guardian_alerts("stream_g", ["stream_ward"])
+    assert (await response.body_iterator.__anext__()).startswith("event: subscribed")
+    assert alert_bus.subscriber_count() == before + 1
+    await response.body_iterator.aclose()
+    assert alert_bus.subscriber_count() == before
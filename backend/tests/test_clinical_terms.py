@@ -0,0 +1,44 @@
+import pytest
+from app.services.clinical_terms import get_extractor, extract_clinical_terms
+
+
+@pytest.mark.parametrize("text", [
+    "Kidney function normal, eGFR 78.",
+    "Liver panel within normal limits.",
+    "Thyroid ultrasound scheduled.",
+    "Received flu shot in October.",
+    "Calcium 9.4 mg/dL, iron 80 ug/dL, vitamin D 32 ng/mL, vitamin B12 450 pg/mL.",
+    "Patient falls asleep easily.",
+])
+def test_lab_and_organ_mentions_are_not_conditions(text):
+    assert extract_clinical_terms(text)["conditions"] == []
+
+
+def test_qualified_phrases_still_match():
+    found = extract_clinical_terms(
+        "History of falls. Chronic liver disease and kidney failure. Influenza A in March. "
+        "Takes calcium carbonate and ferrous sulfate."
+    )
+    assert found["conditions"] == ["Fall Risk", "Liver Disease", "Kidney Disease", "Influenza"]
+    assert found["medications"] == ["Calcium Supplement", "Iron Supplement"]
+
+
+def test_salt_forms_and_brands_map_to_generic():
+    found = extract_clinical_terms("Metoprolol succinate 50 mg, amlodipine besylate 5 mg, Hyzaar, Eliquis.")
+    assert found["medications"] == ["Metoprolol", "Amlodipine", "Losartan/Hydrochlorothiazide", "Apixaban"]
+
+
+def test_vocabulary_size():
+    assert len(get_extractor()) >= 4000
+
+
+@pytest.mark.parametrize("text, conditions", [
+    ("Denies chest pain, reports type 2 diabetes.", ["Diabetes"]),
+    ("No hypertension and has type 2 diabetes.", ["Diabetes"]),
+    ("Negative for pneumonia, diagnosed with hypertension.", ["Hypertension"]),
+    ("No history of diabetes or hypertension.", []),
+    ("Patient does not have diabetes.", []),
+    ("Has not been diagnosed with hypertension.", []),
+])
+def test_negation_scope_ends_at_a_clause_boundary(text, conditions):
+    assert extract_clinical_terms(text)["conditions"] == conditions
@@ -0,0 +1,80 @@
+import pytest
+from app.services import llm_service
+from app.services.conversations import ChatSession, ChatSessionStore, chat_sessions, estimate_tokens
+
+
+def _turn(n):
+    # 40 characters each way: 20 tokens per turn
+    return f"Question {n:02d} about my pressure. Thanks", f"Answer {n:02d} is to rest today. More text."
+
+
+def test_oldest_turns_are_compacted_to_stay_under_the_token_budget():
+    session = ChatSession(max_turns=10, token_budget=50, summary_budget=100)
+    for n in range(5):
+        session.add_turn(*_turn(n))
+
+    assert session.turn_tokens <= 50
+    assert [user for user, _, _ in session.turns] == [_turn(3)[0], _turn(4)[0]]
+    assert session.stats() == {"turns": 5, "turns_in_buffer": 2, "compacted_turns": 3,
+                               "history_tokens": session.turn_tokens + session.summary_tokens}
+
+    history = session.history()
+    assert history[0]["role"] == "system"
+    # Only the first sentence of each compacted message is kept
+    assert "- Patient asked: Question 00 about my pressure. Doc replied: Answer 00 is to rest today." in history[0]["content"]
+    assert "Thanks" not in history[0]["content"]
+    assert [m["role"] for m in history[1:]] == ["user", "assistant"] * 2
+
+
+def test_a_full_ring_buffer_compacts_even_under_budget():
+    session = ChatSession(max_turns=2, token_budget=1000)
+    for n in range(3):
+        session.add_turn(*_turn(n))
+    assert len(session.turns) == 2
+    assert session.compacted_turns == 1
+
+
+def test_latest_turn_is_kept_verbatim_when_over_budget():
+    session = ChatSession(token_budget=10)
+    session.add_turn(*_turn(0))
+    long_reply = "Walk daily. " * 20
+    session.add_turn("What else?", long_reply)
+    assert list(session.turns) == [("What else?", long_reply, estimate_tokens("What else?") + estimate_tokens(long_reply))]
+    assert session.history()[-1] == {"role": "assistant", "content": long_reply}
+
+
+def test_summary_carries_over_within_its_own_budget():
+    session = ChatSession(max_turns=10, token_budget=20, summary_budget=60)
+    for n in range(6):
+        session.add_turn(*_turn(n))
+
+    # Five turns were compacted but only the newest summary lines fit
+    assert session.compacted_turns == 5
+    assert session.summary_tokens <= 60
+    summary = session.history()[0]["content"]
+    assert "Question 04" in summary
+    assert "Question 00" not in summary
+
+
+def test_store_keeps_the_session_between_requests():
+    store = ChatSessionStore(max_sessions=2)
+    store.get("conv_user").add_turn(*_turn(0))
+    assert store.get("conv_user").total_turns == 1
+    assert store.get("conv_user", "other").total_turns == 0
+
+    store.get("conv_user")
+    store.get("conv_third")
+    # Least recently used session is dropped beyond max_sessions
+    assert store.peek("conv_user") is not None
+    assert store.peek("conv_user", "other") is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("stream", [False, True])
+async def test_no_api_key_placeholder_is_not_remembered(client, monkeypatch, stream):
+    monkeypatch.setattr(llm_service, "client", None)
+    response = await client.post("/api/chat/send", params={
+        "user_id": "conv_no_key", "message": "How is my pressure?", "stream": stream, "session_id": str(stream)})
+    assert llm_service.NO_API_KEY_REPLY in response.text
+    session = chat_sessions.peek("conv_no_key", str(stream))
+    assert session is None or session.total_turns == 0
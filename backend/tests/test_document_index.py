@@ -0,0 +1,65 @@
+import pytest
+from datetime import datetime
+from app.services.document_index import DocumentIndex, upload_time_us
+from app.services.timeseries import to_epoch_us
+
+
+def _document(number, document_type):
+    return {
+        "document_id": f"doc_{number}",
+        "document_type": document_type,
+        "uploaded_at": f"2024-03-{number:02d}T09:00:00",
+    }
+
+
+@pytest.fixture
+def index():
+    types = ["lab_report", "prescription", "lab_report", "lab_report", "prescription", "lab_report"]
+    return DocumentIndex(_document(day, document_type) for day, document_type in enumerate(types, start=1))
+
+
+def _ids(documents):
+    return [document["document_id"] for document in documents]
+
+
+def test_cursor_pages_walk_newest_first_without_repeats(index):
+    documents, total, cursor = index.page(limit=4)
+    assert _ids(documents) == ["doc_6", "doc_5", "doc_4", "doc_3"]
+    assert total == 6
+
+    documents, total, cursor = index.page(limit=4, cursor=cursor)
+    assert _ids(documents) == ["doc_2", "doc_1"]
+    assert total == 6
+    assert cursor is None
+
+
+def test_type_and_time_filters_narrow_the_page(index):
+    documents, total, cursor = index.page(document_type="lab_report", limit=2)
+    assert _ids(documents) == ["doc_6", "doc_4"]
+    assert total == 4
+
+    documents, _, cursor = index.page(document_type="lab_report", limit=2, cursor=cursor)
+    assert _ids(documents) == ["doc_3", "doc_1"]
+    assert cursor is None
+
+    start = to_epoch_us(datetime(2024, 3, 2))
+    end = to_epoch_us(datetime(2024, 3, 4, 23))
+    documents, total, _ = index.page(start_us=start, end_us=end)
+    assert _ids(documents) == ["doc_4", "doc_3", "doc_2"]
+    assert total == 3
+
+    assert index.page(document_type="discharge_summary") == ([], 0, None)
+
+
+def test_replacing_a_record_reindexes_it(index):
+    index.put(dict(_document(1, "prescription"), status="complete"))
+
+    assert len(index) == 6
+    documents, total, _ = index.page(document_type="prescription")
+    assert _ids(documents) == ["doc_5", "doc_2", "doc_1"]
+    assert index.page(document_type="lab_report")[1] == 3
+
+
+def test_records_without_an_upload_time_sort_first():
+    assert upload_time_us({}) == 0
+    assert upload_time_us({"uploaded_at": "not a date"}) == 0
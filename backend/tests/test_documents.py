@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+from concurrent.futures.process import BrokenProcessPool
+import anyio
+import httpx
+import pytest
+from app.main import app
+from app.services.data_service import get_document_by_hash, get_user_document, save_document
+from app.routes import documents
+from app.services import document_analysis, text_extraction
+from app.services.document_analysis import analyze_document, document_jobs
+
+pytestmark = pytest.mark.anyio
+
+
+async def _upload(client, user_id, content, name="lab_results.txt"):
+    return await client.post(f"/api/documents/upload/{user_id}", files={"file": (name, content, "text/plain")})
+
+
+async def _wait_for_job(client, job_id, timeout=5.0):
+    with anyio.fail_after(timeout):
+        while True:
+            job = (await client.get(f"/api/documents/jobs/{job_id}")).json()
+            if job["status"] in ("complete", "failed"):
+                return job
+            await asyncio.sleep(0.01)
+
+
+def _pending_document(user_id, content, job_id):
+    return {
+        "document_id": f"doc_{user_id}",
+        "user_id": user_id,
+        "document_type": "lab",
+        "file_name": "lab_results.txt",
+        "uploaded_at": "2024-01-01T00:00:00",
+        "file_path": None,
+        "content_sha256": hashlib.sha256(content).hexdigest(),
+        "size_bytes": len(content),
+        "status": "pending",
+        "job_id": job_id,
+        "analysis": {"status": "pending", "extracted_conditions": [], "key_findings": []},
+    }
+
+
+async def test_upload_runs_job_and_duplicate_reuses_analysis(client):
+    content = b"Glucose 182 mg/dL. History of hypertension."
+    first = await _upload(client, "docs_user", content)
+    assert first.status_code == 202
+    body = first.json()
+    assert body["deduplicated"] is False
+
+    job = await _wait_for_job(client, body["job_id"])
+    assert job["status"] == "complete"
+    assert job["analysis"]["status"] == "analyzed"
+
+    again = await _upload(client, "docs_user", content, name="copy.txt")
+    assert again.status_code == 200
+    assert again.json()["deduplicated"] is True
+    assert again.json()["document_id"] == body["document_id"]
+
+    assert (await client.get("/api/documents/jobs/job_missing")).status_code == 404
+
+
+async def test_duplicate_of_orphaned_pending_document_gets_new_job(client):
+    content = b"Pending before a restart"
+    await save_document("orphan_user", _pending_document("orphan_user", content, "job_lost_in_restart"))
+
+    response = await _upload(client, "orphan_user", content)
+    assert response.status_code == 202
+    body = response.json()
+    assert body["deduplicated"] is True
+    assert body["job_id"] != "job_lost_in_restart"
+    assert (await _wait_for_job(client, body["job_id"]))["status"] == "complete"
+    assert get_user_document("orphan_user", body["document_id"])["status"] == "complete"
+
+
+async def test_startup_requeues_pending_documents():
+    await save_document("restart_user", _pending_document("restart_user", b"queued", "job_from_old_process"))
+    # What a fresh process does with this document left in storage
+    async with app.router.lifespan_context(app):
+        job_id = get_user_document("restart_user", "doc_restart_user")["job_id"]
+        assert job_id != "job_from_old_process"
+        assert document_jobs.get(job_id) is not None
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert (await _wait_for_job(client, job_id))["status"] == "complete"
+
+
+async def test_unreadable_file_is_analyzed_by_type_with_the_extraction_error(tmp_path):
+    path = tmp_path / "lab_results.pdf"
+    path.write_bytes(b"%PDF-1.4 not really a pdf")
+    try:
+        analysis = await analyze_document("broken_pdf_user", "lab_results.pdf", str(path))
+    finally:
+        text_extraction.shutdown_pool()
+    assert analysis["status"] == "analyzed"
+    assert analysis["pages_extracted"] == 0
+    assert analysis["extraction_error"].startswith("PdfStreamError")
+
+
+async def test_extraction_infrastructure_errors_fail_the_analysis(tmp_path, monkeypatch):
+    async def broken_pool(file_path, file_name):
+        raise BrokenProcessPool("a worker died")
+
+    monkeypatch.setattr(document_analysis, "extract_document_text", broken_pool)
+    with pytest.raises(BrokenProcessPool):
+        await analyze_document("broken_pool_user", "lab_results.txt", str(tmp_path / "lab_results.txt"))
+
+
+async def test_empty_upload_is_a_bad_request(client):
+    response = await _upload(client, "empty_upload_user", b"")
+    assert response.status_code == 400
+    assert "empty" in response.json()["detail"]
+
+
+async def test_storage_failure_during_upload_is_a_server_error(client, monkeypatch):
+    async def disk_full(file):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(documents, "store_upload", disk_full)
+    response = await _upload(client, "disk_full_user", b"lab results")
+    assert response.status_code == 500
+    assert get_document_by_hash("disk_full_user", hashlib.sha256(b"lab results").hexdigest()) is None
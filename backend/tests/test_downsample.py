@@ -0,0 +1,53 @@
+from datetime import datetime
+import pytest
+from app.services.data_service import get_user_series
+from app.services.downsample import US_PER_HOUR, bucket_readings, bucket_rows, downsample
+from app.services.synthetic_data import generate_population, load_into_store
+from app.services.timeseries import METRIC_COLUMNS, to_epoch_us
+
+USER = "chart_000000"
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def series():
+    # Three days of minute readings from 2024-01-01 00:00
+    load_into_store(generate_population(1, 3 * 24 * 60, start=START, seed=7, user_prefix="chart_"))
+    return get_user_series(USER)
+
+
+@pytest.mark.parametrize("max_points", [3, 5, 50])
+def test_lttb_keeps_at_most_max_points_for_several_fields(series, max_points):
+    names = ["heart_rate", "blood_glucose", "steps", "sleep_hours"]
+    result = downsample(USER, series, None, None, "lttb", max_points, names)
+    assert result["count"] == max_points
+    timestamps = [row["timestamp"] for row in result["metrics"]]
+    assert timestamps == sorted(timestamps)
+    assert result["metrics"][0]["timestamp"] == series.row(0)["timestamp"]
+    assert result["metrics"][-1]["timestamp"] == series.row(-1)["timestamp"]
+
+
+@pytest.mark.parametrize("resolution", ["hour", "day"])
+def test_rollup_resolutions_respect_max_points(series, resolution):
+    result = downsample(USER, series, None, None, resolution, 5)
+    assert result["count"] <= 5
+    assert result["bucket_seconds"] % 3600 == 0
+    assert sum(row["readings"] for row in result["metrics"]) == len(series)
+
+
+def test_edge_buckets_only_count_readings_in_range(series):
+    start_us = to_epoch_us(START) + 90 * 60_000_000   # 01:30
+    end_us = to_epoch_us(START) + 5 * US_PER_HOUR + 9 * 60_000_000   # 05:09
+    result = downsample(USER, series, start_us, end_us, "hour")
+    lo, hi = series.range_indices(start_us, end_us)
+    assert [row["readings"] for row in result["metrics"]] == [30, 60, 60, 60, 10]
+    assert result["metrics"] == bucket_rows(bucket_readings(series, lo, hi, US_PER_HOUR), list(METRIC_COLUMNS))
+
+
+@pytest.mark.anyio
+async def test_chart_route_caps_lttb_rows(client, series):
+    response = await client.get(f"/api/health/metrics/{USER}",
+                                params={"resolution": "lttb", "max_points": 5, "days": 3,
+                                        "fields": "heart_rate,blood_glucose,steps,oxygen_saturation"})
+    assert response.status_code == 200
+    assert response.json()["count"] == 5
@@ -0,0 +1,79 @@
+import json
+import msgpack
+import pytest
+from app.services.data_service import add_health_data
+from app.services.encoding import encode_response, series_columns
+from app.services.timeseries import METRIC_COLUMNS, MetricSeries
+
+pytestmark = pytest.mark.anyio
+
+
+def _reading(minute, **extras):
+    return {"timestamp": f"2024-03-01T08:{minute:02d}:00", "heart_rate": 70 + minute,
+            "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80, "blood_glucose": 100.5,
+            "oxygen_saturation": 97.0, "body_temperature": 36.6, "steps": 10, "sleep_hours": 7.0, **extras}
+
+
+def _series():
+    series = MetricSeries()
+    series.append(_reading(0, device="watch"))
+    # Missing int and float vitals come back as null
+    series.append({"timestamp": "2024-03-01T08:01:30.250000", "heart_rate": 88, "note": "stairs"})
+    series.append(_reading(2))
+    return series
+
+
+def _decode(fmt, body):
+    return msgpack.unpackb(body) if fmt == "msgpack" else json.loads(body)
+
+
+def _rows(content):
+    """Rebuild reading dicts from a columnar page, as a client would"""
+    columns = content["metrics"]
+    rows = []
+    for i in range(len(columns["timestamp"])):
+        row = {name: values[i] for name, values in columns.items() if values[i] is not None}
+        row.update(content.get("extras", {}).get(str(i), {}))
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("fmt", ["columnar", "msgpack"])
+def test_columnar_page_round_trips_to_rows(fmt):
+    series = _series()
+    content = {"metrics": series_columns(series, 0, len(series)),
+               "extras": {str(i): e for i, e in series.extras_between(0, len(series)).items()}}
+    decoded = _decode(fmt, encode_response(content, fmt).body)
+
+    assert _rows(decoded) == [series.row(i) for i in range(len(series))]
+    assert decoded["metrics"]["timestamp"][1] == "2024-03-01T08:01:30.250000"
+    assert decoded["metrics"]["steps"][1] is None
+
+
+@pytest.mark.parametrize("fmt", ["columnar", "msgpack"])
+def test_a_slice_keys_extras_by_page_position(fmt):
+    series = _series()
+    content = {"metrics": series_columns(series, 1, 3, ("heart_rate",)),
+               "extras": {str(i): e for i, e in series.extras_between(1, 3).items()}}
+    decoded = _decode(fmt, encode_response(content, fmt).body)
+    assert decoded["metrics"]["heart_rate"] == [88, 72]
+    assert _rows(decoded)[0] == {"timestamp": "2024-03-01T08:01:30.250000", "heart_rate": 88, "note": "stairs"}
+
+
+@pytest.mark.parametrize("fmt", ["columnar", "msgpack"])
+def test_empty_series_encodes_empty_columns(fmt):
+    decoded = _decode(fmt, encode_response({"metrics": series_columns(MetricSeries(), 0, 0)}, fmt).body)
+    assert decoded["metrics"] == {"timestamp": [], **{name: [] for name in METRIC_COLUMNS}}
+
+
+async def test_metrics_route_formats_agree(client):
+    for minute in range(3):
+        add_health_data("encoding_route", _reading(minute, device="cuff") if minute == 1 else _reading(minute))
+    url = "/api/health/metrics/encoding_route?start=2024-03-01T00:00:00"
+
+    rows = (await client.get(url)).json()["metrics"]
+    columnar = (await client.get(url + "&format=columnar")).json()
+    packed = msgpack.unpackb((await client.get(url, headers={"Accept": "application/msgpack"})).content)
+    assert _rows(columnar) == rows
+    assert _rows(packed) == rows
+    assert columnar["extras"] == {"1": {"device": "cuff"}}
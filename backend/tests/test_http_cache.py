@@ -0,0 +1,87 @@
+import pytest
+from app.services import http_cache
+from app.services.data_service import add_guardian, add_health_data, save_document, save_user_profile
+from app.services.versions import data_versions
+
+pytestmark = pytest.mark.anyio
+
+
+def _reading(minute):
+    return {"timestamp": f"2024-03-01T08:{minute:02d}:00", "heart_rate": 70,
+            "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80, "blood_glucose": 100.0,
+            "oxygen_saturation": 97.0, "body_temperature": 36.6, "steps": 10, "sleep_hours": 7.0}
+
+
+def _document(document_id):
+    return {"document_id": document_id, "document_type": "lab", "file_name": "lab.txt",
+            "uploaded_at": "2024-03-01T08:00:00", "status": "complete",
+            "analysis": {"status": "complete", "extracted_conditions": [], "key_findings": []}}
+
+
+async def test_matching_etag_gets_304_and_a_write_invalidates_it(client):
+    add_health_data("etag_metrics", _reading(0))
+    url = "/api/health/metrics/etag_metrics?start=2024-03-01T00:00:00"
+
+    first = await client.get(url)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == http_cache.CACHE_CONTROL
+    not_modified = await client.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    add_health_data("etag_metrics", _reading(1))
+    changed = await client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["count"] == 2
+
+
+async def test_cached_body_is_served_until_the_data_changes(client):
+    add_health_data("etag_cached", _reading(0))
+    url = "/api/health/metrics/etag_cached?start=2024-03-01T00:00:00"
+
+    first = await client.get(url)
+    hits = http_cache.http_responses.hits
+    again = await client.get(url)
+    assert http_cache.http_responses.hits == hits + 1
+    assert again.content == first.content
+    assert again.headers["etag"] == first.headers["etag"]
+
+
+async def test_formats_are_separate_variants(client):
+    add_health_data("etag_variants", _reading(0))
+    url = "/api/health/metrics/etag_variants?start=2024-03-01T00:00:00"
+
+    rows = await client.get(url)
+    columnar = await client.get(url + "&format=columnar")
+    msgpack = await client.get(url, headers={"Accept": "application/msgpack"})
+    assert len({rows.headers["etag"], columnar.headers["etag"], msgpack.headers["etag"]}) == 3
+    assert msgpack.headers["content-type"] == "application/msgpack"
+    # A validator for one variant does not revalidate another
+    assert (await client.get(url + "&format=columnar", headers={"If-None-Match": rows.headers["etag"]})).status_code == 200
+
+
+async def test_profile_and_documents_follow_their_own_versions(client):
+    await save_user_profile("etag_sources", {"user_id": "etag_sources", "name": "Ada", "age": 81})
+    await save_document("etag_sources", _document("doc_1"))
+    profile = await client.get("/api/health/profile/etag_sources")
+    documents = await client.get("/api/documents/list/etag_sources")
+
+    # A new document leaves the profile validator alone
+    await save_document("etag_sources", _document("doc_2"))
+    assert (await client.get("/api/health/profile/etag_sources",
+                             headers={"If-None-Match": profile.headers["etag"]})).status_code == 304
+    listed = await client.get("/api/documents/list/etag_sources", headers={"If-None-Match": documents.headers["etag"]})
+    assert listed.status_code == 200
+    assert listed.json()["total"] == 2
+
+    await save_user_profile("etag_sources", {"user_id": "etag_sources", "name": "Ada", "age": 82})
+    assert (await client.get("/api/health/profile/etag_sources",
+                             headers={"If-None-Match": profile.headers["etag"]})).status_code == 200
+
+
+async def test_guardian_writes_bump_the_guardians_version():
+    before = data_versions.get("etag_guardians", ("guardians", "metrics"))
+    await add_guardian("etag_guardians", {"guardian_id": "g1", "name": "Sam", "access_level": "view_all"})
+    assert data_versions.get("etag_guardians", ("guardians", "metrics")) == (before[0] + 1, before[1])
+
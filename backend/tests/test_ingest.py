@@ -0,0 +1,111 @@
+import json
+import pytest
+from app.services.data_service import get_user_series
+from app.services.ingest import (
+    MAX_NDJSON_LINE_BYTES, MAX_REPORTED_REJECTS, BatchTooLarge, LineSplitter, MetricBatch, parse_json_array,
+    read_body
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def _reading(minute, **overrides):
+    reading = {"timestamp": f"2024-03-01T08:{minute:02d}:00", "heart_rate": 70,
+               "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80, "blood_glucose": 100.0,
+               "oxygen_saturation": 97.0, "body_temperature": 36.6, "steps": 10, "sleep_hours": 7.0}
+    return {**reading, **overrides}
+
+
+def test_rejects_are_reported_by_row_position():
+    rows = [_reading(0), _reading(1, heart_rate="fast"), _reading(2), {"timestamp": "2024-03-01T08:03:00"}]
+    batch = MetricBatch()
+    parse_json_array(json.dumps(rows).encode(), batch)
+
+    report = batch.report()
+    assert (report["received"], report["accepted"], report["rejected"]) == (4, 2, 2)
+    assert [reject["row"] for reject in report["rejects"]] == [1, 3]
+    assert report["rejects"][0]["errors"][0]["field"] == "heart_rate"
+
+
+def test_reject_details_are_capped_but_counted():
+    batch = MetricBatch()
+    for _ in range(MAX_REPORTED_REJECTS + 5):
+        batch.add_object({"timestamp": "not a time"})
+    assert batch.rejected == MAX_REPORTED_REJECTS + 5
+    assert len(batch.rejects) == MAX_REPORTED_REJECTS
+
+
+async def test_batch_route_reports_rejects_and_keeps_extras(client):
+    rows = [_reading(0, device="watch"), _reading(1, steps=-(2 ** 40)), _reading(2)]
+    response = await client.post("/api/health/metrics/ingest_json/batch", json=rows)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "partial"
+    assert (body["accepted"], body["rejected"]) == (2, 1)
+    assert body["rejects"][0]["row"] == 1
+
+    series = get_user_series("ingest_json")
+    assert series.row(0)["device"] == "watch"
+    assert "device" not in series.row(1)
+
+
+async def test_ndjson_batch_keeps_extras_like_single_readings(client):
+    # Out of order, so the batch is merged into place rather than appended
+    lines = [_reading(5, device="cuff", note="after walk"), _reading(3), "{not json"]
+    body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+    response = await client.post("/api/health/metrics/ingest_ndjson/batch", content=body,
+                                 headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["rejected"] == 1
+
+    series = get_user_series("ingest_ndjson")
+    assert [series.row(i).get("device") for i in range(len(series))] == [None, "cuff"]
+    assert series.row(1)["note"] == "after walk"
+
+
+def test_line_splitter_carries_lines_across_chunks():
+    splitter = LineSplitter(max_line_bytes=8)
+    body = b'{"a":1}\n{"b":22}\n\n{"c":3}'
+    lines = []
+    for i in range(0, len(body), 3):
+        lines += splitter.feed(body[i:i + 3])
+    assert lines + [splitter.finish()] == [b'{"a":1}', b'{"b":22}', b"", b'{"c":3}']
+
+    with pytest.raises(BatchTooLarge):
+        for piece in (b"12345", b"6789"):
+            splitter.feed(piece)
+
+
+async def test_ndjson_batch_streamed_in_small_chunks(client):
+    body = "\n".join(json.dumps(_reading(minute)) for minute in range(3)).encode()
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    response = await client.post("/api/health/metrics/ingest_chunked/batch", content=chunks(),
+                                 headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["accepted"] == 3
+
+
+async def test_oversized_or_malformed_bodies_are_refused(client):
+    assert (await client.post("/api/health/metrics/ingest_bad/batch", content=b"{}")).status_code == 400
+    assert (await client.post("/api/health/metrics/ingest_bad/batch", content=b"[1,")).status_code == 400
+    long_line = b'{"note": "' + b"x" * MAX_NDJSON_LINE_BYTES
+    response = await client.post("/api/health/metrics/ingest_bad/batch", content=long_line,
+                                 headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+
+
+async def test_body_over_the_limit_is_refused_by_length_or_bytes_read():
+    async def chunks(n):
+        for _ in range(n):
+            yield b"x" * 16
+
+    assert await read_body(chunks(4), "64", max_bytes=64) == b"x" * 64
+    with pytest.raises(BatchTooLarge):
+        await read_body(chunks(1), "65", max_bytes=64)
+    # A missing or understated Content-Length is caught while streaming
+    with pytest.raises(BatchTooLarge):
+        await read_body(chunks(5), None, max_bytes=64)
+    with pytest.raises(BatchTooLarge):
+        await read_body(chunks(5), "16", max_bytes=64)
@@ -0,0 +1,107 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.services import data_service, insights, llm_service
+from app.services.data_service import add_health_data, get_user_insight, save_user_insight, save_user_profile
+from app.services.storage import SQLiteBackend
+from app.services.timeseries import encode_metric
+
+USERS = ["insights_a", "insights_b", "insights_c"]
+NEXT_DAY_USERS = ["insights_d", "insights_e", "insights_f"]
+
+
+async def _seed(users=USERS):
+    for user_id in users:
+        await save_user_profile(user_id, {"name": user_id, "medical_conditions": ["Hypertension"]})
+        add_health_data(user_id, {"timestamp": "2024-01-01T08:00:00", "heart_rate": 70,
+                                   "blood_pressure_systolic": 130, "blood_pressure_diastolic": 80,
+                                   "blood_glucose": 110})
+
+
+@pytest.mark.anyio
+async def test_failed_user_keeps_checkpoint_and_resumes(tmp_path, monkeypatch):
+    await _seed()
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    calls = []
+
+    async def fake_analyze(context, message, user_id=None, **kwargs):
+        calls.append(user_id)
+        if user_id == "insights_b" and calls.count(user_id) == 1:
+            raise RuntimeError("upstream error")
+        return f"insight for {user_id}"
+
+    monkeypatch.setattr(llm_service, "client", object())
+    monkeypatch.setattr(llm_service, "analyze_with_cerebras", fake_analyze)
+
+    summary = await insights.run_insights_batch(USERS, rate_per_second=0, checkpoint_path=checkpoint_path)
+    assert summary["status"] == "partial"
+    assert summary["failed"] == 1
+    with open(checkpoint_path) as f:
+        assert json.load(f)["completed"] == ["insights_a", "insights_c"]
+
+    # The next run only retries the failed user, then drops the checkpoint
+    summary = await insights.run_insights_batch(USERS, rate_per_second=0, checkpoint_path=checkpoint_path)
+    assert summary["status"] == "complete"
+    assert summary["resumed"] == 2
+    assert calls.count("insights_a") == 1 and calls.count("insights_b") == 2
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+@pytest.mark.anyio
+async def test_next_days_run_ignores_a_stale_checkpoint(tmp_path, monkeypatch):
+    await _seed(NEXT_DAY_USERS)
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    calls = []
+
+    async def fake_analyze(context, message, user_id=None, **kwargs):
+        calls.append(user_id)
+        if user_id == "insights_e":
+            raise RuntimeError("upstream error")
+        return f"insight for {user_id}"
+
+    monkeypatch.setattr(llm_service, "client", object())
+    monkeypatch.setattr(llm_service, "analyze_with_cerebras", fake_analyze)
+
+    summary = await insights.run_insights_batch(NEXT_DAY_USERS, rate_per_second=0, checkpoint_path=checkpoint_path)
+    assert summary["failed"] == 1
+
+    # A day passes: the checkpoint and the stored insights are both a day old
+    day_ago = (datetime.now() - timedelta(hours=25)).isoformat()
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    insights.save_checkpoint(checkpoint_path, {**checkpoint, "started_at": day_ago})
+    for user_id in ("insights_d", "insights_f"):
+        save_user_insight(user_id, {**get_user_insight(user_id), "generated_at": day_ago})
+
+    calls.clear()
+    summary = await insights.run_insights_batch(NEXT_DAY_USERS, rate_per_second=0, checkpoint_path=checkpoint_path)
+    assert summary["resumed"] == 0
+    assert summary["run_id"] != checkpoint["run_id"]
+    assert sorted(calls) == NEXT_DAY_USERS
+    assert summary["generated"] == 2
+
+
+@pytest.mark.anyio
+async def test_batch_reads_stored_series_without_making_them_resident(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "health.db"))
+    monkeypatch.setattr(data_service, "storage", backend)
+    monkeypatch.setattr(data_service, "HEALTH_DATA", type(data_service.HEALTH_DATA)())
+    users = ["insights_stored_a", "insights_stored_b"]
+    for user_id in users:
+        backend.save_profile(user_id, {"name": user_id, "medical_conditions": ["Hypertension"]})
+        backend.append_metric(user_id, *encode_metric({"timestamp": "2024-01-01T08:00:00", "heart_rate": 70}))
+    calls = []
+
+    async def fake_analyze(context, message, user_id=None, **kwargs):
+        calls.append(user_id)
+        return f"insight for {user_id}"
+
+    monkeypatch.setattr(llm_service, "client", object())
+    monkeypatch.setattr(llm_service, "analyze_with_cerebras", fake_analyze)
+    try:
+        summary = await insights.run_insights_batch(rate_per_second=0, checkpoint_path=str(tmp_path / "cp.json"))
+        assert summary["generated"] == 2
+        assert sorted(calls) == users
+        assert not data_service.HEALTH_DATA
+    finally:
+        backend.close()
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from app.services import jobs
+from app.services.jobs import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_job_waiting_to_retry_does_not_hold_a_worker(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 0.2)
+    done = asyncio.Event()
+    order = []
+
+    async def handler(job):
+        order.append((job["name"], job["attempts"]))
+        if job["name"] == "flaky" and job["attempts"] == 1:
+            raise RuntimeError("upstream error")
+        if job["name"] == "flaky":
+            done.set()
+
+    queue = JobQueue("test-jobs", handler, concurrency=1, max_attempts=2)
+    try:
+        flaky = queue.submit({"name": "flaky"})
+        other = queue.submit({"name": "other"})
+        # The single worker runs the next job while the first waits out its backoff
+        for _ in range(50):
+            if other["status"] == "complete":
+                break
+            await asyncio.sleep(0.01)
+        assert other["status"] == "complete"
+        assert flaky["status"] == "queued" and flaky["error"] == "upstream error"
+
+        await asyncio.wait_for(done.wait(), 5)
+        await asyncio.sleep(0)
+        assert flaky["status"] == "complete" and flaky["error"] is None
+        assert order == [("flaky", 1), ("other", 1), ("flaky", 2)]
+    finally:
+        await queue.stop()
+
+
+async def test_stop_cancels_pending_retries(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 60)
+
+    async def handler(job):
+        raise RuntimeError("always fails")
+
+    queue = JobQueue("test-jobs-stop", handler, concurrency=1, max_attempts=3)
+    job = queue.submit({})
+    for _ in range(50):
+        if job["attempts"]:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0)
+    assert job["status"] == "queued" and queue._retries
+    await queue.stop()
+    assert not queue._retries
+    assert job["status"] == "queued"
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from app.services import llm_cache
+from app.services.data_service import add_health_data, save_document
+from app.services.llm_cache import LLMResponseCache, SingleFlight, response_cache
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class UpstreamCall:
+    """Stands in for an LLM request that finishes when the test releases it"""
+
+    def __init__(self, result="insight", error=None):
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+        self.started = 0
+
+    async def __call__(self):
+        self.started += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def test_identical_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    call, other = UpstreamCall("shared"), UpstreamCall("other")
+    callers = [asyncio.create_task(flight.do("key", call)) for _ in range(3)]
+    separate = asyncio.create_task(flight.do("other_key", other))
+    await asyncio.sleep(0)
+    assert flight.stats() == {"calls": 2, "deduplicated": 2, "in_flight": 2}
+
+    call.release.set()
+    other.release.set()
+    assert await asyncio.gather(*callers) == ["shared"] * 3
+    assert await separate == "other"
+    assert (call.started, other.started) == (1, 1)
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_cancelled_waiter_does_not_cancel_the_call():
+    flight = SingleFlight()
+    call = UpstreamCall()
+    leader = asyncio.create_task(flight.do("key", call))
+    waiter = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+
+    # The waiter's client goes away in the same tick the upstream call completes
+    call.release.set()
+    waiter.cancel()
+    assert await leader == "insight"
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_cancelled_leader_leaves_the_call_to_the_waiters():
+    flight = SingleFlight()
+    call = UpstreamCall()
+    leader = asyncio.create_task(flight.do("key", call))
+    waiter = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    call.release.set()
+    assert await waiter == "insight"
+    assert leader.cancelled()
+    assert call.started == 1
+
+
+async def test_an_upstream_error_reaches_every_waiter():
+    flight = SingleFlight()
+    error = RuntimeError("upstream error")
+    call = UpstreamCall(error=error)
+    callers = [asyncio.create_task(flight.do("key", call)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    call.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert results == [error] * 3
+    assert flight.stats()["in_flight"] == 0
+
+    # The failure is not remembered; the next caller starts a new call
+    retry = UpstreamCall("recovered")
+    retry.release.set()
+    assert await flight.do("key", retry) == "recovered"
+    assert flight.calls == 2
+
+
+def test_entries_expire_after_their_endpoints_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", clock)
+    cache = LLMResponseCache()
+    cache.set("insight", "walk more", "cache_ttl", "health_insights")
+    cache.set("analysis", "normal panel", "cache_ttl", "document_analysis")
+    cache.set("chat", "hello", "cache_ttl", "chat")
+
+    clock.now += llm_cache.ENDPOINT_TTLS["health_insights"] - 1
+    assert cache.get("insight") == "walk more"
+    assert cache.get("chat") is None
+
+    clock.now += 1
+    assert cache.get("insight") is None
+    assert cache.get("analysis") == "normal panel"
+    assert cache.stats()["entries"] == 1
+
+
+def test_a_write_drops_only_the_endpoints_built_from_it():
+    cache = LLMResponseCache()
+    cache.set("insight", "walk more", "cache_inv", "health_insights")
+    cache.set("analysis", "normal panel", "cache_inv", "document_analysis")
+    cache.set("other_user", "rest", "cache_inv_other", "health_insights")
+
+    assert cache.invalidate_user("cache_inv", "documents") == 1
+    assert cache.get("insight") is None
+    assert cache.get("analysis") == "normal panel"
+    assert cache.get("other_user") == "rest"
+    assert cache.invalidate_user("cache_inv", "metrics") == 0
+
+
+async def test_data_writes_invalidate_the_shared_cache():
+    response_cache.set("cache_writes_metrics", "walk more", "cache_writes", "health_insights")
+    add_health_data("cache_writes", {"timestamp": "2024-03-01T08:00:00", "heart_rate": 70})
+    assert response_cache.get("cache_writes_metrics") is None
+
+    response_cache.set("cache_writes_docs", "walk more", "cache_writes", "health_insights")
+    await save_document("cache_writes", {"document_id": "doc_1", "status": "complete"})
+    assert response_cache.get("cache_writes_docs") is None
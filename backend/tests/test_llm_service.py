@@ -0,0 +1,50 @@
+import asyncio
+import types
+import pytest
+from app.services import llm_service
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClient:
+    """Stands in for AsyncCerebras: echoes the last message after a delay, tracking concurrent calls"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.active = self.peak = 0
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, messages, model, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        message = types.SimpleNamespace(content=messages[-1]["content"])
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+async def test_upstream_calls_are_capped_at_the_concurrency_limit(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(llm_service, "client", fake)
+    monkeypatch.setattr(llm_service, "_llm_slots", asyncio.Semaphore(2))
+
+    replies = await asyncio.gather(*(
+        llm_service.analyze_with_cerebras("context", f"question {i}") for i in range(6)
+    ))
+
+    assert replies == [f"question {i}" for i in range(6)]
+    assert fake.peak == 2
+
+
+async def test_slow_upstream_times_out_and_frees_its_slot(monkeypatch):
+    slots = asyncio.Semaphore(1)
+    monkeypatch.setattr(llm_service, "client", FakeClient(delay=1))
+    monkeypatch.setattr(llm_service, "_llm_slots", slots)
+    monkeypatch.setattr(llm_service, "LLM_TIMEOUT_SECONDS", 0.01)
+
+    reply = await llm_service.analyze_with_cerebras("context", "slow question")
+
+    assert reply == "I'm taking longer than usual to respond. Please try again in a moment."
+    assert not slots.locked()
@@ -0,0 +1,55 @@
+import asyncio
+import types
+import pytest
+from app.services import llm_service
+from app.services.telemetry import llm_requests
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeStreamingClient:
+    """Stands in for AsyncCerebras: streams the given words with a delay between chunks"""
+
+    def __init__(self, words, delay=0.001):
+        self.words, self.delay = words, delay
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, messages, model, stream=False, **kwargs):
+        async def chunks():
+            for word in self.words:
+                await asyncio.sleep(self.delay)
+                delta = types.SimpleNamespace(content=word)
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        return chunks()
+
+
+def _free_slots():
+    return llm_service._llm_slots._value
+
+
+async def test_slot_is_released_before_a_slow_reader_finishes(monkeypatch):
+    monkeypatch.setattr(llm_service, "client", FakeStreamingClient(["Rest ", "and ", "drink ", "water."]))
+    free = _free_slots()
+    stream = llm_service.stream_with_cerebras("context", "message")
+
+    assert await stream.__anext__() == "Rest "
+    # The reader stalls; upstream finishes meanwhile and gives the slot back
+    await asyncio.sleep(0.05)
+    assert _free_slots() == free
+    assert [piece async for piece in stream] == ["and ", "drink ", "water."]
+
+
+async def test_client_going_away_cancels_upstream(monkeypatch):
+    monkeypatch.setattr(llm_service, "client", FakeStreamingClient(["word "] * 100, delay=0.01))
+    free = _free_slots()
+    cancelled = llm_requests.value(("chat_stream", "cancelled"))
+    stream = llm_service.stream_with_cerebras("context", "message")
+
+    await stream.__anext__()
+    await stream.aclose()
+    for _ in range(100):
+        if _free_slots() == free:
+            break
+        await asyncio.sleep(0.001)
+    assert _free_slots() == free
+    assert llm_requests.value(("chat_stream", "cancelled")) == cancelled + 1
@@ -0,0 +1,38 @@
+import pytest
+from app.services.data_service import add_health_data, get_patient_context, save_user_profile
+from app.services.prompt_context import PatientContextCache, patient_contexts
+
+
+def test_lru_evicts_the_least_recently_used_user():
+    cache = PatientContextCache(max_entries=2)
+    cache.get("a", lambda: ("context a", None))
+    cache.get("b", lambda: ("context b", None))
+    cache.get("a", lambda: ("rebuilt a", None))
+    cache.get("c", lambda: ("context c", None))
+
+    assert cache.get("a", lambda: ("rebuilt a", None)) == ("context a", None)
+    assert cache.get("b", lambda: ("rebuilt b", None)) == ("rebuilt b", None)
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 4}
+
+
+@pytest.mark.anyio
+async def test_context_is_rebuilt_only_after_the_users_data_changes():
+    user_id = "context_user"
+    await save_user_profile(user_id, {"name": "Ann", "age": 80, "medical_conditions": [], "medications": [], "allergies": []})
+    context, profile = await get_patient_context(user_id)
+    assert "User: Ann (Age: 80)" in context
+    assert "Recent Vital Signs" not in context
+
+    misses = patient_contexts.misses
+    assert (await get_patient_context(user_id))[0] is context
+    assert patient_contexts.misses == misses
+
+    add_health_data(user_id, {"timestamp": "2024-03-01T08:00:00", "heart_rate": 72})
+    context, _ = await get_patient_context(user_id)
+    assert "Heart Rate: 72 bpm" in context
+    assert patient_contexts.misses == misses + 1
+
+    await save_user_profile(user_id, dict(profile, name="Bea"))
+    context, _ = await get_patient_context(user_id)
+    assert "User: Bea (Age: 80)" in context
+    assert "Heart Rate: 72 bpm" in context
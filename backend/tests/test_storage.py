@@ -0,0 +1,216 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import pytest
+from app.services import data_service, server_lock
+from app.services.alerts import alert_engine
+from app.services.server_lock import acquire_server_lock, release_server_lock
+from app.services.storage import SQLiteBackend
+from app.services.timeseries import encode_metric
+
+
+def _reading(minute, **extras):
+    return {"timestamp": f"2024-03-01T08:{minute:02d}:00", "heart_rate": 70 + minute,
+            "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80, "blood_glucose": 100.0,
+            "oxygen_saturation": 97.0, "body_temperature": 36.6, "steps": 10, "sleep_hours": 7.0, **extras}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "health.db")
+
+
+class FlakyWriter:
+    """Writer connection whose next executemany fails once"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.failed = threading.Event()
+
+    def executemany(self, sql, rows):
+        if not self.failed.is_set():
+            self.failed.set()
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.conn.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_readings_round_trip_with_extras(db_path):
+    backend = SQLiteBackend(db_path)
+    backend.append_metric("store_rt", *encode_metric(_reading(0, device="watch")))
+    backend.append_metrics("store_rt", [encode_metric(_reading(1))[0], encode_metric(_reading(2))[0]],
+                           {"heart_rate": [71, 72], "blood_pressure_systolic": [120, 121],
+                            "blood_pressure_diastolic": [80, 80], "blood_glucose": [100.0, None],
+                            "oxygen_saturation": [97.0, 97.5], "body_temperature": [36.6, 36.7],
+                            "steps": [10, 20], "sleep_hours": [7.0, 7.0]},
+                           {1: {"note": "after lunch"}})
+    backend.close()
+
+    # A fresh backend reads back what the first one committed
+    reopened = SQLiteBackend(db_path)
+    series = reopened.load_metrics("store_rt")
+    reopened.close()
+    assert len(series) == 3
+    assert series.row(0) == _reading(0, device="watch")
+    assert "blood_glucose" not in series.row(2)
+    assert series.row(2)["note"] == "after lunch"
+    assert series.extras_between(0, 3) == {0: {"device": "watch"}, 2: {"note": "after lunch"}}
+
+
+def test_loading_a_user_commits_only_their_buffered_rows(db_path):
+    backend = SQLiteBackend(db_path, commit_interval_ms=60_000)
+    backend.append_metric("store_mine", *encode_metric(_reading(0)))
+    backend.append_metric("store_other", *encode_metric(_reading(1)))
+
+    assert len(backend.load_metrics("store_mine")) == 1
+    assert [row[0] for row in backend._pending] == ["store_other"]
+    # Buffered users are listed without forcing a commit
+    assert set(backend.metric_users()) == {"store_mine", "store_other"}
+    assert len(backend._pending) == 1
+    backend.close()
+
+
+@pytest.mark.anyio
+async def test_load_user_series_reads_storage_off_the_event_loop(db_path, monkeypatch):
+    backend = SQLiteBackend(db_path)
+    backend.append_metric("store_async", *encode_metric(_reading(0)))
+    monkeypatch.setattr(data_service, "storage", backend)
+    monkeypatch.setattr(data_service, "HEALTH_DATA", type(data_service.HEALTH_DATA)())
+    loop_thread = threading.get_ident()
+    load_threads = []
+    load_metrics = backend.load_metrics
+
+    def recording_load(user_id):
+        load_threads.append(threading.get_ident())
+        return load_metrics(user_id)
+
+    monkeypatch.setattr(backend, "load_metrics", recording_load)
+    try:
+        series = await data_service.load_user_series("store_async")
+        assert len(series) == 1
+        assert data_service.HEALTH_DATA["store_async"] is series
+        assert load_threads and loop_thread not in load_threads
+        # Resident now, so nothing is loaded again
+        assert await data_service.load_user_series("store_async") is series
+        assert len(load_threads) == 1
+    finally:
+        alert_engine.forget("store_async")
+        backend.close()
+
+
+def test_document_upsert_and_pending_documents(db_path):
+    backend = SQLiteBackend(db_path)
+    backend.save_document("store_docs", {"document_id": "doc_1", "status": "pending"})
+    backend.save_document("store_docs", {"document_id": "doc_2", "status": "pending"})
+    backend.save_document("store_docs", {"document_id": "doc_1", "status": "complete", "analysis": {}})
+
+    assert backend.list_documents("store_docs") == [
+        {"document_id": "doc_1", "status": "complete", "analysis": {}},
+        {"document_id": "doc_2", "status": "pending"},
+    ]
+    assert backend.pending_documents() == [{"document_id": "doc_2", "status": "pending"}]
+    backend.close()
+
+
+def test_failed_flush_keeps_rows_and_the_flusher_recovers(db_path):
+    backend = SQLiteBackend(db_path, commit_interval_ms=20)
+    writer = FlakyWriter(backend._writer)
+    backend._writer = writer
+    backend.append_metric("store_retry", *encode_metric(_reading(0)))
+    backend.append_metric("store_retry", *encode_metric(_reading(1)))
+
+    # The background commit fails once, logs, and retries on the next interval
+    assert writer.failed.wait(5)
+    for _ in range(250):
+        with backend._pending_lock:
+            if not backend._pending:
+                break
+        threading.Event().wait(0.02)
+    assert backend._flusher.is_alive()
+    assert [backend.load_metrics("store_retry").row(i)["heart_rate"] for i in range(2)] == [70, 71]
+    backend._writer = writer.conn
+    backend.close()
+
+
+def test_failed_flush_puts_rows_back_in_order(db_path):
+    backend = SQLiteBackend(db_path, commit_interval_ms=60_000)
+    writer = FlakyWriter(backend._writer)
+    backend._writer = writer
+    backend.append_metric("store_order", *encode_metric(_reading(0)))
+
+    with pytest.raises(sqlite3.OperationalError):
+        backend.flush()
+    backend.append_metric("store_order", *encode_metric(_reading(1)))
+    assert [row[2] for row in backend._pending] == [70, 71]
+    assert not writer.conn.in_transaction
+
+    backend.flush()
+    assert len(backend.load_metrics("store_order")) == 2
+    backend._writer = writer.conn
+    backend.close()
+
+
+def test_failed_flush_drops_the_oldest_rows_past_the_buffer_cap(db_path, caplog):
+    backend = SQLiteBackend(db_path, commit_interval_ms=60_000, max_pending_rows=2)
+    writer = FlakyWriter(backend._writer)
+    backend._writer = writer
+    for minute in range(3):
+        backend.append_metric("store_cap", *encode_metric(_reading(minute)))
+
+    with pytest.raises(sqlite3.OperationalError):
+        backend.flush()
+    assert [row[2] for row in backend._pending] == [71, 72]
+    assert "dropped 1 oldest row(s) for 1 user(s)" in caplog.text
+
+    backend.flush()
+    assert len(backend.load_metrics("store_cap")) == 2
+    backend._writer = writer.conn
+    backend.close()
+
+
+@pytest.mark.anyio
+async def test_profile_and_guardian_storage_runs_off_the_event_loop(db_path, monkeypatch):
+    backend = SQLiteBackend(db_path)
+    monkeypatch.setattr(data_service, "storage", backend)
+    loop_thread = threading.get_ident()
+    io_threads = []
+    for name in ("save_profile", "get_profile", "add_guardian", "list_guardians", "save_document"):
+        def recording(*args, _call=getattr(backend, name)):
+            io_threads.append(threading.get_ident())
+            return _call(*args)
+        monkeypatch.setattr(backend, name, recording)
+    try:
+        await data_service.save_user_profile("store_io", {"name": "Ann"})
+        assert await data_service.get_user_profile("store_io") == {"name": "Ann"}
+        await data_service.add_guardian("store_io", {"guardian_id": "g1", "name": "Sam"})
+        assert [g["guardian_id"] for g in await data_service.get_guardians("store_io")] == ["g1"]
+        await data_service.save_document("store_io", {"document_id": "doc_1", "status": "pending"})
+        assert len(io_threads) == 5 and loop_thread not in io_threads
+    finally:
+        data_service.DOCUMENT_INDEX.pop("store_io", None)
+        backend.close()
+
+
+def test_a_second_api_worker_refuses_to_start_on_sqlite(tmp_path):
+    lock_path = str(tmp_path / "server.lock")
+    acquire_server_lock(lock_path, backend="sqlite")
+    try:
+        script = f"from app.services.server_lock import acquire_server_lock; acquire_server_lock({lock_path!r}, 'sqlite')"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    finally:
+        release_server_lock()
+    assert result.returncode != 0
+    assert "another API worker holds" in result.stderr
+
+
+def test_memory_backend_takes_no_lock_and_web_concurrency_only_warns(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(server_lock, "WEB_CONCURRENCY", 4)
+    lock_path = tmp_path / "data" / "server.lock"
+    acquire_server_lock(str(lock_path), backend="memory")
+    assert not lock_path.parent.exists()
+    assert "WEB_CONCURRENCY=4" in caplog.text
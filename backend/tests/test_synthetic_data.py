@@ -0,0 +1,80 @@
+import sys
+from datetime import datetime
+import numpy as np
+from app.services.mock_data import generate_mock_health_data
+from app.services.synthetic_data import _DTYPES, generate_population, write_ndjson, write_npz
+from app.services.timeseries import METRIC_COLUMNS, to_epoch_us
+from benchmarks import gen_synthetic
+
+START = datetime(2024, 3, 1)
+
+
+def _population(users=3, samples=2 * 1440, seed=5, **kwargs):
+    return list(generate_population(users, samples, start=START, seed=seed, **kwargs))
+
+
+def test_same_seed_gives_the_same_population():
+    first, second = _population(), _population()
+    for (user_a, ts_a, cols_a), (user_b, ts_b, cols_b) in zip(first, second):
+        assert user_a == user_b
+        np.testing.assert_array_equal(ts_a, ts_b)
+        for name in METRIC_COLUMNS:
+            np.testing.assert_array_equal(cols_a[name], cols_b[name])
+
+    other = _population(seed=6)
+    assert not np.array_equal(first[0][2]["heart_rate"], other[0][2]["heart_rate"])
+    # A user's data does not depend on how many users were generated with it
+    np.testing.assert_array_equal(_population(users=1)[0][2]["blood_glucose"], first[0][2]["blood_glucose"])
+
+
+def test_columns_have_the_series_shape_and_dtypes():
+    samples = 2 * 1440
+    population = _population(samples=samples, resolution_seconds=60)
+
+    assert [user_id for user_id, _, _ in population] == ["synthetic_000000", "synthetic_000001", "synthetic_000002"]
+    for _, timestamps, columns in population:
+        assert timestamps.dtype == np.int64
+        assert timestamps.shape == (samples,)
+        assert timestamps[0] == to_epoch_us(START)
+        assert set(np.diff(timestamps)) == {60_000_000}
+        assert set(columns) == set(METRIC_COLUMNS)
+        for name, code in METRIC_COLUMNS.items():
+            assert columns[name].dtype == _DTYPES[code]
+            assert columns[name].shape == (samples,)
+        assert 40 <= columns["heart_rate"].min() and columns["heart_rate"].max() <= 180
+        assert 85 <= columns["oxygen_saturation"].min() and columns["oxygen_saturation"].max() <= 100
+        assert columns["steps"].min() >= 0
+
+
+def test_writers_keep_every_row(tmp_path):
+    population = _population(users=2, samples=600)
+
+    assert write_npz(str(tmp_path / "synthetic.npz"), iter(population)) == 1200
+    with np.load(tmp_path / "synthetic.npz") as data:
+        assert data["user_ids"].tolist() == ["synthetic_000000", "synthetic_000001"]
+        assert data["offsets"].tolist() == [0, 600, 1200]
+        np.testing.assert_array_equal(data["heart_rate"][600:], population[1][2]["heart_rate"])
+
+    assert write_ndjson(str(tmp_path / "ndjson"), iter(population)) == 1200
+    lines = (tmp_path / "ndjson" / "synthetic_000001.ndjson").read_text().splitlines()
+    assert len(lines) == 600
+    assert lines[0].startswith('{"timestamp":"2024-03-01T00:00:00","heart_rate":')
+
+
+def test_gen_synthetic_writes_an_npz(tmp_path, monkeypatch, capsys):
+    out = tmp_path / "synthetic.npz"
+    monkeypatch.setattr(sys, "argv", ["gen_synthetic", "--users", "2", "--days", "0.5", "--out", str(out)])
+    gen_synthetic.main()
+
+    assert capsys.readouterr().out.startswith("1,440 rows for 2 users")
+    with np.load(out) as data:
+        assert data["timestamp"].shape == (1440,)
+
+
+def test_mock_data_is_reproducible_with_a_seed():
+    def vitals(readings):
+        # Timestamps count back from now, so only the values repeat
+        return [{k: v for k, v in reading.items() if k != "timestamp"} for reading in readings]
+
+    first = generate_mock_health_data("user", days=3, seed=1)
+    assert vitals(generate_mock_health_data("user", days=3, seed=1)) == vitals(first)
@@ -0,0 +1,83 @@
+import time
+import httpx
+import pytest
+from app import main
+from app.services import profiler
+from app.services.profiler import ProfilerMiddleware, request_profiles
+from app.services.telemetry import Counter, Histogram, Registry
+
+pytestmark = pytest.mark.anyio
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests", ("route",)))
+    latency = registry.register(Histogram("latency_seconds", "Latency", (0.1, 1), ("route",)))
+    requests.inc(("/a",))
+    requests.inc(("/a",))
+    latency.observe(0.05, ("/a",))
+    latency.observe(5, ("/a",))
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 2',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 1',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 2',
+        'latency_seconds_sum{route="/a"} 5.05',
+        'latency_seconds_count{route="/a"} 2',
+    ]
+
+
+async def test_metrics_endpoint_reports_requests_by_route_template(client):
+    await client.get("/api/health/profile/metrics_user")
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(line.startswith('http_requests_total{method="GET",route="/api/health/profile/{user_id}",status="')
+               for line in lines)
+    assert not any("metrics_user" in line for line in lines)
+    assert 'http_requests_in_flight{method="GET"} 1' in lines
+
+
+async def test_profiling_is_off_by_default(client):
+    response = await client.get("/health?profile=1")
+    assert "x-profile-id" not in response.headers
+    assert (await client.get("/debug/profiles")).status_code == 404
+
+
+async def test_a_profiled_request_leaves_a_profile(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(main, "PROFILING_ENABLED", True)
+
+    async def slow_app(scope, receive, send):
+        time.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+    transport = httpx.ASGITransport(app=ProfilerMiddleware(slow_app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert "x-profile-id" not in (await client.get("/slow")).headers
+        response = await client.get("/slow", headers={"X-Profile": "1"})
+
+    profile = request_profiles.get(response.headers["x-profile-id"])
+    assert profile["status"] == "complete"
+    assert profile["path"] == "/slow"
+    assert profile["samples"] > 0
+    assert "slow_app" in profile["collapsed"]
+    assert any(entry["function"].startswith("slow_app") for entry in profile["top"])
+
+
+async def test_profiles_are_served_when_enabled(client, monkeypatch):
+    monkeypatch.setattr(main, "PROFILING_ENABLED", True)
+    profile_id = request_profiles.add({"method": "GET", "path": "/health", "seconds": 0.01, "samples": 3})
+
+    assert (await client.get(f"/debug/profiles/{profile_id}")).json()["samples"] == 3
+    assert (await client.get("/debug/profiles")).json()[0]["profile_id"] == profile_id
+    assert (await client.get("/debug/profiles/missing")).status_code == 404
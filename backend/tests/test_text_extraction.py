@@ -0,0 +1,93 @@
+import types
+import pytest
+from PIL import Image
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from app.services import text_extraction
+from app.services.text_extraction import MAX_EXTRACTED_CHARS, extract_document_text
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield
+    text_extraction.shutdown_pool()
+
+
+def _write_pdf(path, page_texts):
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for text in page_texts:
+        page = writer.add_blank_page(width=612, height=792)
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+async def test_pdf_pages_are_joined_in_page_order(tmp_path):
+    path = tmp_path / "report.pdf"
+    _write_pdf(path, [f"Page {i}" for i in range(5)])
+
+    result = await extract_document_text(str(path), "report.pdf")
+
+    assert result == {"text": "\n\n".join(f"Page {i}" for i in range(5)), "pages": 5, "truncated": False}
+
+
+async def test_extraction_stops_once_the_leading_pages_fill_max_chars(tmp_path):
+    path = tmp_path / "report.pdf"
+    _write_pdf(path, [f"Page {i}" for i in range(5)])
+
+    result = await extract_document_text(str(path), "report.pdf", max_chars=20)
+
+    assert result["text"] == "Page 0\n\nPage 1\n\nPage"
+    assert result["pages"] >= 3
+    assert result["truncated"]
+
+
+async def test_skipped_pages_count_as_truncated(tmp_path):
+    path = tmp_path / "report.pdf"
+    _write_pdf(path, [f"Page {i}" for i in range(5)])
+
+    # The first two pages fill max_chars exactly, so nothing is cut but pages 2-4 are never read
+    result = await extract_document_text(str(path), "report.pdf", max_chars=16)
+
+    assert result["text"].startswith("Page 0\n\nPage 1")
+    assert result["truncated"]
+
+
+async def test_text_files_are_capped_at_max_extracted_chars(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("a" * (MAX_EXTRACTED_CHARS + 500))
+
+    result = await extract_document_text(str(path), "notes.txt")
+
+    assert len(result["text"]) == MAX_EXTRACTED_CHARS
+    assert result["truncated"]
+
+
+def test_images_without_tesseract_yield_no_text(tmp_path, monkeypatch):
+    path = tmp_path / "scan.png"
+    Image.new("RGB", (40, 20), "white").save(path)
+
+    monkeypatch.setattr(text_extraction, "pytesseract", None)
+    assert text_extraction._image_frame_text(str(path), 0) == ""
+
+    class TesseractNotFoundError(Exception):
+        pass
+
+    def image_to_string(image):
+        raise TesseractNotFoundError()
+
+    fake = types.SimpleNamespace(TesseractNotFoundError=TesseractNotFoundError, image_to_string=image_to_string)
+    monkeypatch.setattr(text_extraction, "pytesseract", fake)
+    assert text_extraction._image_frame_text(str(path), 0) == ""
@@ -0,0 +1,87 @@
+import random
+import pytest
+from app.services.data_service import add_health_data
+from app.services.timeseries import METRIC_COLUMNS, MetricSeries
+
+pytestmark = pytest.mark.anyio
+
+
+def _reading(minute, heart_rate=70):
+    return {"timestamp": f"2024-03-01T08:{minute:02d}:00", "heart_rate": heart_rate,
+            "blood_pressure_systolic": 120, "blood_pressure_diastolic": 80, "blood_glucose": 100.0,
+            "oxygen_saturation": 97.0, "body_temperature": 36.6, "steps": 10, "sleep_hours": 7.0}
+
+
+def _page_rows(series, cursor, limit=3):
+    lo, hi, _, next_cursor = series.page(None, None, cursor, limit)
+    return [series.row(i)["heart_rate"] for i in range(lo, hi)], next_cursor
+
+
+def test_cursor_is_stable_under_late_inserts():
+    series = MetricSeries()
+    # heart_rate doubles as a row id; the three minute-3 rows straddle the first page boundary
+    for row_id, minute in enumerate([0, 1, 2, 3, 3, 3, 4, 5]):
+        series.append(_reading(minute, heart_rate=60 + row_id))
+
+    first, cursor = _page_rows(series, None, limit=4)
+    assert first == [60, 61, 62, 63]
+
+    # Late readings before the cursor and at its timestamp (these land after the rows already there)
+    series.append(_reading(1, heart_rate=90))
+    series.append(_reading(3, heart_rate=91))
+
+    second, cursor = _page_rows(series, cursor, limit=4)
+    assert second == [64, 65, 91, 66]
+    third, cursor = _page_rows(series, cursor, limit=4)
+    assert third == [67]
+    assert cursor is None
+
+
+async def test_route_pages_survive_a_late_insert(client):
+    for minute in range(6):
+        add_health_data("cursor_late", _reading(minute, heart_rate=60 + minute))
+    url = "/api/health/metrics/cursor_late?start=2024-03-01T00:00:00&limit=3"
+
+    first = (await client.get(url)).json()
+    add_health_data("cursor_late", _reading(0, heart_rate=99))
+    second = (await client.get(url + f"&cursor={first['next_cursor']}")).json()
+
+    assert [m["heart_rate"] for m in first["metrics"]] == [60, 61, 62]
+    assert [m["heart_rate"] for m in second["metrics"]] == [63, 64, 65]
+    assert second["next_cursor"] is None
+
+
+async def test_malformed_cursor_is_a_400(client):
+    add_health_data("cursor_bad", _reading(0))
+    response = await client.get("/api/health/metrics/cursor_bad?start=2024-03-01T00:00:00&cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def _shuffled_columns(count, with_missing):
+    order = list(range(count))
+    random.Random(3).shuffle(order)
+    timestamps = [1_709_280_000_000_000 + i * 3_600_000_000 for i in order]
+    values = {name: [] for name in METRIC_COLUMNS}
+    for i in order:
+        for k, name in enumerate(METRIC_COLUMNS):
+            missing = with_missing and (i + k) % 4 == 0
+            values[name].append(None if missing else (60 + (i + k) % 40) + (0.5 if METRIC_COLUMNS[name] == "f" else 0))
+    return timestamps, values
+
+
+@pytest.mark.parametrize("with_missing", [False, True])
+def test_extend_columns_matches_appending_each_reading(with_missing):
+    timestamps, values = _shuffled_columns(500, with_missing)
+    one_by_one = MetricSeries()
+    for i, timestamp in enumerate(timestamps):
+        one_by_one.append_encoded(timestamp, [values[name][i] for name in METRIC_COLUMNS], {})
+
+    batched = MetricSeries()
+    batched.extend_columns(timestamps[:300], {name: column[:300] for name, column in values.items()})
+    batched.extend_columns(timestamps[300:], {name: column[300:] for name, column in values.items()})
+
+    assert batched.timestamps == one_by_one.timestamps
+    # Missing floats are NaN, so compare the raw column bytes
+    assert {name: column.tobytes() for name, column in batched.columns.items()} == \
+        {name: column.tobytes() for name, column in one_by_one.columns.items()}
+    assert batched.rollups.summary() == one_by_one.rollups.summary()
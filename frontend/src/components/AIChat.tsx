@@ -43,13 +43,31 @@ export const AIChat: React.FC<AIChatProps> = ({ userId, userConditions, userMedi
     setLoading(true);
 
     try {
-      const response = await chatApi.sendMessage(userId, input);
-      const assistantMessage: ChatMessage = {
-        role: 'assistant',
-        content: response.data.response || 'I encountered an issue processing your request.',
-        timestamp: new Date().toISOString(),
-      };
-      setMessages(prev => [...prev, assistantMessage]);
+      // Show the reply as it streams: add the message on the first token,
+      // then keep replacing its content with the text received so far
+      let received = '';
+      await chatApi.streamMessage(userId, input, (text) => {
+        const isFirstToken = received === '';
+        received += text;
+        const assistantMessage: ChatMessage = {
+          role: 'assistant',
+          content: received,
+          timestamp: new Date().toISOString(),
+        };
+        setLoading(false);
+        setMessages(prev => isFirstToken
+          ? [...prev, assistantMessage]
+          : [...prev.slice(0, -1), assistantMessage]);
+      });
+
+      if (!received) {
+        const assistantMessage: ChatMessage = {
+          role: 'assistant',
+          content: 'I encountered an issue processing your request.',
+          timestamp: new Date().toISOString(),
+        };
+        setMessages(prev => [...prev, assistantMessage]);
+      }
     } catch (error) {
       console.error('Chat error:', error);
       const errorMessage: ChatMessage = {
@@ -22,13 +22,24 @@ export const DocumentUpload: React.FC<DocumentUploadProps> = ({ userId, document
 
     try {
       const response = await documentsApi.upload(userId, file);
+      let analysis = response.data.analysis;
+
+      // New uploads are analyzed in the background - wait for the job
+      if (response.status === 202 && response.data.job_id) {
+        const job = await documentsApi.waitForJob(response.data.job_id);
+        if (job.status === 'failed') {
+          throw new Error(job.error || 'Document analysis failed');
+        }
+        analysis = job.analysis;
+      }
+
       const newDoc: MedicalDocument = {
         document_id: response.data.document_id,
         user_id: userId,
         document_type: 'medical_document',
         file_name: file.name,
         uploaded_at: new Date().toISOString(),
-        analysis: response.data.analysis,
+        analysis,
       };
       onDocumentAdded(newDoc);
     } catch (err) {
@@ -13,15 +13,75 @@ export const healthApi = {
   initData: (userId: string) => api.get(`/health/init/${userId}`),
   getMetrics: (userId: string, days?: number) => 
     api.get(`/health/metrics/${userId}`, { params: { days } }),
+  // Downsampled for charts: min/mean/max buckets (or LTTB points) sized to maxPoints
+  getChartMetrics: (
+    userId: string,
+    days: number,
+    maxPoints: number,
+    options: { resolution?: 'auto' | 'hour' | 'day' | 'lttb'; fields?: string[] } = {},
+  ) =>
+    api.get(`/health/metrics/${userId}`, {
+      params: {
+        days,
+        max_points: maxPoints,
+        resolution: options.resolution,
+        fields: options.fields?.join(','),
+      },
+    }),
   getProfile: (userId: string) => api.get(`/health/profile/${userId}`),
   getSummary: (userId: string) => api.get(`/health/summary/${userId}`),
   addMetric: (userId: string, metric: any) => 
     api.post(`/health/metrics/${userId}`, metric),
+  addMetricsBatch: (userId: string, metrics: any[]) =>
+    api.post(`/health/metrics/${userId}/batch`, metrics),
 };
 
 export const chatApi = {
   sendMessage: (userId: string, message: string) => 
     api.post(`/chat/send`, null, { params: { user_id: userId, message } }),
+  // Streams the reply over Server-Sent Events, calling onToken as text arrives
+  streamMessage: async (
+    userId: string,
+    message: string,
+    onToken: (text: string) => void,
+  ): Promise<any> => {
+    const params = new URLSearchParams({ user_id: userId, message, stream: 'true' });
+    const response = await fetch(`${API_BASE_URL}/chat/send?${params}`, { method: 'POST' });
+    if (!response.ok || !response.body) {
+      throw new Error(`Chat request failed: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let metadata: any = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        const eventLine = rawEvent.split('\n').find(line => line.startsWith('event: '));
+        const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '));
+        if (!eventLine || !dataLine) continue;
+
+        const data = JSON.parse(dataLine.slice('data: '.length));
+        if (eventLine === 'event: token') {
+          onToken(data.text);
+        } else if (eventLine === 'event: done') {
+          metadata = data;
+        }
+      }
+    }
+
+    return metadata;
+  },
   getInsights: (userId: string) => 
     api.get(`/chat/health-insights/${userId}`),
 };
@@ -34,7 +94,27 @@ export const documentsApi = {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
   },
-  list: (userId: string) => api.get(`/documents/list/${userId}`),
+  list: (userId: string, params?: {
+    document_type?: string;
+    start?: string;
+    end?: string;
+    cursor?: string;
+    limit?: number;
+    include_analysis?: boolean;
+  }) => api.get(`/documents/list/${userId}`, { params }),
+  getJob: (jobId: string) => api.get(`/documents/jobs/${jobId}`),
+  // Polls an analysis job until it completes or fails
+  waitForJob: async (jobId: string, intervalMs = 1000, timeoutMs = 120000) => {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      const response = await api.get(`/documents/jobs/${jobId}`);
+      if (response.data.status === 'complete' || response.data.status === 'failed') {
+        return response.data;
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    throw new Error('Document analysis timed out');
+  },
   get: (userId: string, documentId: string) => 
     api.get(`/documents/${userId}/${documentId}`),
 };
@@ -49,4 +129,12 @@ export const guardiansApi = {
     api.get(`/guardians/view/${userId}/${guardianId}`, { params: { view_type: viewType } }),
   enableAlerts: (userId: string, guardianId: string) =>
     api.post(`/guardians/alerts/${userId}`, null, { params: { guardian_id: guardianId } }),
+  // Live alerts for a guardian's wards (Server-Sent Events); call close() on the result to stop
+  streamAlerts: (guardianId: string, wardIds: string[], onAlert: (alert: any) => void) => {
+    const params = new URLSearchParams();
+    wardIds.forEach(id => params.append('user_id', id));
+    const source = new EventSource(`${API_BASE_URL}/guardians/stream/${guardianId}?${params}`);
+    source.addEventListener('alert', (event) => onAlert(JSON.parse((event as MessageEvent).data)));
+    return source;
+  },
 };
@@ -39,6 +39,7 @@ export interface MedicalDocument {
     status: string;
     summary?: string;
     extracted_conditions?: string[];
+    extracted_medications?: string[];
     key_findings?: string[];
   };
 }
@@ -7,7 +7,9 @@ import sys
 from dotenv import load_dotenv
 
 # Load environment variables
-load_dotenv('/Users/bharatjain/Desktop/Startup_Market_Lab/backend/.env')
+# backend/.env next to this script; CEREBRAS_BASE_URL there (or in the
+# environment) points the client at another endpoint, e.g. benchmarks.fake_cerebras
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", ".env"))
 
 from cerebras.cloud.sdk import Cerebras
 